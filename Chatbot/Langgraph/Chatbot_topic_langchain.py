@@ -35,14 +35,15 @@
 # then use the AgentExecutor to run it.
 
 from dotenv import load_dotenv
-from langchain_community.utilities import DuckDuckGoSearchAPIWrapper, OpenWeatherMapAPIWrapper
-from langchain.tools import Tool
-from langchain.agents import initialize_agent, AgentType, create_tool_calling_agent
-from langchain_openai import ChatOpenAI
 import os
+import time
 import logging
+from log_config import configure_logging, payload
+import agent_registry
+import tracing
+from web_tools import setup_search_tool, setup_weather_tool
+import intent_router
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -52,37 +53,15 @@ def setup_search_agent():
     # Set up API keys
     os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
 
-    # Initialize search and weather tools
-    search = DuckDuckGoSearchAPIWrapper()
-    weather = OpenWeatherMapAPIWrapper()
-    
-    def search_with_logging(query):
-        logger.info(f"Searching for: {query}")
-        result = search.run(query)
-        logger.info(f"Search result: {result}")
-        return result
-    
-    def weather_with_logging(query):
-        logger.info(f"Getting weather for: {query}")
-        print("Running the weather tool")
-        result = weather.run(query)
-        logger.info(f"Weather result: {result}")
-        return result
-    
-    search_tool = Tool(
-        name="search",
-        description="Useful for searching the internet for recent news and information",
-        func=search_with_logging
-    )
-    
-    weather_tool = Tool(
-        name="weather",
-        description="Useful for getting current weather information for a specific location",
-        func=weather_with_logging
-    )
+    # Shared search and weather tools (results are cached and coalesced across agents)
+    search_tool = agent_registry.shared("tool:search", setup_search_tool)
+    weather_tool = agent_registry.shared("tool:weather", setup_weather_tool)
 
     # Initialize the LLM
-    chat_llm = ChatOpenAI(model='gpt-4o')
+    chat_llm = agent_registry.chat_llm('gpt-4o', temperature=0)
+
+    # langchain.agents takes seconds to import, so load it only when an agent is built
+    from langchain.agents import initialize_agent, AgentType
 
     # Create the agent with both tools
     agent = initialize_agent(
@@ -94,15 +73,28 @@ def setup_search_agent():
     
     return agent
 
+# Build the agent once per process and share it across requests
+agent_registry.register("chatbot_topic_langchain", setup_search_agent)
+
 def search_news(query):
-    agent = setup_search_agent()
+    agent = agent_registry.get("chatbot_topic_langchain")
     try:
-        logger.info(f"Starting search for query: {query}")
+        logger.info("Starting search for query: %s", payload(query))
+
+        # Obvious intents get one tool call and one LLM call instead of a ReAct loop
+        weather_tool = agent_registry.shared("tool:weather", setup_weather_tool)
+        answer = intent_router.try_direct(query, None, None, {"weather": weather_tool}, 'gpt-4o', "chatbot_topic_langchain")
+        if answer is not None:
+            return answer
+
+        started = time.perf_counter()
         result = agent.run(
             f"""Please use the appropriate tool to answer this question: {query}
             If it's a weather question, use the weather tool.
-            If it's a general question, use the search tool."""
+            If it's a general question, use the search tool.""",
+            callbacks=tracing.callbacks()
         )
+        intent_router.get_router().record_agent_latency("chatbot_topic_langchain", time.perf_counter() - started)
         logger.info("Search completed successfully")
         return result
     except Exception as e:
@@ -110,6 +102,7 @@ def search_news(query):
         return f"An error occurred: {str(e)}"
 
 if __name__ == "__main__":
+    configure_logging()
     # Example usage
     user_input = input("Enter your query: ")
     result = search_news(user_input)
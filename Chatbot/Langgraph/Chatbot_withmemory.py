@@ -5,6 +5,8 @@ from langchain.chains import ConversationChain
 from langchain_core.messages import HumanMessage, AIMessage
 import os
 from dotenv import load_dotenv
+import tracing
+from log_config import configure_logging
 load_dotenv()
 
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
@@ -59,7 +61,7 @@ def chat_with_memory():
             break
             
         # Get the response
-        response = chain.invoke({"input": user_input})
+        response = chain.invoke({"input": user_input}, config={"callbacks": tracing.callbacks()})
         print("\nAI:", response['response'])
         
         # Optionally print the current memory
@@ -67,4 +69,6 @@ def chat_with_memory():
         print(memory.load_memory_variables({})['chat_history'])
 
 if __name__ == "__main__":
+    configure_logging()
+    configure_logging()
     chat_with_memory()
\ No newline at end of file
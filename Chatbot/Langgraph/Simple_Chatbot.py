@@ -4,12 +4,14 @@ import os
 
 os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
 
-from langchain_openai import ChatOpenAI
-chat_llm = ChatOpenAI(model='gpt-4o')
+import agent_registry
+import tracing
+# Temperature 0 makes answers deterministic, so repeated questions are served from the response cache
+chat_llm = agent_registry.chat_llm('gpt-4o', temperature=0)
 
 while True:
     user_input = input("Please enter your input else press q to quit: ")
     if user_input.lower() =='q':
         break
     else:
-        print(chat_llm.invoke(user_input).content)
+        print(chat_llm.invoke(user_input, config={"callbacks": tracing.callbacks()}).content)
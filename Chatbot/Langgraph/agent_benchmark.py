@@ -0,0 +1,550 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import resource
+import threading
+import contextlib
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from langchain.tools import Tool
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+import agent_registry
+from log_config import configure_logging
+import tracing
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Entry points that can be benchmarked, in report order
+TARGETS = ("search_agent", "agent_with_ocr", "agent_with_pdf", "agent_with_unstructured", "streamlit_chain")
+
+DEFAULT_LLM_LATENCY = "lognormal:40:0.4"
+DEFAULT_TOOL_LATENCY = "lognormal:25:0.6"
+DEFAULT_TOKEN_LATENCY = "constant:1"
+
+# Registry keys replaced by fakes: every model and tool the agents can reach
+LLM_KEYS = ("llm:gpt-4:t=0", "llm:gpt-4o:t=0", "llm:gpt-4o")
+TOOL_KEYS = {
+    "tool:search": "search",
+    "tool:weather": "weather",
+    "tool:ocr": "ocr",
+    "tool:pdf_extractor": "pdf_extractor",
+    "tool:pdf_ingestion": "pdf_ingestion",
+    "tool:library_search": "library_search",
+    "tool:semantic_pdf_search": "semantic_pdf_search",
+}
+
+# Paths are only passed through to the fake tools; nothing is read from disk
+SAMPLE_IMAGE = "/tmp/benchmark/receipt.png"
+SAMPLE_PDF = "/tmp/benchmark/report.pdf"
+
+_ACTIONS_RE = re.compile(r"should be one of \[(.*?)\]")
+_QUESTION_RE = re.compile(r"answer this question: (.*)")
+_FILE_RE = re.compile(r"(image|PDF file) at (\S+?)\.(?:\s|$)")
+_WEATHER_RE = re.compile(r"\b(weather|temperature|rain|sunny)\b", re.I)
+
+# Time spent inside fakes, per calling thread, so it can be subtracted from wall time
+_accounting = threading.local()
+
+
+def _account(seconds: float, kind: str) -> None:
+    _accounting.simulated = getattr(_accounting, "simulated", 0.0) + seconds
+    setattr(_accounting, kind, getattr(_accounting, kind, 0) + 1)
+
+
+def _reset_accounting() -> None:
+    _accounting.simulated, _accounting.llm_calls, _accounting.tool_calls = 0.0, 0, 0
+
+
+class LatencyDistribution:
+    """
+    Latency sampler parsed from a spec such as "constant:20", "uniform:10:30",
+    "normal:40:10" or "lognormal:40:0.5" (median and sigma). Values are in milliseconds.
+    """
+
+    def __init__(self, spec: str, seed: Optional[int] = None):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        if not params:
+            kind, params = "constant", kind
+        self.kind = kind
+        self.params = [float(p) for p in params.split(":")]
+        if kind not in ("constant", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{kind}'")
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        """
+        Return one latency in seconds.
+        """
+        with self._lock:
+            if self.kind == "constant":
+                ms = self.params[0]
+            elif self.kind == "uniform":
+                ms = self._random.uniform(self.params[0], self.params[1])
+            elif self.kind == "normal":
+                ms = self._random.gauss(self.params[0], self.params[1])
+            else:
+                ms = self.params[0] * self._random.lognormvariate(0.0, self.params[1])
+        return max(0.0, ms) / 1000.0
+
+    def wait(self, kind: str) -> None:
+        seconds = self.sample()
+        time.sleep(seconds)
+        _account(seconds, kind)
+
+
+def script_reply(prompt: str, tool_steps: int = 1, reply_words: int = 20) -> str:
+    """
+    Produce the next model turn for a prompt without calling a model.
+
+    ReAct prompts get "Action" turns until tool_steps observations are in the
+    scratchpad and then a "Final Answer"; any other prompt gets a plain reply.
+    The tool is picked the way a model would: attached file first, then weather, then search.
+    """
+    filler = " ".join(["lorem"] * max(0, reply_words - 3))
+    actions = _ACTIONS_RE.search(prompt)
+    if not actions:
+        return f"Scripted benchmark reply. {filler}".strip()
+
+    tools = [t.strip() for t in actions.group(1).split(",")]
+    question = prompt.rsplit("\nQuestion:", 1)[-1]
+    if question.count("\nObservation:") >= tool_steps:
+        return f"Thought: I now know the final answer\nFinal Answer: Scripted benchmark answer. {filler}".strip()
+
+    asked = _QUESTION_RE.search(question)
+    asked = asked.group(1).strip() if asked else question.strip().splitlines()[0]
+    attached = _FILE_RE.search(question)
+    if attached and attached.group(1) == "image" and "ocr" in tools:
+        tool, tool_input = "ocr", attached.group(2)
+    elif attached and attached.group(1) == "PDF file" and any(t in tools for t in ("pdf_ingestion", "pdf_extractor")):
+        tool = "pdf_ingestion" if "pdf_ingestion" in tools else "pdf_extractor"
+        tool_input = f"{attached.group(2)} | {asked}"
+    elif _WEATHER_RE.search(asked) and "weather" in tools:
+        tool, tool_input = "weather", "London"
+    else:
+        tool, tool_input = tools[0], asked
+    return f"Thought: I should use the {tool} tool.\nAction: {tool}\nAction Input: {tool_input}"
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that answers from script_reply after a sampled delay.
+
+    Streaming yields one word per chunk, with token_latency between words.
+    """
+
+    latency: Any
+    token_latency: Any
+    tool_steps: int = 1
+    reply_words: int = 20
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-benchmark"
+
+    def _prompt(self, messages: List[BaseMessage]) -> str:
+        return "\n".join(m.content if isinstance(m.content, str) else str(m.content) for m in messages)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        self.latency.wait("llm_calls")
+        text = script_reply(self._prompt(messages), self.tool_steps, self.reply_words)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self.latency.wait("llm_calls")
+        words = script_reply(self._prompt(messages), self.tool_steps, self.reply_words).split(" ")
+        for i, word in enumerate(words):
+            if i:
+                seconds = self.token_latency.sample()
+                time.sleep(seconds)
+                _account(seconds, "tokens")
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=("" if i == 0 else " ") + word))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def fake_tool(name: str, latency: LatencyDistribution, result_words: int = 60) -> Tool:
+    """
+    Build a stand-in for a shared tool that waits a sampled delay and returns canned text.
+    """
+    result = f"Benchmark {name} result: " + " ".join(["ipsum"] * result_words)
+
+    def run(tool_input):
+        latency.wait("tool_calls")
+        return result
+
+    return Tool(name=name, description=f"Benchmark stand-in for the {name} tool. Input is passed through unchanged.", func=run)
+
+
+def install_fakes(llm_latency: str, tool_latency: str, token_latency: str = DEFAULT_TOKEN_LATENCY,
+                  tool_steps: int = 1, reply_words: int = 20, seed: Optional[int] = 0) -> ScriptedChatModel:
+    """
+    Replace every model and tool in the registry with scripted fakes and drop built agents.
+
+    Returns:
+        ScriptedChatModel: The fake model, also used for the Streamlit chain
+    """
+    model = ScriptedChatModel(
+        latency=LatencyDistribution(llm_latency, seed),
+        token_latency=LatencyDistribution(token_latency, seed),
+        tool_steps=tool_steps,
+        reply_words=reply_words,
+    )
+    from chat_memory import SUMMARY_MODEL
+    for key in LLM_KEYS + (f"llm:{SUMMARY_MODEL}",):
+        agent_registry.register(key, lambda: model, replace=True)
+    tool_distribution = LatencyDistribution(tool_latency, None if seed is None else seed + 1)
+    for key, name in TOOL_KEYS.items():
+        agent_registry.register(key, lambda name=name: fake_tool(name, tool_distribution), replace=True)
+    # Agents built earlier hold the real clients
+    for name in TARGETS:
+        agent_registry.invalidate(name)
+    return model
+
+
+def streamlit_chain(model: BaseChatModel):
+    # Same prompt and chain as app.py
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are a helpful AI assistant with memory of the conversation."),
+        MessagesPlaceholder(variable_name="history"),
+        ("human", "{input}")
+    ])
+    return prompt | model
+
+
+def build_workloads(model: BaseChatModel, memory_type: str) -> Dict[str, Callable[[int], Dict[str, Any]]]:
+    """
+    Return one callable per target that runs request number i and returns its extra metrics.
+
+    Agent modules are imported lazily so one target can run without the others' dependencies.
+    """
+    def search_agent_call(i):
+        import search_agent
+        search_agent.search_news(["What is the latest news on OpenAI?", "Who won the election?"][i % 2])
+        return {}
+
+    def agent_with_ocr_call(i):
+        import agent_with_ocr
+        query, image = [
+            ("What's the weather in London?", None),
+            ("What is the latest news on electric cars?", None),
+            ("What text is in this image?", SAMPLE_IMAGE),
+        ][i % 3]
+        agent_with_ocr.process_query(query, image)
+        return {}
+
+    def file_agent_call(module_name):
+        def call(i):
+            module = __import__(module_name)
+            query, path, file_type = [
+                ("What's the weather in London?", None, None),
+                ("What does the report say about revenue?", SAMPLE_PDF, "pdf"),
+                ("What text is in this image?", SAMPLE_IMAGE, "image"),
+                ("What is the latest news on OpenAI?", None, None),
+            ][i % 4]
+            module.process_query(query, path, file_type)
+            return {}
+        return call
+
+    chain = streamlit_chain(model)
+    sessions = threading.local()
+
+    def streamlit_call(i):
+        from chat_memory import SessionMemory
+        # Each caller thread plays one browser session, as in Streamlit
+        if not hasattr(sessions, "memory"):
+            sessions.memory = SessionMemory(policy=memory_type)
+        user_input = f"Tell me something new, turn {i}."
+        started = time.perf_counter()
+        ttft = None
+        parts = []
+        for chunk in chain.stream({"input": user_input, "history": sessions.memory.messages()},
+                                  config={"callbacks": tracing.callbacks()}):
+            if chunk.content and ttft is None:
+                ttft = time.perf_counter() - started
+            parts.append(chunk.content)
+        sessions.memory.add_turn(user_input, "".join(parts))
+        return {"ttft": ttft}
+
+    return {
+        "search_agent": search_agent_call,
+        "agent_with_ocr": agent_with_ocr_call,
+        "agent_with_pdf": file_agent_call("agent_with_pdf"),
+        "agent_with_unstructured": file_agent_call("agent_with_unstructured"),
+        "streamlit_chain": streamlit_call,
+    }
+
+
+def percentiles(values: List[float], scale: float = 1000.0) -> Dict[str, float]:
+    """
+    Nearest-rank p50/p95/p99 plus mean and max, scaled (seconds to milliseconds by default).
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))] * scale
+
+    return {
+        "p50": rank(50), "p95": rank(95), "p99": rank(99),
+        "mean": sum(ordered) / len(ordered) * scale, "max": ordered[-1] * scale,
+    }
+
+
+def run_target(call: Callable[[int], Dict[str, Any]], requests: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Run requests calls from concurrency threads and summarise latency, overhead and throughput.
+
+    Overhead is wall time minus the time the fakes spent waiting, i.e. what the code
+    around the model and tools costs; per step divides it by model plus tool calls.
+    """
+    samples = []
+    lock = threading.Lock()
+
+    def one(i):
+        _reset_accounting()
+        started = time.perf_counter()
+        try:
+            extra = call(i)
+            error = False
+        except Exception as e:
+            logger.error(f"Benchmark request {i} failed: {str(e)}")
+            extra, error = {}, True
+        elapsed = time.perf_counter() - started
+        steps = _accounting.llm_calls + _accounting.tool_calls
+        sample = {"latency": elapsed, "overhead": max(0.0, elapsed - _accounting.simulated), "steps": steps,
+                  "llm_calls": _accounting.llm_calls, "tool_calls": _accounting.tool_calls, "error": error, **extra}
+        with lock:
+            samples.append(sample)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as executor:
+        list(executor.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    ok = [s for s in samples if not s["error"]]
+    result = {
+        "requests": requests,
+        "errors": requests - len(ok),
+        "wall_seconds": wall,
+        "throughput_rps": len(ok) / wall if wall else 0.0,
+        "latency_ms": percentiles([s["latency"] for s in ok]),
+        "overhead_ms": percentiles([s["overhead"] for s in ok]),
+        "overhead_per_step_ms": percentiles([s["overhead"] / s["steps"] for s in ok if s["steps"]]),
+        "llm_calls_per_request": sum(s["llm_calls"] for s in ok) / len(ok) if ok else 0.0,
+        "tool_calls_per_request": sum(s["tool_calls"] for s in ok) / len(ok) if ok else 0.0,
+    }
+    ttfts = [s["ttft"] for s in ok if s.get("ttft") is not None]
+    if ttfts:
+        result["ttft_ms"] = percentiles(ttfts)
+    return result
+
+
+def measure_session_memory(model: BaseChatModel, sessions: int, turns: int) -> Dict[str, Any]:
+    """
+    Python heap held per Streamlit chat session after a number of turns, for each memory policy.
+    """
+    from chat_memory import SessionMemory, MEMORY_TYPES
+    chain = streamlit_chain(model)
+    results = {}
+    for policy in MEMORY_TYPES:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        memories = [SessionMemory(policy=policy) for _ in range(sessions)]
+        for turn in range(turns):
+            for memory in memories:
+                user_input = f"Tell me something new, turn {turn}."
+                reply = "".join(c.content for c in chain.stream({"input": user_input, "history": memory.messages()}))
+                memory.add_turn(user_input, reply)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        held = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        results[policy] = {"bytes_per_session": held / sessions, "tokens_per_session": memories[0].tokens}
+        del memories
+    return {"sessions": sessions, "turns": turns, "policies": results}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmark(targets=TARGETS, requests: int = 50, concurrency=(1, 8, 32), llm_latency: str = DEFAULT_LLM_LATENCY,
+                  tool_latency: str = DEFAULT_TOOL_LATENCY, token_latency: str = DEFAULT_TOKEN_LATENCY,
+                  tool_steps: int = 1, memory_type: str = "summary", router: bool = False,
+                  memory_sessions: int = 50, memory_turns: int = 20, seed: Optional[int] = 0) -> Dict[str, Any]:
+    """
+    Benchmark the agent entry points against fakes and return a JSON-serialisable report.
+
+    Args:
+        targets (iterable): Entry points from TARGETS
+        requests (int): Measured requests per target and concurrency level
+        concurrency (iterable): Numbers of concurrent callers to test
+        llm_latency (str): Latency spec for each model call (see LatencyDistribution)
+        tool_latency (str): Latency spec for each tool call
+        token_latency (str): Latency spec between streamed tokens
+        tool_steps (int): Tool calls the scripted model makes before answering
+        memory_type (str): Memory policy for the Streamlit chain
+        router (bool): Let the intent router short-circuit obvious questions
+        memory_sessions (int): Sessions used to measure memory per session (0 skips it)
+        memory_turns (int): Turns per session for the memory measurement
+
+    Returns:
+        dict: Metadata, per-target results keyed by concurrency, and memory per session
+    """
+    import intent_router
+    model = install_fakes(llm_latency, tool_latency, token_latency, tool_steps, seed=seed)
+    intent_router.ROUTER_ENABLED = router
+    workloads = build_workloads(model, memory_type)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "requests": requests, "concurrency": list(concurrency), "llm_latency": llm_latency,
+                "tool_latency": tool_latency, "token_latency": token_latency, "tool_steps": tool_steps,
+                "memory_type": memory_type, "router": router, "seed": seed,
+            },
+        },
+        "results": {},
+    }
+
+    # ReAct agents print every step; that cost is kept but the text is discarded
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for target in targets:
+            logger.info(f"Benchmarking {target}")
+            # First call builds the agent and imports the module; not measured
+            workloads[target](0)
+            report["results"][target] = {
+                str(n): run_target(workloads[target], requests, n) for n in concurrency
+            }
+        if memory_sessions:
+            zero = install_fakes("constant:0", "constant:0", "constant:0", tool_steps, seed=seed)
+            report["memory"] = measure_session_memory(zero, memory_sessions, memory_turns)
+
+    report["meta"]["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return report
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: Optional[float] = None) -> Tuple[List[str], bool]:
+    """
+    Compare two reports target by target.
+
+    Args:
+        baseline (dict): Earlier report
+        current (dict): New report
+        threshold (float, optional): Relative increase in p95 latency or mean per-step overhead counted as a regression
+
+    Returns:
+        tuple: Report lines and whether any regression exceeded the threshold
+    """
+    lines = [f"{'target':<26}{'callers':>8}{'p50 ms':>16}{'p95 ms':>16}{'p99 ms':>16}{'rps':>16}{'ovh/step ms':>18}"]
+    regressed = False
+
+    def cell(old, new):
+        change = (new - old) / old * 100 if old else 0.0
+        return f"{new:.1f} ({change:+.0f}%)"
+
+    for target, levels in current.get("results", {}).items():
+        for n, result in levels.items():
+            old = baseline.get("results", {}).get(target, {}).get(n)
+            if not old:
+                continue
+            lat, old_lat = result["latency_ms"], old["latency_ms"]
+            ovh, old_ovh = result["overhead_per_step_ms"], old["overhead_per_step_ms"]
+            lines.append(
+                f"{target:<26}{n:>8}{cell(old_lat['p50'], lat['p50']):>16}{cell(old_lat['p95'], lat['p95']):>16}"
+                f"{cell(old_lat['p99'], lat['p99']):>16}{cell(old['throughput_rps'], result['throughput_rps']):>16}"
+                f"{cell(old_ovh.get('mean', 0.0), ovh.get('mean', 0.0)):>18}"
+            )
+            if threshold is not None:
+                for old_value, new_value in ((old_lat["p95"], lat["p95"]), (old_ovh.get("mean", 0.0), ovh.get("mean", 0.0))):
+                    if old_value and (new_value - old_value) / old_value > threshold:
+                        regressed = True
+    return lines, regressed
+
+
+def format_report(report: Dict[str, Any]) -> List[str]:
+    lines = [f"{'target':<26}{'callers':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>10}{'ovh/step ms':>13}{'errors':>8}"]
+    for target, levels in report["results"].items():
+        for n, r in levels.items():
+            lines.append(
+                f"{target:<26}{n:>8}{r['latency_ms'].get('p50', 0):>10.1f}{r['latency_ms'].get('p95', 0):>10.1f}"
+                f"{r['latency_ms'].get('p99', 0):>10.1f}{r['throughput_rps']:>10.1f}"
+                f"{r['overhead_per_step_ms'].get('mean', 0):>13.2f}{r['errors']:>8}"
+            )
+    for policy, m in report.get("memory", {}).get("policies", {}).items():
+        lines.append(f"memory/session ({policy}, {report['memory']['turns']} turns): {m['bytes_per_session'] / 1024:.1f} KiB")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the agent entry points offline with scripted models and tools.")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="Comma-separated entry points")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per target and concurrency level")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated numbers of concurrent callers")
+    parser.add_argument("--llm-latency", default=DEFAULT_LLM_LATENCY)
+    parser.add_argument("--tool-latency", default=DEFAULT_TOOL_LATENCY)
+    parser.add_argument("--token-latency", default=DEFAULT_TOKEN_LATENCY)
+    parser.add_argument("--tool-steps", type=int, default=1)
+    parser.add_argument("--memory-type", default="summary")
+    parser.add_argument("--router", action="store_true", help="Let the intent router skip the agent for obvious questions")
+    parser.add_argument("--memory-sessions", type=int, default=50)
+    parser.add_argument("--memory-turns", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, help="Exit non-zero when p95 latency or per-step overhead grows by more than this fraction")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    configure_logging(level=args.log_level)
+    report = run_benchmark(
+        targets=[t.strip() for t in args.targets.split(",") if t.strip()],
+        requests=args.requests,
+        concurrency=[int(n) for n in args.concurrency.split(",")],
+        llm_latency=args.llm_latency,
+        tool_latency=args.tool_latency,
+        token_latency=args.token_latency,
+        tool_steps=args.tool_steps,
+        memory_type=args.memory_type,
+        router=args.router,
+        memory_sessions=args.memory_sessions,
+        memory_turns=args.memory_turns,
+        seed=args.seed,
+    )
+    print("\n".join(format_report(report)))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved report to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            lines, regressed = compare(json.load(f), report, args.max_regression)
+        print("\n".join(lines))
+        if regressed:
+            sys.exit(1)
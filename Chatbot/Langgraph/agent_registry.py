@@ -0,0 +1,163 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Process-wide registry of agents, tools and clients.
+# Each entry is built once on first use and then shared by every caller.
+_factories: Dict[str, Callable[[], Any]] = {}
+_instances: Dict[str, Any] = {}
+_build_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def register(name: str, factory: Callable[[], Any], replace: bool = False) -> None:
+    """
+    Register a factory that builds a shared object on first use.
+
+    Args:
+        name (str): Registry key, e.g. "agent_with_ocr" or "llm:gpt-4"
+        factory (callable): Zero-argument callable that builds the object
+        replace (bool): Replace an existing factory and drop its built instance
+    """
+    with _registry_lock:
+        if name in _factories and not replace:
+            return
+        _factories[name] = factory
+        _build_locks.setdefault(name, threading.Lock())
+        if replace:
+            _instances.pop(name, None)
+
+
+def get(name: str) -> Any:
+    """
+    Return the shared object registered under name, building it if needed.
+
+    Args:
+        name (str): Registry key
+
+    Returns:
+        Any: The shared instance
+    """
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+
+    with _registry_lock:
+        if name not in _factories:
+            raise KeyError(f"Nothing registered under '{name}'")
+        factory = _factories[name]
+        build_lock = _build_locks[name]
+
+    # Only one thread builds a given entry; others wait for it
+    with build_lock:
+        instance = _instances.get(name)
+        if instance is None:
+            logger.info(f"Building shared instance: {name}")
+            instance = factory()
+            _instances[name] = instance
+    return instance
+
+
+def shared(name: str, factory: Callable[[], Any]) -> Any:
+    """
+    Register factory under name (if not already registered) and return the instance.
+    """
+    register(name, factory)
+    return get(name)
+
+
+def is_built(name: str) -> bool:
+    """
+    Check whether the entry has already been built.
+    """
+    return name in _instances
+
+
+def invalidate(name: Optional[str] = None) -> None:
+    """
+    Drop built instances so they are rebuilt on next use.
+
+    Objects built on top of an invalidated entry (e.g. an agent holding an LLM)
+    keep their reference, so invalidate those too or call invalidate() to reset everything.
+
+    Args:
+        name (str, optional): Registry key; drops every instance when omitted
+    """
+    with _registry_lock:
+        if name is None:
+            _instances.clear()
+            logger.info("Invalidated all shared instances")
+        elif _instances.pop(name, None) is not None:
+            logger.info(f"Invalidated shared instance: {name}")
+
+
+def warm_up(names: Optional[Iterable[str]] = None, background: bool = False, max_workers: int = 4) -> List[Future]:
+    """
+    Build registered entries ahead of the first request.
+
+    Args:
+        names (iterable, optional): Registry keys to build; all registered entries when omitted
+        background (bool): Return immediately and build in background threads
+        max_workers (int): Number of entries built concurrently
+
+    Returns:
+        List[Future]: One future per entry
+    """
+    with _registry_lock:
+        names = list(names) if names is not None else list(_factories)
+
+    def build(name):
+        try:
+            return get(name)
+        except Exception as e:
+            logger.error(f"Error warming up {name}: {str(e)}")
+            raise
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warm-up")
+    futures = [executor.submit(build, name) for name in names]
+    executor.shutdown(wait=not background)
+    return futures
+
+
+def chat_llm(model: str, temperature: Optional[float] = None) -> Any:
+    """
+    Return the shared ChatOpenAI client for a model, with the response cache attached.
+
+    Args:
+        model (str): OpenAI model name
+        temperature (float, optional): Sampling temperature; only deterministic calls are cached
+    """
+    def build():
+        from langchain_openai import ChatOpenAI
+        from llm_cache import get_llm_cache
+        # cache=None falls back to LangChain's global cache, i.e. none unless configured elsewhere
+        return ChatOpenAI(model=model, temperature=temperature, cache=get_llm_cache())
+
+    key = f"llm:{model}" if temperature is None else f"llm:{model}:t={temperature}"
+    return shared(key, build)
+
+
+def search_wrapper() -> Any:
+    """
+    Return the shared DuckDuckGo search wrapper.
+    """
+    def build():
+        from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+        return DuckDuckGoSearchAPIWrapper()
+
+    return shared("wrapper:duckduckgo", build)
+
+
+def weather_wrapper() -> Any:
+    """
+    Return the shared OpenWeatherMap wrapper.
+    """
+    def build():
+        from langchain_community.utilities import OpenWeatherMapAPIWrapper
+        return OpenWeatherMapAPIWrapper()
+
+    return shared("wrapper:openweathermap", build)
@@ -1,14 +1,16 @@
 from dotenv import load_dotenv
-from langchain_community.utilities import DuckDuckGoSearchAPIWrapper, OpenWeatherMapAPIWrapper
-from langchain.tools import Tool
-from langchain.agents import initialize_agent, AgentType
-from langchain_openai import ChatOpenAI
 import os
+import time
 import logging
+from log_config import configure_logging, payload
+import agent_registry
+import tracing
+from web_tools import setup_search_tool, setup_weather_tool
+import intent_router
 from ocr_tool import setup_ocr_tool
+from document_library import setup_library_search_tool
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -21,44 +23,23 @@ def setup_agent_with_ocr():
     # Set up API keys
     os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
 
-    # Initialize search and weather tools
-    search = DuckDuckGoSearchAPIWrapper()
-    weather = OpenWeatherMapAPIWrapper()
-    
-    def search_with_logging(query):
-        logger.info(f"Searching for: {query}")
-        result = search.run(query)
-        logger.info(f"Search result: {result}")
-        return result
-    
-    def weather_with_logging(query):
-        logger.info(f"Getting weather for: {query}")
-        result = weather.run(query)
-        logger.info(f"Weather result: {result}")
-        return result
-    
-    # Create tools
-    search_tool = Tool(
-        name="search",
-        description="Useful for searching the internet for recent news and information. Input should be a search query string.",
-        func=search_with_logging
-    )
-    
-    weather_tool = Tool(
-        name="weather",
-        description="Useful for getting current weather information for a specific location. Input should be a location name.",
-        func=weather_with_logging
-    )
+    # Shared search and weather tools (results are cached and coalesced across agents)
+    search_tool = agent_registry.shared("tool:search", setup_search_tool)
+    weather_tool = agent_registry.shared("tool:weather", setup_weather_tool)
     
     # Get the OCR tool
-    ocr_tool = setup_ocr_tool()
+    ocr_tool = agent_registry.shared("tool:ocr", setup_ocr_tool)
+    library_tool = agent_registry.shared("tool:library_search", setup_library_search_tool)
 
     # Initialize the LLM with the correct model name
-    chat_llm = ChatOpenAI(model='gpt-4')
+    chat_llm = agent_registry.chat_llm('gpt-4', temperature=0)
+
+    # langchain.agents takes seconds to import, so load it only when an agent is built
+    from langchain.agents import initialize_agent, AgentType
 
     # Create the agent with all tools
     agent = initialize_agent(
-        tools=[search_tool, weather_tool, ocr_tool],
+        tools=[search_tool, weather_tool, ocr_tool, library_tool],
         llm=chat_llm,
         agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
         verbose=True,
@@ -67,6 +48,9 @@ def setup_agent_with_ocr():
     
     return agent
 
+# Build the agent once per process and share it across requests
+agent_registry.register("agent_with_ocr", setup_agent_with_ocr)
+
 def process_query(query, image_path=None):
     """
     Process a user query, optionally with an image for OCR.
@@ -78,10 +62,17 @@ def process_query(query, image_path=None):
     Returns:
         str: The agent's response
     """
-    agent = setup_agent_with_ocr()
+    agent = agent_registry.get("agent_with_ocr")
     
     try:
-        logger.info(f"Processing query: {query}")
+        logger.info("Processing query: %s", payload(query))
+
+        # Obvious intents get one tool call and one LLM call instead of a ReAct loop
+        weather_tool = agent_registry.shared("tool:weather", setup_weather_tool)
+        ocr_tool = agent_registry.shared("tool:ocr", setup_ocr_tool)
+        answer = intent_router.try_direct(query, image_path, "image" if image_path else None, {"weather": weather_tool, "ocr": ocr_tool}, 'gpt-4', "agent_with_ocr")
+        if answer is not None:
+            return answer
         
         # If an image is provided, include OCR information in the prompt
         if image_path:
@@ -97,7 +88,9 @@ def process_query(query, image_path=None):
             If it's a general question, use the search tool.
             """
         
-        result = agent.run(prompt)
+        started = time.perf_counter()
+        result = agent.run(prompt, callbacks=tracing.callbacks())
+        intent_router.get_router().record_agent_latency("agent_with_ocr", time.perf_counter() - started)
         logger.info("Query processed successfully")
         return result
     except Exception as e:
@@ -106,6 +99,7 @@ def process_query(query, image_path=None):
 
 # Example usage
 if __name__ == "__main__":
+    configure_logging()
     # Example 1: Text-only query
     result1 = process_query("What's the weather in New York?")
     print("Weather query result:")
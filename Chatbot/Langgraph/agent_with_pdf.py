@@ -1,15 +1,17 @@
 from dotenv import load_dotenv
-from langchain_community.utilities import DuckDuckGoSearchAPIWrapper, OpenWeatherMapAPIWrapper
-from langchain.tools import Tool
-from langchain.agents import initialize_agent, AgentType
-from langchain_openai import ChatOpenAI
 import os
+import time
 import logging
+from log_config import configure_logging, payload
+import agent_registry
+import tracing
+from web_tools import setup_search_tool, setup_weather_tool
+import intent_router
 from ocr_tool import setup_ocr_tool
+from document_library import setup_library_search_tool
 from pdf_extractor import setup_pdf_extractor
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -22,45 +24,24 @@ def setup_agent_with_pdf():
     # Set up API keys
     os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
 
-    # Initialize search and weather tools
-    search = DuckDuckGoSearchAPIWrapper()
-    weather = OpenWeatherMapAPIWrapper()
-    
-    def search_with_logging(query):
-        logger.info(f"Searching for: {query}")
-        result = search.run(query)
-        logger.info(f"Search result: {result}")
-        return result
-    
-    def weather_with_logging(query):
-        logger.info(f"Getting weather for: {query}")
-        result = weather.run(query)
-        logger.info(f"Weather result: {result}")
-        return result
-    
-    # Create tools
-    search_tool = Tool(
-        name="search",
-        description="Useful for searching the internet for recent news and information. Input should be a search query string.",
-        func=search_with_logging
-    )
-    
-    weather_tool = Tool(
-        name="weather",
-        description="Useful for getting current weather information for a specific location. Input should be a location name.",
-        func=weather_with_logging
-    )
+    # Shared search and weather tools (results are cached and coalesced across agents)
+    search_tool = agent_registry.shared("tool:search", setup_search_tool)
+    weather_tool = agent_registry.shared("tool:weather", setup_weather_tool)
     
     # Get the OCR and PDF tools
-    ocr_tool = setup_ocr_tool()
-    pdf_tool = setup_pdf_extractor()
+    ocr_tool = agent_registry.shared("tool:ocr", setup_ocr_tool)
+    library_tool = agent_registry.shared("tool:library_search", setup_library_search_tool)
+    pdf_tool = agent_registry.shared("tool:pdf_extractor", setup_pdf_extractor)
 
     # Initialize the LLM with the correct model name
-    chat_llm = ChatOpenAI(model='gpt-4')
+    chat_llm = agent_registry.chat_llm('gpt-4', temperature=0)
+
+    # langchain.agents takes seconds to import, so load it only when an agent is built
+    from langchain.agents import initialize_agent, AgentType
 
     # Create the agent with all tools
     agent = initialize_agent(
-        tools=[search_tool, weather_tool, ocr_tool, pdf_tool],
+        tools=[search_tool, weather_tool, ocr_tool, pdf_tool, library_tool],
         llm=chat_llm,
         agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
         verbose=True,
@@ -69,6 +50,9 @@ def setup_agent_with_pdf():
     
     return agent
 
+# Build the agent once per process and share it across requests
+agent_registry.register("agent_with_pdf", setup_agent_with_pdf)
+
 def process_query(query, file_path=None, file_type=None):
     """
     Process a user query, optionally with a file for OCR or PDF extraction.
@@ -81,10 +65,18 @@ def process_query(query, file_path=None, file_type=None):
     Returns:
         str: The agent's response
     """
-    agent = setup_agent_with_pdf()
+    agent = agent_registry.get("agent_with_pdf")
     
     try:
-        logger.info(f"Processing query: {query}")
+        logger.info("Processing query: %s", payload(query))
+
+        # Obvious intents get one tool call and one LLM call instead of a ReAct loop
+        weather_tool = agent_registry.shared("tool:weather", setup_weather_tool)
+        ocr_tool = agent_registry.shared("tool:ocr", setup_ocr_tool)
+        pdf_tool = agent_registry.shared("tool:pdf_extractor", setup_pdf_extractor)
+        answer = intent_router.try_direct(query, file_path, file_type, {"weather": weather_tool, "ocr": ocr_tool, "pdf": pdf_tool}, 'gpt-4', "agent_with_pdf")
+        if answer is not None:
+            return answer
         
         # If a file is provided, include appropriate information in the prompt
         if file_path and file_type:
@@ -98,7 +90,8 @@ def process_query(query, file_path=None, file_type=None):
                 prompt = f"""Please answer this question: {query}
                 
                 I've also provided a PDF file at {file_path}. If the question is about the PDF, 
-                use the PDF extractor tool to extract text and images from it and incorporate that information in your answer.
+                use the pdf_extractor tool with the input "{file_path} | <your question about the PDF>" 
+                to retrieve the relevant passages and incorporate that information in your answer.
                 """
             else:
                 prompt = f"""Please answer this question: {query}
@@ -113,7 +106,9 @@ def process_query(query, file_path=None, file_type=None):
             If it's a general question, use the search tool.
             """
         
-        result = agent.run(prompt)
+        started = time.perf_counter()
+        result = agent.run(prompt, callbacks=tracing.callbacks())
+        intent_router.get_router().record_agent_latency("agent_with_pdf", time.perf_counter() - started)
         logger.info("Query processed successfully")
         return result
     except Exception as e:
@@ -122,6 +117,7 @@ def process_query(query, file_path=None, file_type=None):
 
 # Example usage
 if __name__ == "__main__":
+    configure_logging()
     # Example 1: Text-only query
     result1 = process_query("What's the weather in New York?")
     print("Weather query result:")
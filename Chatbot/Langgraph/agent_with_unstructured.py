@@ -1,16 +1,19 @@
 from dotenv import load_dotenv
-from langchain_community.utilities import DuckDuckGoSearchAPIWrapper, OpenWeatherMapAPIWrapper
-from langchain.tools import Tool
-from langchain.agents import initialize_agent, AgentType
-from langchain_openai import ChatOpenAI
 import os
+import time
 import logging
+from log_config import configure_logging, payload
+import agent_registry
+import tracing
+from web_tools import setup_search_tool, setup_weather_tool
+import intent_router
 import json
 from ocr_tool import setup_ocr_tool
+from document_library import setup_library_search_tool
 from unstructured_pdf_ingestion import setup_unstructured_pdf_ingestion
+from vector_index import setup_semantic_pdf_search_tool
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -23,45 +26,25 @@ def setup_agent_with_unstructured():
     # Set up API keys
     os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
 
-    # Initialize search and weather tools
-    search = DuckDuckGoSearchAPIWrapper()
-    weather = OpenWeatherMapAPIWrapper()
-    
-    def search_with_logging(query):
-        logger.info(f"Searching for: {query}")
-        result = search.run(query)
-        logger.info(f"Search result: {result}")
-        return result
-    
-    def weather_with_logging(query):
-        logger.info(f"Getting weather for: {query}")
-        result = weather.run(query)
-        logger.info(f"Weather result: {result}")
-        return result
-    
-    # Create tools
-    search_tool = Tool(
-        name="search",
-        description="Useful for searching the internet for recent news and information. Input should be a search query string.",
-        func=search_with_logging
-    )
-    
-    weather_tool = Tool(
-        name="weather",
-        description="Useful for getting current weather information for a specific location. Input should be a location name.",
-        func=weather_with_logging
-    )
+    # Shared search and weather tools (results are cached and coalesced across agents)
+    search_tool = agent_registry.shared("tool:search", setup_search_tool)
+    weather_tool = agent_registry.shared("tool:weather", setup_weather_tool)
     
     # Get the OCR and unstructured PDF tools
-    ocr_tool = setup_ocr_tool()
-    pdf_ingestion_tool = setup_unstructured_pdf_ingestion()
+    ocr_tool = agent_registry.shared("tool:ocr", setup_ocr_tool)
+    library_tool = agent_registry.shared("tool:library_search", setup_library_search_tool)
+    pdf_ingestion_tool = agent_registry.shared("tool:pdf_ingestion", setup_unstructured_pdf_ingestion)
+    semantic_pdf_tool = agent_registry.shared("tool:semantic_pdf_search", setup_semantic_pdf_search_tool)
 
     # Initialize the LLM with the correct model name
-    chat_llm = ChatOpenAI(model='gpt-4')
+    chat_llm = agent_registry.chat_llm('gpt-4', temperature=0)
+
+    # langchain.agents takes seconds to import, so load it only when an agent is built
+    from langchain.agents import initialize_agent, AgentType
 
     # Create the agent with all tools
     agent = initialize_agent(
-        tools=[search_tool, weather_tool, ocr_tool, pdf_ingestion_tool],
+        tools=[search_tool, weather_tool, ocr_tool, pdf_ingestion_tool, semantic_pdf_tool, library_tool],
         llm=chat_llm,
         agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
         verbose=True,
@@ -70,6 +53,9 @@ def setup_agent_with_unstructured():
     
     return agent
 
+# Build the agent once per process and share it across requests
+agent_registry.register("agent_with_unstructured", setup_agent_with_unstructured)
+
 def process_query(query, file_path=None, file_type=None):
     """
     Process a user query, optionally with a file for OCR or PDF ingestion.
@@ -82,10 +68,18 @@ def process_query(query, file_path=None, file_type=None):
     Returns:
         str: The agent's response
     """
-    agent = setup_agent_with_unstructured()
+    agent = agent_registry.get("agent_with_unstructured")
     
     try:
-        logger.info(f"Processing query: {query}")
+        logger.info("Processing query: %s", payload(query))
+
+        # Obvious intents get one tool call and one LLM call instead of a ReAct loop
+        weather_tool = agent_registry.shared("tool:weather", setup_weather_tool)
+        ocr_tool = agent_registry.shared("tool:ocr", setup_ocr_tool)
+        pdf_tool = agent_registry.shared("tool:pdf_ingestion", setup_unstructured_pdf_ingestion)
+        answer = intent_router.try_direct(query, file_path, file_type, {"weather": weather_tool, "ocr": ocr_tool, "pdf": pdf_tool}, 'gpt-4', "agent_with_unstructured")
+        if answer is not None:
+            return answer
         
         # If a file is provided, include appropriate information in the prompt
         if file_path and file_type:
@@ -99,16 +93,17 @@ def process_query(query, file_path=None, file_type=None):
                 prompt = f"""Please answer this question: {query}
                 
                 I've also provided a PDF file at {file_path}. If the question is about the PDF, 
-                use the pdf_ingestion tool to extract structured content from it and incorporate that information in your answer.
+                use the pdf_ingestion tool with the input "{file_path} | <your question about the PDF>" 
+                to retrieve the relevant passages and incorporate that information in your answer.
                 
-                The pdf_ingestion tool will extract:
+                The pdf_ingestion tool searches the document's:
                 - Text content
                 - Titles and headings
                 - Tables
-                - Images
-                - Page breaks
                 
-                Use this structured information to provide a comprehensive answer.
+                Each passage comes with its page and section; use them to provide a comprehensive answer.
+                If the wording of the question may differ from the document's, use the semantic_pdf_search
+                tool with the same input instead.
                 """
             else:
                 prompt = f"""Please answer this question: {query}
@@ -123,7 +118,9 @@ def process_query(query, file_path=None, file_type=None):
             If it's a general question, use the search tool.
             """
         
-        result = agent.run(prompt)
+        started = time.perf_counter()
+        result = agent.run(prompt, callbacks=tracing.callbacks())
+        intent_router.get_router().record_agent_latency("agent_with_unstructured", time.perf_counter() - started)
         logger.info("Query processed successfully")
         return result
     except Exception as e:
@@ -142,7 +139,7 @@ def analyze_pdf_content(pdf_path, output_dir=None):
         dict: Analysis results
     """
     # Initialize the PDF ingestion tool
-    pdf_tool = setup_unstructured_pdf_ingestion()
+    pdf_tool = agent_registry.shared("tool:pdf_ingestion", setup_unstructured_pdf_ingestion)
     
     # Create output directory if specified
     if output_dir:
@@ -177,6 +174,7 @@ def analyze_pdf_content(pdf_path, output_dir=None):
 
 # Example usage
 if __name__ == "__main__":
+    configure_logging()
     # Example 1: Text-only query
     result1 = process_query("What's the weather in New York?")
     print("Weather query result:")
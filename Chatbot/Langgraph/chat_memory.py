@@ -0,0 +1,153 @@
+import os
+import logging
+from collections import deque
+from typing import Any, Deque, List, Optional, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+import agent_registry
+import tracing
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Memory policies selectable per session
+BUFFER = "buffer"      # every message, unbounded
+WINDOW = "window"      # newest messages that fit the token budget
+SUMMARY = "summary"    # window plus a rolling summary of evicted messages
+MEMORY_TYPES = (BUFFER, WINDOW, SUMMARY)
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("CHAT_MEMORY_TOKEN_BUDGET", "2000"))
+# After going over budget, evict down to this fraction so trimming (and summarising) happens in batches
+LOW_WATER_MARK = float(os.getenv("CHAT_MEMORY_LOW_WATER_MARK", "0.75"))
+SUMMARY_MODEL = os.getenv("CHAT_MEMORY_SUMMARY_MODEL", "gpt-4o-mini")
+SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_MEMORY_SUMMARY_MAX_TOKENS", "300"))
+
+SUMMARY_PROMPT = """Progressively summarize the conversation, adding onto the previous summary and returning a new summary.
+Keep names, facts, preferences and open questions. Use at most {max_words} words.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{lines}
+
+New summary:"""
+
+
+def _encoder(model: str):
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken missing, or its encoding files could not be downloaded
+        logger.warning(f"Falling back to estimated token counts: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """
+    Count tokens with tiktoken when available, else estimate four characters per token.
+    """
+    encoder = agent_registry.shared(f"tokenizer:{model}", lambda: _encoder(model) or False)
+    if encoder:
+        return len(encoder.encode(text))
+    return max(1, len(text) // 4)
+
+
+class SessionMemory:
+    """
+    Conversation memory for one chat session with a token budget.
+
+    Each message's token count is computed once when it is added and a running
+    total is kept, so checking the budget costs O(1) per turn. Messages are evicted
+    oldest-first, whole turns at a time; with the summary policy they are folded
+    into a rolling summary instead of being dropped.
+    """
+
+    def __init__(self, policy: str = SUMMARY, token_budget: int = DEFAULT_TOKEN_BUDGET, model: str = "gpt-4o",
+                 summary_model: str = SUMMARY_MODEL):
+        self.policy = policy
+        self.token_budget = token_budget
+        self.model = model
+        self.summary_model = summary_model
+        self.summary = ""
+        self.summary_tokens = 0
+        self._messages: Deque[Tuple[BaseMessage, int]] = deque()
+        self._tokens = 0
+
+    @property
+    def policy(self) -> str:
+        return self._policy
+
+    @policy.setter
+    def policy(self, policy: str) -> None:
+        if policy not in MEMORY_TYPES:
+            raise ValueError(f"Unknown memory type '{policy}', expected one of {MEMORY_TYPES}")
+        self._policy = policy
+
+    @property
+    def tokens(self) -> int:
+        """
+        Tokens the memory currently adds to a prompt.
+        """
+        return self._tokens + (self.summary_tokens if self.policy == SUMMARY else 0)
+
+    def add_turn(self, user_input: str, response: str) -> None:
+        """
+        Record one exchange, then trim the history if it exceeds the budget.
+        """
+        for message in (HumanMessage(content=user_input), AIMessage(content=response)):
+            tokens = count_tokens(message.content, self.model)
+            self._messages.append((message, tokens))
+            self._tokens += tokens
+
+        if self.policy != BUFFER and self.tokens > self.token_budget:
+            self._trim()
+
+    def _trim(self) -> None:
+        target = int(self.token_budget * LOW_WATER_MARK)
+        evicted: List[BaseMessage] = []
+        # Keep at least the latest turn even if it alone is over budget
+        while len(self._messages) > 2 and self.tokens > target:
+            for _ in range(2):
+                message, tokens = self._messages.popleft()
+                self._tokens -= tokens
+                evicted.append(message)
+
+        if evicted and self.policy == SUMMARY:
+            self._summarize(evicted)
+        logger.info(f"Trimmed {len(evicted)} messages from session memory ({self.tokens} tokens kept)")
+
+    def _summarize(self, messages: List[BaseMessage]) -> None:
+        lines = "\n".join(f"{'Human' if isinstance(m, HumanMessage) else 'AI'}: {m.content}" for m in messages)
+        try:
+            llm = agent_registry.chat_llm(self.summary_model)
+            prompt = SUMMARY_PROMPT.format(max_words=int(SUMMARY_MAX_TOKENS * 0.75), summary=self.summary or "(none)", lines=lines)
+            self.summary = llm.invoke(prompt, config={"callbacks": tracing.callbacks()}).content.strip()
+        except Exception as e:
+            # Keep the conversation going; the evicted turns are simply dropped
+            logger.error(f"Error summarizing conversation: {str(e)}")
+        self.summary_tokens = count_tokens(self.summary, self.model) if self.summary else 0
+
+    def messages(self) -> List[BaseMessage]:
+        """
+        Return the history to place in the prompt: the summary (if any) followed by the kept messages.
+        """
+        history = [message for message, _ in self._messages]
+        if self.summary and self.policy == SUMMARY:
+            history.insert(0, SystemMessage(content=f"Summary of the earlier conversation: {self.summary}"))
+        return history
+
+    def load_memory_variables(self, inputs: Optional[Any] = None) -> dict:
+        """
+        Same shape as LangChain memories, for code that reads {"history": [...]}.
+        """
+        return {"history": self.messages()}
+
+    def clear(self) -> None:
+        self._messages.clear()
+        self._tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
@@ -0,0 +1,412 @@
+import os
+import json
+import time
+import uuid
+import random
+import itertools
+import asyncio
+import logging
+import threading
+import http.client
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from log_config import configure_logging
+import agent_registry
+import tracing
+import cold_start
+from chat_memory import SessionMemory, SUMMARY, SUMMARY_MODEL
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+SERVICE_HOST = os.getenv("CHAT_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("CHAT_SERVICE_PORT", "8765"))
+CHAT_BACKEND = os.getenv("CHAT_BACKEND", "openai")
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o")
+MAX_SESSIONS = int(os.getenv("CHAT_SERVICE_MAX_SESSIONS", "10000"))
+SESSION_TTL = float(os.getenv("CHAT_SERVICE_SESSION_TTL", "3600"))
+# Upper bound on simultaneous upstream generations; extra turns queue
+MAX_STREAMS = int(os.getenv("CHAT_SERVICE_MAX_STREAMS", "256"))
+MAX_CONNECTIONS = int(os.getenv("CHAT_SERVICE_MAX_CONNECTIONS", "100"))
+
+SYSTEM_PROMPT = "You are a helpful AI assistant with memory of the conversation."
+
+
+def _to_openai(message: BaseMessage) -> Dict[str, str]:
+    if isinstance(message, HumanMessage):
+        role = "user"
+    elif isinstance(message, AIMessage):
+        role = "assistant"
+    else:
+        role = "system"
+    return {"role": role, "content": message.content}
+
+
+class OpenAIBackend:
+    """
+    Streams completions from OpenAI over one pooled, keep-alive HTTP client.
+    """
+
+    def __init__(self, model: str = CHAT_MODEL, max_connections: int = MAX_CONNECTIONS):
+        self.model = model
+        self.max_connections = max_connections
+        self._client = None
+
+    async def start(self) -> None:
+        # Built inside the event loop so the connection pool belongs to it
+        import httpx
+        from openai import AsyncOpenAI
+        self._client = AsyncOpenAI(
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                timeout=httpx.Timeout(120.0, connect=10.0),
+            ),
+            max_retries=2,
+        )
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        response = await self._client.chat.completions.create(model=self.model, messages=messages, stream=True)
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+
+
+class FakeBackend:
+    """
+    Offline backend that streams a canned reply with configurable latency, for load tests.
+    """
+
+    def __init__(self, ttft: float = 0.3, token_interval: float = 0.02, tokens: int = 40, jitter: float = 0.2):
+        self.ttft = ttft
+        self.token_interval = token_interval
+        self.tokens = tokens
+        self.jitter = jitter
+
+    async def start(self) -> None:
+        # Summaries must not reach the network either
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        agent_registry.register(f"llm:{SUMMARY_MODEL}", lambda: FakeListChatModel(responses=["Summary of the earlier conversation."]), replace=True)
+
+    def _delay(self, seconds: float) -> float:
+        return max(0.0, seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        await asyncio.sleep(self._delay(self.ttft))
+        words = f"You said: {messages[-1]['content']}".split() + ["lorem"] * self.tokens
+        for i, word in enumerate(words[:self.tokens]):
+            if i:
+                await asyncio.sleep(self._delay(self.token_interval))
+            yield ("" if i == 0 else " ") + word
+
+    async def close(self) -> None:
+        pass
+
+
+class Session:
+    def __init__(self, memory_type: str):
+        self.memory = SessionMemory(policy=memory_type)
+        self.lock = asyncio.Lock()
+        self.last_seen = time.monotonic()
+
+
+class ChatService:
+    """
+    Asyncio chat backend that owns sessions, their memory and the upstream LLM client.
+
+    Exposes a small HTTP/1.1 API on a local port:
+        POST   /chat             {"session_id", "message", "memory_type"?} -> NDJSON token stream
+        DELETE /sessions/<id>    forget a session
+        GET    /health           service statistics
+        GET    /metrics          tracing metrics in the Prometheus text format
+    Turns within a session run one at a time; different sessions run concurrently.
+    """
+
+    def __init__(self, backend=None, host: str = SERVICE_HOST, port: int = SERVICE_PORT,
+                 max_sessions: int = MAX_SESSIONS, session_ttl: float = SESSION_TTL, max_streams: int = MAX_STREAMS):
+        self.backend = backend or (FakeBackend() if CHAT_BACKEND == "fake" else OpenAIBackend())
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.active_streams = 0
+        self.turns = 0
+        self._streams = asyncio.Semaphore(max_streams)
+        self._server = None
+        self._sweeper = None
+
+    def _session(self, session_id: str, memory_type: Optional[str]) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = Session(memory_type or SUMMARY)
+            excess = len(self.sessions) - self.max_sessions
+            if excess > 0:
+                # Least recently used first; a session mid-turn is skipped, as in _sweep, so its turn keeps its memory
+                idle = (sid for sid, other in self.sessions.items() if not other.lock.locked() and sid != session_id)
+                for sid in list(itertools.islice(idle, excess)):
+                    del self.sessions[sid]
+        self.sessions.move_to_end(session_id)
+        session.last_seen = time.monotonic()
+        return session
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(min(60.0, self.session_ttl))
+            cutoff = time.monotonic() - self.session_ttl
+            expired = [sid for sid, session in self.sessions.items() if session.last_seen < cutoff and not session.lock.locked()]
+            for sid in expired:
+                del self.sessions[sid]
+            if expired:
+                logger.info(f"Expired {len(expired)} idle chat sessions")
+
+    async def _acquire(self, session_id: str, memory_type: Optional[str]) -> Session:
+        # Lock the session that is current once the lock is held; one deleted meanwhile is not used
+        while True:
+            session = self._session(session_id, memory_type)
+            await session.lock.acquire()
+            if self.sessions.get(session_id) is session:
+                return session
+            session.lock.release()
+
+    async def forget(self, session_id: str) -> None:
+        """
+        Drop a session, after the turn it is running (if any) has finished.
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            return
+        async with session.lock:
+            if self.sessions.get(session_id) is session:
+                del self.sessions[session_id]
+
+    async def chat(self, session_id: str, message: str, memory_type: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run one turn and yield {"token": ...} events, then a final {"done": True, ...} event.
+        """
+        session = await self._acquire(session_id, memory_type)
+        try:
+            if memory_type:
+                session.memory.policy = memory_type
+            messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+            messages += [_to_openai(m) for m in session.memory.messages()]
+            messages.append({"role": "user", "content": message})
+
+            started = time.perf_counter()
+            ttft = None
+            parts = []
+            async with self._streams:
+                self.active_streams += 1
+                try:
+                    # The backend bypasses LangChain, so the generation is traced by hand
+                    with tracing.span("llm", "chat_service.generate", model=getattr(self.backend, "model", None),
+                                      backend=type(self.backend).__name__) as span:
+                        async for token in self.backend.stream(messages):
+                            if ttft is None:
+                                ttft = time.perf_counter() - started
+                                span["ttft_ms"] = round(ttft * 1000, 3)
+                            parts.append(token)
+                            yield {"token": token}
+                        span["completion_chunks"] = len(parts)
+                finally:
+                    self.active_streams -= 1
+            total = time.perf_counter() - started
+
+            reply = "".join(parts)
+            # Summarising evicted turns is a blocking LLM call; keep it off the event loop
+            await asyncio.to_thread(session.memory.add_turn, message, reply)
+            self.turns += 1
+            logger.info("Chat turn for session %s: ttft=%.3fs total=%.3fs", session_id, ttft or total, total)
+            yield {"done": True, "ttft": ttft or total, "total": total}
+        finally:
+            session.lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self.sessions), "active_streams": self.active_streams, "turns": self.turns}
+
+    # HTTP plumbing
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {http.client.responses.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    @staticmethod
+    async def _send_text(writer: asyncio.StreamWriter, status: int, text: str, content_type: str) -> None:
+        body = text.encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {http.client.responses.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    @staticmethod
+    async def _send_chunk(writer: asyncio.StreamWriter, payload: Dict[str, Any]) -> None:
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        if method == "GET" and path == "/health":
+            await self._send_json(writer, 200, self.stats())
+        elif method == "GET" and path == "/metrics":
+            await self._send_text(writer, 200, tracing.render_metrics(), "text/plain; version=0.0.4; charset=utf-8")
+        elif method == "DELETE" and path.startswith("/sessions/"):
+            await self.forget(path[len("/sessions/"):])
+            await self._send_json(writer, 200, {"deleted": True})
+        elif method == "POST" and path == "/chat":
+            try:
+                request = json.loads(body or b"{}")
+                session_id, message = str(request["session_id"]), str(request["message"])
+            except (ValueError, KeyError) as e:
+                await self._send_json(writer, 400, {"error": f"Invalid chat request: {str(e)}"})
+                return
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n")
+            try:
+                async for event in self.chat(session_id, message, request.get("memory_type")):
+                    await self._send_chunk(writer, event)
+            except (ConnectionError, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                logger.error(f"Error in chat turn: {str(e)}")
+                await self._send_chunk(writer, {"error": str(e)})
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        else:
+            await self._send_json(writer, 404, {"error": f"No route for {method} {path}"})
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            # Keep-alive: serve requests on this connection until the client closes it
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                await self._route(method, path, body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        await self.backend.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._sweeper = asyncio.create_task(self._sweep())
+        logger.info(f"Chat service listening on http://{self.host}:{self.port} ({type(self.backend).__name__})")
+
+    async def close(self) -> None:
+        if self._sweeper:
+            self._sweeper.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.backend.close()
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+
+class ChatServiceClient:
+    """
+    Blocking client for the chat service, suitable for the Streamlit script thread.
+
+    Each thread keeps one keep-alive connection to the service.
+    """
+
+    def __init__(self, url: str, timeout: float = 120.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._local.connection
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> http.client.HTTPResponse:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+        for attempt in range(2):
+            try:
+                connection = self._connection()
+                connection.request(method, path, body, headers)
+                return connection.getresponse()
+            except (ConnectionError, http.client.HTTPException):
+                # The service may have dropped an idle keep-alive connection; reconnect once
+                self._local.connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+    def stream_chat(self, session_id: str, message: str, memory_type: Optional[str] = None,
+                    metrics: Optional[Dict[str, float]] = None) -> Iterator[str]:
+        """
+        Send one message and yield the reply tokens as the service streams them.
+
+        Args:
+            session_id (str): Conversation identifier
+            message (str): User message
+            memory_type (str, optional): Memory policy for the session
+            metrics (dict, optional): Filled with "ttft" and "total" seconds when the turn completes
+        """
+        started = time.perf_counter()
+        response = self._request("POST", "/chat", {"session_id": session_id, "message": message, "memory_type": memory_type})
+        if response.status != 200:
+            raise RuntimeError(f"Chat service error {response.status}: {response.read().decode('utf-8', 'replace')}")
+        for line in response:
+            event = json.loads(line)
+            if "token" in event:
+                if metrics is not None and "ttft" not in metrics:
+                    metrics["ttft"] = time.perf_counter() - started
+                yield event["token"]
+            elif "error" in event:
+                raise RuntimeError(f"Chat service error: {event['error']}")
+        if metrics is not None:
+            metrics["total"] = time.perf_counter() - started
+            metrics.setdefault("ttft", metrics["total"])
+
+    def delete_session(self, session_id: str) -> None:
+        self._request("DELETE", f"/sessions/{session_id}").read()
+
+    def health(self) -> Dict[str, Any]:
+        return json.loads(self._request("GET", "/health").read())
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+# Example usage
+if __name__ == "__main__":
+    configure_logging()
+    # PREWARM=chat builds the summary model and tokenizer while the server starts
+    cold_start.prewarm()
+    # CHAT_BACKEND=fake runs the service without network access, e.g. for load tests
+    asyncio.run(ChatService().serve_forever())
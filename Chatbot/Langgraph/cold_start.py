@@ -0,0 +1,202 @@
+import os
+import re
+import math
+import sys
+import json
+import time
+import logging
+import argparse
+import importlib
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import agent_registry
+from log_config import configure_logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Comma-separated targets to build at startup: agent modules and/or the models in MODELS, e.g. "chat" or
+# "agent_with_unstructured,ocr,pdf". Empty disables pre-warming.
+PREWARM = os.getenv("PREWARM", "")
+PREWARM_WORKERS = int(os.getenv("PREWARM_WORKERS", "4"))
+
+# Agent modules and the registry key each one registers its agent under
+AGENTS = {
+    "search_agent": "search_agent",
+    "agent_with_ocr": "agent_with_ocr",
+    "agent_with_pdf": "agent_with_pdf",
+    "agent_with_unstructured": "agent_with_unstructured",
+    "langgraph_agent": "langgraph_agent",
+    "AgentExecutor_tools_prompt": "agent_executor_tools_prompt",
+    "Chatbot_topic_langchain": "chatbot_topic_langchain",
+}
+
+# Entry points profiled by default
+PROFILE_MODULES = ("chat_memory", "chat_service", "search_agent", "agent_with_ocr", "agent_with_pdf",
+                   "agent_with_unstructured", "langgraph_agent")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def _warm_chat() -> None:
+    # Summary model client (imports langchain_openai/openai) and the tokenizer used by session memory
+    from chat_memory import SUMMARY_MODEL, count_tokens
+    count_tokens("")
+    agent_registry.chat_llm(SUMMARY_MODEL)
+
+
+def _warm_ocr() -> None:
+    from ocr_engine import get_ocr_engine
+    get_ocr_engine().warm_up()
+
+
+def _warm_pdf() -> None:
+    from unstructured_pdf_ingestion import load_partitioner
+    load_partitioner()
+
+
+# Heavy models and libraries that can be loaded independently of any agent
+MODELS: Dict[str, Callable[[], None]] = {
+    "chat": _warm_chat,
+    "ocr": _warm_ocr,
+    "pdf": _warm_pdf,
+}
+
+
+def _warm_agent(module_name: str) -> None:
+    importlib.import_module(module_name)
+    agent_registry.get(AGENTS[module_name])
+
+
+def prewarm(targets: Optional[Iterable[str]] = None, background: bool = True,
+            max_workers: int = PREWARM_WORKERS) -> Dict[str, Future]:
+    """
+    Import and build agents and models before the first request, in parallel.
+
+    Each target runs in its own thread, so e.g. the OCR reader, the PDF partitioner
+    and an agent load at the same time. Requests that arrive earlier simply wait on
+    the registry's build lock for the entry they need.
+
+    Args:
+        targets (iterable, optional): Agent module names and/or MODELS keys; PREWARM by default
+        background (bool): Return immediately instead of waiting for every target
+        max_workers (int): Number of targets loaded concurrently
+
+    Returns:
+        Dict[str, Future]: One future per target
+    """
+    if targets is None:
+        targets = [t.strip() for t in PREWARM.split(",") if t.strip()]
+    tasks = {}
+    for target in targets:
+        if target in MODELS:
+            tasks[target] = MODELS[target]
+        elif target in AGENTS:
+            tasks[target] = lambda target=target: _warm_agent(target)
+        else:
+            logger.warning(f"Unknown pre-warm target: {target}")
+    if not tasks:
+        return {}
+
+    def run(name, task):
+        started = time.perf_counter()
+        try:
+            task()
+        except Exception as e:
+            logger.error(f"Error pre-warming {name}: {str(e)}")
+            raise
+        logger.info("Pre-warmed %s in %.2fs", name, time.perf_counter() - started)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prewarm")
+    futures = {name: executor.submit(run, name, task) for name, task in tasks.items()}
+    executor.shutdown(wait=not background)
+    return futures
+
+
+def profile_import(module: str, top: int = 10, ready: bool = False) -> Dict[str, Any]:
+    """
+    Import a module in a fresh interpreter under -X importtime and summarise the cost.
+
+    Args:
+        module (str): Module to import, resolved from this directory
+        top (int): Number of packages and direct imports to report
+        ready (bool): Also build the module's agent (see AGENTS) and time it
+
+    Returns:
+        dict: Wall time, time to ready, the costliest top-level packages (self time)
+        and the costliest direct imports of the module (cumulative time)
+    """
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    if ready:
+        # A failed build (e.g. a missing API key) is reported without losing the import profile
+        code += ("\nimport cold_start; t = time.perf_counter()"
+                 f"\ntry: cold_start.prewarm([{module!r}], background=False)[{module!r}].result(); print(time.perf_counter() - t)"
+                 "\nexcept Exception as e: print('nan'); print(f'{type(e).__name__}: {e}', file=sys.stderr)")
+        code = "import sys\n" + code
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed: {completed.stderr.strip().splitlines()[-1:]}")
+
+    by_package: Dict[str, int] = {}
+    direct: List[Dict[str, Any]] = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match.group(1)), int(match.group(2)), match.group(3), match.group(4)
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+        # The module itself is printed last at depth 0, its direct imports at depth 1
+        if len(indent) == 2:
+            direct.append({"module": name, "seconds": cumulative_us / 1e6})
+
+    timings = [float(value) for value in completed.stdout.split()[-(2 if ready else 1):]]
+    ready_error = None
+    if ready and math.isnan(timings[1]):
+        ready_error = completed.stderr.strip().splitlines()[-1]
+    packages = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "import_seconds": timings[0],
+        "ready_seconds": timings[1] if ready and ready_error is None else None,
+        "ready_error": ready_error,
+        "packages": [{"package": name, "seconds": us / 1e6} for name, us in packages],
+        "direct_imports": sorted(direct, key=lambda entry: entry["seconds"], reverse=True)[:top],
+    }
+
+
+def format_report(profiles: List[Dict[str, Any]]) -> List[str]:
+    lines = []
+    for profile in profiles:
+        ready = ""
+        if profile["ready_seconds"] is not None:
+            ready = f", ready in {profile['ready_seconds']:.2f}s more"
+        elif profile["ready_error"]:
+            ready = f", build failed ({profile['ready_error']})"
+        lines.append(f"{profile['module']}: import {profile['import_seconds']:.2f}s{ready}")
+        lines.append("  slowest direct imports: " + ", ".join(f"{e['module']} {e['seconds']:.2f}s" for e in profile["direct_imports"]))
+        lines.append("  by package (self time): " + ", ".join(f"{e['package']} {e['seconds']:.2f}s" for e in profile["packages"]))
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report import time per entry point, each in a fresh interpreter.")
+    parser.add_argument("--modules", default=",".join(PROFILE_MODULES), help="Comma-separated modules to import")
+    parser.add_argument("--top", type=int, default=8, help="Packages and direct imports listed per module")
+    parser.add_argument("--ready", action="store_true", help="Also time building each agent after the import")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+    configure_logging(level="WARNING")
+
+    profiles = []
+    for module in [m.strip() for m in args.modules.split(",") if m.strip()]:
+        try:
+            profiles.append(profile_import(module, args.top, args.ready and module in AGENTS))
+        except RuntimeError as e:
+            logger.error(str(e))
+    print("\n".join(format_report(profiles)))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(profiles, f, indent=2)
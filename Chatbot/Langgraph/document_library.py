@@ -0,0 +1,248 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+from langchain_core.tools import Tool
+import agent_registry
+from log_config import payload
+from ingestion_store import file_hash
+from pdf_retrieval import tokenize
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIBRARY_PATH = os.getenv("DOCUMENT_LIBRARY_PATH", os.path.join(os.path.expanduser("~"), ".cache", "agentic_ai", "document_library.sqlite"))
+BATCH_SIZE = int(os.getenv("DOCUMENT_LIBRARY_BATCH_SIZE", "500"))
+
+
+class DocumentLibrary:
+    """
+    Persistent full-text library over every processed PDF and image.
+
+    Passages are indexed in an SQLite FTS5 table together with their document,
+    page and element provenance. Documents are identified by content hash, so
+    re-processing an unchanged file does not index it twice.
+    """
+
+    def __init__(self, path: str = DEFAULT_LIBRARY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "doc_id INTEGER PRIMARY KEY, path TEXT NOT NULL, sha256 TEXT NOT NULL, source TEXT NOT NULL, "
+            "passage_count INTEGER NOT NULL DEFAULT 0, indexed_at REAL NOT NULL, UNIQUE (sha256, source))"
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5("
+            "text, section, doc_id UNINDEXED, page UNINDEXED, element UNINDEXED, tokenize='porter unicode61')"
+        )
+        self._conn.commit()
+
+    def index_document(self, path: str, source: str, passages: Iterable[Dict[str, Any]], batch_size: int = BATCH_SIZE) -> int:
+        """
+        Add a document's passages to the library unless its content is already indexed.
+
+        Args:
+            path (str): Path of the processed file
+            source (str): Which tool produced the passages, e.g. "pdf_extractor", "pdf_ingestion", "ocr"
+            passages (iterable): Dicts with "text" and optional "page", "element" and "section"
+            batch_size (int): Rows inserted per executemany call
+
+        Returns:
+            int: Number of passages indexed (0 when the document was already in the library)
+        """
+        sha256 = file_hash(path)
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM documents WHERE sha256 = ? AND source = ?", (sha256, source)).fetchone():
+                return 0
+
+            count = 0
+            # One transaction per document; rows go in with executemany batches
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO documents (path, sha256, source, indexed_at) VALUES (?, ?, ?, ?)",
+                    (os.path.abspath(path), sha256, source, time.time()),
+                )
+                doc_id = cursor.lastrowid
+                batch = []
+                for passage in passages:
+                    text = (passage.get("text") or "").strip()
+                    if not text:
+                        continue
+                    batch.append((text, passage.get("section") or "", doc_id, passage.get("page"), passage.get("element")))
+                    if len(batch) >= batch_size:
+                        self._conn.executemany("INSERT INTO passages (text, section, doc_id, page, element) VALUES (?, ?, ?, ?, ?)", batch)
+                        count += len(batch)
+                        batch = []
+                if batch:
+                    self._conn.executemany("INSERT INTO passages (text, section, doc_id, page, element) VALUES (?, ?, ?, ?, ?)", batch)
+                    count += len(batch)
+                self._conn.execute("UPDATE documents SET passage_count = ? WHERE doc_id = ?", (count, doc_id))
+
+        logger.info("Indexed %d passages from %s into the document library", count, payload(path))
+        return count
+
+    @staticmethod
+    def _match_expression(query: str, any_term: bool = False) -> Optional[str]:
+        # Quote every token so user input cannot inject FTS5 syntax
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        return (" OR " if any_term else " ").join(f'"{token}"' for token in tokens)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Search every indexed passage.
+
+        All query terms must match; when nothing does, passages matching any term are returned.
+
+        Returns:
+            list: Matches with path, source, page, element, section, snippet and rank (lower is better)
+        """
+        results: List[Dict[str, Any]] = []
+        for any_term in (False, True):
+            expression = self._match_expression(query, any_term)
+            if expression is None:
+                return []
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT d.path, d.source, passages.page, passages.element, passages.section, "
+                    "snippet(passages, 0, '[', ']', '...', 16), bm25(passages) AS rank "
+                    "FROM passages JOIN documents d ON d.doc_id = passages.doc_id "
+                    "WHERE passages MATCH ? ORDER BY rank LIMIT ?",
+                    (expression, limit),
+                ).fetchall()
+            results = [
+                {"path": path, "source": source, "page": page, "element": element,
+                 "section": section or None, "snippet": snippet, "rank": round(rank, 3)}
+                for path, source, page, element, section, snippet, rank in rows
+            ]
+            if results:
+                break
+        return results
+
+    def search_documents(self, query: str, limit: int = 10, max_pages: int = 200) -> List[Dict[str, Any]]:
+        """
+        Return the documents that best match a query, with the pages that mention it.
+
+        Passages are grouped per document in SQLite, so every matching document
+        competes for the top places however many passages each one has. Snippets
+        and page lists are only built for the documents returned.
+
+        Args:
+            query (str): Words or phrase to look for
+            limit (int): Number of documents
+            max_pages (int): Most pages listed per document
+
+        Returns:
+            list: Documents with path, source, pages, best_snippet, rank (lower is better) and matches
+        """
+        for any_term in (False, True):
+            expression = self._match_expression(query, any_term)
+            if expression is None:
+                return []
+            with self._lock:
+                winners = self._conn.execute(
+                    # bm25() cannot be aggregated directly; MATERIALIZED keeps SQLite from flattening the subquery
+                    "WITH hits AS MATERIALIZED (SELECT doc_id, bm25(passages) AS rank FROM passages WHERE passages MATCH ?) "
+                    "SELECT d.doc_id, d.path, d.source, MIN(hits.rank) AS best, COUNT(*) "
+                    "FROM hits JOIN documents d ON d.doc_id = hits.doc_id GROUP BY d.doc_id ORDER BY best LIMIT ?",
+                    (expression, limit),
+                ).fetchall()
+                documents = []
+                for doc_id, path, source, rank, matches in winners:
+                    snippet = self._conn.execute(
+                        "SELECT snippet(passages, 0, '[', ']', '...', 16) FROM passages "
+                        "WHERE passages MATCH ? AND doc_id = ? ORDER BY bm25(passages) LIMIT 1",
+                        (expression, doc_id),
+                    ).fetchone()
+                    pages = self._conn.execute(
+                        "SELECT DISTINCT page FROM passages WHERE passages MATCH ? AND doc_id = ? AND page IS NOT NULL "
+                        "ORDER BY page LIMIT ?",
+                        (expression, doc_id, max_pages),
+                    ).fetchall()
+                    documents.append({
+                        "path": path, "source": source, "pages": [page for (page,) in pages],
+                        "best_snippet": snippet[0] if snippet else "", "rank": round(rank, 3), "matches": matches,
+                    })
+            if documents:
+                return documents
+        return []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            documents, passages = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(passage_count), 0) FROM documents").fetchone()
+        return {"documents": documents, "passages": passages}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def get_document_library() -> Optional[DocumentLibrary]:
+    """
+    Return the process-wide document library, or None when disabled with DOCUMENT_LIBRARY=0.
+    """
+    if os.getenv("DOCUMENT_LIBRARY", "1") == "0":
+        return None
+    return agent_registry.shared("document_library", DocumentLibrary)
+
+
+def add_to_library(path: str, source: str, passages: Iterable[Dict[str, Any]]) -> None:
+    """
+    Index a processed file into the shared library; failures are logged and never raised.
+    """
+    try:
+        library = get_document_library()
+        if library is not None:
+            library.index_document(path, source, passages)
+    except Exception as e:
+        logger.error(f"Error indexing {path} into the document library: {str(e)}")
+
+
+def setup_library_search_tool():
+    """
+    Initialize a tool that searches every document processed so far.
+    """
+    def search_library(query):
+        """
+        Search the document library and list the matching documents.
+
+        Args:
+            query (str): Words or phrase to look for
+
+        Returns:
+            str: Matching documents with pages and a snippet
+        """
+        try:
+            logger.info("Searching document library for: %s", payload(query))
+            library = get_document_library()
+            if library is None:
+                return "The document library is disabled."
+            documents = library.search_documents(query)
+            if not documents:
+                return f"No documents in the library mention: {query}"
+            lines = []
+            for document in documents:
+                pages = ", ".join(str(page) for page in sorted(document["pages"])[:20])
+                lines.append(f"- {document['path']}" + (f" (pages {pages})" if pages else "") + f": {document['best_snippet']}")
+            return "\n".join(lines)
+        except Exception as e:
+            logger.error(f"Error searching document library: {str(e)}")
+            return f"Error searching document library: {str(e)}"
+
+    library_tool = Tool(
+        name="library_search",
+        description="Useful for finding which previously processed PDFs or images mention something. Input should be the words or phrase to search for.",
+        func=search_library
+    )
+
+    return library_tool
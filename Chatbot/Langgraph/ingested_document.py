@@ -0,0 +1,233 @@
+import os
+import logging
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Element type codes stored in the kinds column
+KINDS = ("text", "title", "table", "image", "page_break", "other")
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+
+class DocumentView:
+    """
+    Read-only view over a subset of a document's elements.
+
+    A view holds a slice of the document's index column, or a range of indices for
+    the whole document, plus an optional type filter; creating or narrowing a view
+    never copies element data.
+    """
+
+    def __init__(self, document: "IngestedDocument", indices: Sequence[int], kind_codes: Optional[frozenset] = None):
+        self._document = document
+        self._indices = indices
+        self._kind_codes = kind_codes
+
+    def of_type(self, *kinds: str) -> "DocumentView":
+        """
+        Narrow the view to the given element types, e.g. view.of_type("title", "table").
+        """
+        codes = frozenset(KIND_CODES[kind] for kind in kinds)
+        if self._kind_codes is not None:
+            codes &= self._kind_codes
+        return DocumentView(self._document, self._indices, codes)
+
+    def indices(self) -> Iterator[int]:
+        """
+        Iterate over the element indices in the view.
+        """
+        kinds = self._document.kinds
+        for i in self._indices:
+            if self._kind_codes is None or kinds[i] in self._kind_codes:
+                yield i
+
+    def __iter__(self) -> Iterator[Tuple[int, str, int, str]]:
+        """
+        Iterate over (index, kind, page_number, text) tuples.
+        """
+        document = self._document
+        for i in self.indices():
+            yield i, KINDS[document.kinds[i]], document.pages[i], document.text(i)
+
+    def __len__(self) -> int:
+        if self._kind_codes is None:
+            return len(self._indices)
+        if self._indices == range(len(self._document)):
+            # Whole document: count the kinds column directly instead of walking the indices
+            return sum(self._document.kinds.count(code) for code in self._kind_codes)
+        return sum(1 for _ in self.indices())
+
+    def texts(self) -> List[str]:
+        return [self._document.text(i) for i in self.indices()]
+
+
+class IngestedDocument:
+    """
+    Columnar representation of an ingested PDF.
+
+    Element types, page numbers and text offsets live in typed arrays, all element
+    text is kept in one string arena, and a per-page index maps each page to its elements.
+    Page number 0 marks elements without a page.
+    """
+
+    def __init__(self, kinds: array, pages: array, offsets: array, arena: str,
+                 html: Dict[int, str], images: Dict[int, bytes], extra: Optional[Dict[str, Any]] = None):
+        self.kinds = kinds
+        self.pages = pages
+        self.offsets = offsets
+        self.arena = arena
+        self.html = html
+        self.images = images
+        self.extra = extra or {}
+        self._build_page_index()
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], extra: Optional[Dict[str, Any]] = None) -> "IngestedDocument":
+        """
+        Build the columnar document from element records in index order.
+        """
+        kinds = array("B")
+        pages = array("i")
+        offsets = array("q", [0])
+        parts = []
+        html = {}
+        images = {}
+        length = 0
+        for i, record in enumerate(records):
+            kinds.append(KIND_CODES.get(record["kind"], KIND_CODES["other"]))
+            pages.append(record.get("page_number") or 0)
+            text = record.get("text") or ""
+            parts.append(text)
+            length += len(text)
+            offsets.append(length)
+            if record.get("text_as_html"):
+                html[i] = record["text_as_html"]
+            if record.get("image_bytes"):
+                images[i] = record["image_bytes"]
+        return cls(kinds, pages, offsets, "".join(parts), html, images, extra)
+
+    def _build_page_index(self) -> None:
+        # Counting sort of element indices by page: page p owns page_index[page_offsets[p]:page_offsets[p + 1]]
+        max_page = max(self.pages) if self.pages else 0
+        counts = array("q", [0]) * (max_page + 2)
+        for page in self.pages:
+            counts[page + 1] += 1
+        for p in range(1, len(counts)):
+            counts[p] += counts[p - 1]
+        self.page_offsets = counts
+        cursor = array("q", counts)
+        self.page_index = array("q", [0]) * len(self.pages)
+        for i, page in enumerate(self.pages):
+            self.page_index[cursor[page]] = i
+            cursor[page] += 1
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_numbers())
+
+    def page_numbers(self) -> List[int]:
+        """
+        Return the page numbers that have at least one element.
+        """
+        return [p for p in range(1, len(self.page_offsets) - 1) if self.page_offsets[p + 1] > self.page_offsets[p]]
+
+    def text(self, index: int) -> str:
+        return self.arena[self.offsets[index]:self.offsets[index + 1]]
+
+    def kind(self, index: int) -> str:
+        return KINDS[self.kinds[index]]
+
+    def all(self) -> DocumentView:
+        """
+        View over every element in index order.
+        """
+        return DocumentView(self, range(len(self)))
+
+    def page_range(self, start_page: int, end_page: Optional[int] = None) -> DocumentView:
+        """
+        View over the elements of pages start_page..end_page (inclusive, 1-based).
+        """
+        last = len(self.page_offsets) - 2
+        end_page = last if end_page is None else min(end_page, last)
+        start_page = max(start_page, 1)
+        if end_page < start_page:
+            return DocumentView(self, memoryview(self.page_index)[0:0])
+        start = self.page_offsets[start_page]
+        end = self.page_offsets[end_page + 1]
+        return DocumentView(self, memoryview(self.page_index)[start:end])
+
+    def of_type(self, *kinds: str) -> DocumentView:
+        return self.all().of_type(*kinds)
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over element records (the form kept in the ingestion store).
+        """
+        for i in range(len(self)):
+            yield {
+                "index": i,
+                "kind": self.kind(i),
+                "text": self.text(i),
+                "page_number": self.pages[i] or None,
+                "text_as_html": self.html.get(i),
+                "image_path": None,
+                "image_bytes": self.images.get(i),
+            }
+
+    def to_dict(self, extract_images: bool = False, output_dir: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Return the legacy dict-of-lists shape produced by ingest_pdf.
+
+        Args:
+            extract_images (bool): Write embedded images to output_dir
+            output_dir (str, optional): Directory to save images
+
+        Returns:
+            dict: "text", "titles", "tables", "images", "page_breaks" and "metadata" lists, plus extra keys
+        """
+        content = {
+            "text": [],
+            "titles": [],
+            "tables": [],
+            "images": [],
+            "page_breaks": [],
+            "metadata": {}
+        }
+
+        for i in range(len(self)):
+            page_number = self.pages[i] or None
+            kind = KINDS[self.kinds[i]]
+
+            # Track page breaks
+            if page_number:
+                content["page_breaks"].append({"index": i, "page_number": page_number})
+
+            # Every Text subclass (titles, tables, images included) is listed as text
+            if kind != "other":
+                content["text"].append({"index": i, "text": self.text(i), "page_number": page_number})
+
+            if kind == "title":
+                content["titles"].append({"index": i, "text": self.text(i), "page_number": page_number})
+
+            if kind == "table":
+                content["tables"].append({"index": i, "data": self.html.get(i, ""), "page_number": page_number})
+
+            if kind == "image":
+                image_info = {"index": i, "page_number": page_number}
+
+                # Save image if requested
+                if extract_images and output_dir and i in self.images:
+                    output_path = os.path.join(output_dir, f"image_{i}.png")
+                    with open(output_path, "wb") as img_file:
+                        img_file.write(self.images[i])
+                    image_info["path"] = output_path
+
+                content["images"].append(image_info)
+
+        content.update(self.extra)
+        return content
@@ -0,0 +1,464 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+from typing import Any, Dict, List, Optional
+import fitz  # PyMuPDF
+from log_config import configure_logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Synthetic corpora: page count, words per page and how often a page gets an image,
+# is scanned (image only, no text layer) or carries a ruled table; 0 means never
+CORPORA = {
+    "text_sparse": {"pages": 50, "words_per_page": 80},
+    "text_dense": {"pages": 50, "words_per_page": 600},
+    "images": {"pages": 20, "words_per_page": 200, "image_every": 1},
+    "scanned": {"pages": 10, "words_per_page": 200, "scanned_every": 1},
+    "tables": {"pages": 20, "words_per_page": 150, "table_every": 1},
+    "mixed": {"pages": 40, "words_per_page": 300, "image_every": 3, "scanned_every": 5, "table_every": 4},
+    "large": {"pages": 300, "words_per_page": 400, "image_every": 10},
+}
+
+MODES = ("pdf_extractor", "pdf_extractor_serial", "pdf_extractor_text_only",
+         "ingest_fast", "ingest_adaptive", "ingest_store_hit")
+DEFAULT_MODES = ("pdf_extractor", "pdf_extractor_serial", "ingest_fast", "ingest_adaptive", "ingest_store_hit")
+DEFAULT_OCR_SETTINGS = "0,1"
+OCR_PAGES = int(os.getenv("BENCH_OCR_PAGES", "10"))
+RUN_TIMEOUT = float(os.getenv("BENCH_RUN_TIMEOUT", "1800"))
+
+# Allowed relative change per metric before a run counts as a regression
+DEFAULT_THRESHOLDS = {"pages_per_sec": -0.20, "peak_rss_kb": 0.25, "bytes_written": 0.10}
+
+_WORDS = ("revenue growth quarter market product customer analysis report section table figure result "
+          "method model data system performance cost service region forecast target risk summary plan "
+          "review team project design process value index measure source").split()
+
+
+def _paragraphs(rnd: random.Random, words: int) -> str:
+    out = []
+    for start in range(0, words, 60):
+        sentence = " ".join(rnd.choice(_WORDS) for _ in range(min(60, words - start)))
+        out.append(sentence.capitalize() + ".")
+    return "\n\n".join(out)
+
+
+def _draw_table(page, rnd: random.Random, top: float, rows: int = 8, cols: int = 5) -> float:
+    left, width, row_height = 50, page.rect.width - 100, 18
+    col_width = width / cols
+    for r in range(rows + 1):
+        y = top + r * row_height
+        page.draw_line((left, y), (left + width, y))
+    for c in range(cols + 1):
+        x = left + c * col_width
+        page.draw_line((x, top), (x, top + rows * row_height))
+    for r in range(rows):
+        for c in range(cols):
+            cell = rnd.choice(_WORDS) if r == 0 else f"{rnd.uniform(0, 1000):.1f}"
+            page.insert_text((left + c * col_width + 4, top + r * row_height + 13), cell, fontsize=9)
+    return top + rows * row_height + 20
+
+
+def _noise_pixmap(rnd: random.Random, width: int, height: int) -> fitz.Pixmap:
+    # Random pixels do not compress, so every image is a realistic size for extraction
+    return fitz.Pixmap(fitz.csRGB, width, height, rnd.randbytes(width * height * 3), False)
+
+
+def _scanned_page(document, rnd: random.Random, words: int, dpi: int) -> None:
+    # Typeset the text on a scratch page and keep only its raster, like a scan without OCR
+    with fitz.open() as scratch:
+        source = scratch.new_page()
+        source.insert_textbox(source.rect + (50, 50, -50, -50), _paragraphs(rnd, words), fontsize=10)
+        pixmap = source.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    page = document.new_page()
+    page.insert_image(page.rect, pixmap=pixmap)
+
+
+def generate_pdf(path: str, pages: int, words_per_page: int = 300, image_every: int = 0, scanned_every: int = 0,
+                 table_every: int = 0, scan_dpi: int = 150, seed: int = 0) -> str:
+    """
+    Write a synthetic PDF with the given mix of text, images, tables and scanned pages.
+
+    Args:
+        path (str): Output file
+        pages (int): Number of pages
+        words_per_page (int): Text density of each page
+        image_every (int): Every n-th page gets an embedded raster image (0 = none)
+        scanned_every (int): Every n-th page is an image-only scan (0 = none)
+        table_every (int): Every n-th page gets a ruled table (0 = none)
+        scan_dpi (int): Resolution of scanned pages
+        seed (int): Seed, so the same arguments always give the same document
+
+    Returns:
+        str: path
+    """
+    rnd = random.Random(seed)
+    with fitz.open() as document:
+        for i in range(pages):
+            if scanned_every and i % scanned_every == scanned_every - 1:
+                _scanned_page(document, rnd, words_per_page, scan_dpi)
+                continue
+
+            page = document.new_page()
+            top = 50
+            page.insert_text((50, top), f"Section {i + 1}: {rnd.choice(_WORDS).title()} {rnd.choice(_WORDS)}", fontsize=16)
+            top += 25
+            if table_every and i % table_every == table_every - 1:
+                top = _draw_table(page, rnd, top)
+            if image_every and i % image_every == image_every - 1:
+                rect = fitz.Rect(50, top, 350, top + 200)
+                page.insert_image(rect, pixmap=_noise_pixmap(rnd, 300, 200))
+                top = rect.y1 + 15
+            page.insert_textbox(fitz.Rect(50, top, page.rect.width - 50, page.rect.height - 50),
+                                _paragraphs(rnd, words_per_page), fontsize=9)
+        document.save(path, garbage=3, deflate=True)
+    return path
+
+
+def generate_corpus(directory: str, corpora=None, scale: float = 1.0, seed: int = 0) -> Dict[str, str]:
+    """
+    Generate the named corpora (all of CORPORA by default) into directory.
+
+    Args:
+        scale (float): Multiplies every page count
+
+    Returns:
+        dict: Corpus name -> PDF path
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name in corpora or CORPORA:
+        spec = dict(CORPORA[name])
+        spec["pages"] = max(1, int(round(spec["pages"] * scale)))
+        paths[name] = generate_pdf(os.path.join(directory, f"{name}.pdf"), seed=seed, **spec)
+        logger.info(f"Generated {name}: {spec['pages']} pages, {os.path.getsize(paths[name])} bytes")
+    return paths
+
+
+class StageTimer:
+    """
+    Exclusive wall time per stage: time spent in a nested stage is not counted for its parent.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self._local = threading.local()
+
+    def wrap(self, owner: Any, attribute: str, stage: str) -> None:
+        original = getattr(owner, attribute)
+        timer = self
+
+        def timed(*args, **kwargs):
+            stack = timer._local.__dict__.setdefault("stack", [])
+            stack.append(0.0)
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                nested = stack.pop()
+                timer.seconds[stage] = timer.seconds.get(stage, 0.0) + elapsed - nested
+                if stack:
+                    stack[-1] += elapsed
+
+        setattr(owner, attribute, timed)
+
+
+def _directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _setup(mode: str, pdf_path: str) -> None:
+    # Imports and cache warm-up are reported on their own so they do not skew pages/sec
+    if mode.startswith("pdf_extractor"):
+        import pdf_extractor
+    elif mode.startswith("ingest"):
+        import unstructured_pdf_ingestion
+        unstructured_pdf_ingestion.load_partitioner()
+        if mode == "ingest_store_hit":
+            # Populate the store; only the second, cached ingestion is measured
+            unstructured_pdf_ingestion.ingest_pdf_document(pdf_path, strategy="fast")
+    elif mode.startswith("ocr:"):
+        import easyocr
+        import ocr_engine
+
+
+def _run_extractor(pdf_path: str, output_dir: str, timer: StageTimer, **kwargs) -> int:
+    import pdf_extractor
+    timer.wrap(pdf_extractor, "extract_from_pdf", "extract")
+    timer.wrap(pdf_extractor, "get_page_count", "page_count")
+    timer.wrap(pdf_extractor, "add_to_library", "library")
+    timer.wrap(pdf_extractor, "_save_image", "save_images")
+    result = pdf_extractor.extract_from_pdf(pdf_path, output_dir=output_dir, **kwargs)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result["page_count"]
+
+
+def _run_ingestion(pdf_path: str, output_dir: str, timer: StageTimer, **kwargs) -> int:
+    import unstructured_pdf_ingestion as ingestion
+    import ingestion_store
+    timer.wrap(ingestion, "ingest_pdf", "ingest")
+    timer.wrap(ingestion, "plan_pdf", "plan")
+    timer.wrap(ingestion, "_split_pdf", "split")
+    timer.wrap(ingestion, "_partition_records", "partition")
+    timer.wrap(ingestion, "_partition_chunks", "partition")
+    timer.wrap(ingestion, "_embed_image_bytes", "embed_images")
+    timer.wrap(ingestion, "add_to_library", "library")
+    timer.wrap(ingestion_store.IngestionStore, "load", "store_load")
+    timer.wrap(ingestion_store.IngestionStore, "save", "store_save")
+    result = ingestion.ingest_pdf(pdf_path, output_dir=output_dir, **kwargs)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return ingestion.get_page_count(pdf_path)
+
+
+def _run_ocr(pdf_path: str, output_dir: str, timer: StageTimer, workers: int, torch_threads: Optional[int]) -> int:
+    from ocr_engine import OCREngine
+    started = time.perf_counter()
+    images = []
+    with fitz.open(pdf_path) as document:
+        for page in list(document)[:OCR_PAGES]:
+            images.append(page.get_pixmap(dpi=150).tobytes("png"))
+    timer.seconds["render"] = time.perf_counter() - started
+
+    # No cache: every run does the full recognition work
+    engine = OCREngine(["en"], workers=workers, torch_threads=torch_threads or None, cache=None)
+    try:
+        started = time.perf_counter()
+        engine.extract_text_batch(images)
+        timer.seconds["ocr"] = time.perf_counter() - started
+    finally:
+        engine.close()
+    return len(images)
+
+
+def run_one(pdf_path: str, mode: str) -> Dict[str, Any]:
+    """
+    Run one mode over one PDF in this process and measure it.
+
+    Meant to run in a fresh interpreter (see run_benchmark) so peak RSS belongs to this run alone.
+    Libraries, stores and extracted images go to a scratch directory whose growth is reported as bytes_written.
+    """
+    workspace = tempfile.mkdtemp(prefix="ingest_bench_")
+    os.environ["DOCUMENT_LIBRARY_PATH"] = os.path.join(workspace, "document_library.sqlite")
+    os.environ["INGESTION_STORE_PATH"] = os.path.join(workspace, "ingestion_store.sqlite")
+    output_dir = os.path.join(workspace, "output")
+    timer = StageTimer()
+    result: Dict[str, Any] = {"mode": mode}
+    try:
+        started = time.perf_counter()
+        _setup(mode, pdf_path)
+        result["setup_seconds"] = round(time.perf_counter() - started, 4)
+
+        started = time.perf_counter()
+        if mode == "pdf_extractor":
+            pages = _run_extractor(pdf_path, output_dir, timer)
+        elif mode == "pdf_extractor_serial":
+            pages = _run_extractor(pdf_path, output_dir, timer, workers=1)
+        elif mode == "pdf_extractor_text_only":
+            pages = _run_extractor(pdf_path, output_dir, timer, extract_images=False)
+        elif mode == "ingest_fast":
+            pages = _run_ingestion(pdf_path, output_dir, timer, strategy="fast", use_store=False)
+        elif mode == "ingest_adaptive":
+            pages = _run_ingestion(pdf_path, output_dir, timer, strategy="adaptive", use_store=False)
+        elif mode == "ingest_store_hit":
+            pages = _run_ingestion(pdf_path, output_dir, timer, strategy="fast")
+        elif mode.startswith("ocr:"):
+            workers, _, threads = mode[4:].partition("x")
+            pages = _run_ocr(pdf_path, output_dir, timer, int(workers), int(threads) if threads else None)
+        else:
+            raise ValueError(f"Unknown mode '{mode}'")
+        elapsed = time.perf_counter() - started
+
+        stages = {stage: round(seconds, 4) for stage, seconds in timer.seconds.items()}
+        stages["other"] = round(max(0.0, elapsed - sum(timer.seconds.values())), 4)
+        result.update({
+            "pages": pages,
+            "seconds": round(elapsed, 4),
+            "pages_per_sec": pages / elapsed if elapsed else 0.0,
+            "bytes_written": _directory_bytes(workspace),
+            "stages": stages,
+        })
+    except Exception as e:
+        logger.error(f"{mode} failed on {pdf_path}: {str(e)}")
+        result["error"] = str(e)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    # ru_maxrss is in KiB on Linux; worker pools are reported separately
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["peak_child_rss_kb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return result
+
+
+def _run_isolated(pdf_path: str, mode: str, timeout: float) -> Dict[str, Any]:
+    command = [sys.executable, os.path.abspath(__file__), "--run-one", pdf_path, mode]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    except subprocess.TimeoutExpired:
+        return {"mode": mode, "error": f"timed out after {timeout:.0f}s"}
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {"mode": mode, "error": (completed.stderr.strip().splitlines() or ["no output"])[-1]}
+    return json.loads(lines[-1])
+
+
+def run_benchmark(corpora=None, modes=DEFAULT_MODES, ocr_settings: str = DEFAULT_OCR_SETTINGS, scale: float = 1.0,
+                  seed: int = 0, corpus_dir: Optional[str] = None, timeout: float = RUN_TIMEOUT) -> Dict[str, Any]:
+    """
+    Generate the corpus and run every mode over every document, each in its own process.
+
+    Args:
+        corpora (iterable, optional): Corpus names from CORPORA; all by default
+        modes (iterable): Extraction/ingestion modes from MODES
+        ocr_settings (str): Comma-separated OCR engine settings "workers[xtorch_threads]"; empty skips OCR
+        scale (float): Multiplies every corpus page count
+        seed (int): Corpus seed
+        corpus_dir (str, optional): Keep the generated PDFs here instead of a temporary directory
+        timeout (float): Seconds allowed per run
+
+    Returns:
+        dict: Metadata and results keyed by "<corpus>/<mode>"
+    """
+    modes = list(modes) + [f"ocr:{s.strip()}" for s in ocr_settings.split(",") if s.strip()]
+    directory = corpus_dir or tempfile.mkdtemp(prefix="ingest_corpus_")
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {"corpora": list(corpora or CORPORA), "modes": modes, "scale": scale, "seed": seed, "ocr_pages": OCR_PAGES},
+        },
+        "results": {},
+    }
+    try:
+        paths = generate_corpus(directory, corpora, scale, seed)
+        for corpus, path in paths.items():
+            for mode in modes:
+                logger.info(f"Running {mode} on {corpus}")
+                result = _run_isolated(path, mode, timeout)
+                result["pdf_bytes"] = os.path.getsize(path)
+                report["results"][f"{corpus}/{mode}"] = result
+    finally:
+        if corpus_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+    return report
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def check_regressions(baseline: Dict[str, Any], current: Dict[str, Any],
+                      thresholds: Dict[str, float] = DEFAULT_THRESHOLDS) -> List[str]:
+    """
+    Compare two reports and describe every metric that moved past its threshold.
+
+    A negative threshold bounds a drop (throughput), a positive one a rise (memory, bytes).
+    Runs that failed now but succeeded in the baseline count as regressions too.
+    """
+    problems = []
+    for key, result in current.get("results", {}).items():
+        old = baseline.get("results", {}).get(key)
+        if not old or "error" in old:
+            continue
+        if "error" in result:
+            problems.append(f"{key}: failed ({result['error']})")
+            continue
+        for metric, limit in thresholds.items():
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (limit < 0 and change < limit) or (limit >= 0 and change > limit):
+                problems.append(f"{key}: {metric} {before:.4g} -> {after:.4g} ({change:+.0%}, limit {limit:+.0%})")
+    return problems
+
+
+def format_report(report: Dict[str, Any]) -> List[str]:
+    lines = [f"{'run':<40}{'pages':>7}{'pages/s':>10}{'peak RSS MiB':>14}{'written KiB':>13}  stages"]
+    for key, r in report["results"].items():
+        if "error" in r:
+            lines.append(f"{key:<40}  failed: {r['error']}")
+            continue
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in sorted(r["stages"].items(), key=lambda s: -s[1]) if seconds >= 0.005)
+        lines.append(f"{key:<40}{r['pages']:>7}{r['pages_per_sec']:>10.1f}{r['peak_rss_kb'] / 1024:>14.1f}"
+                     f"{r['bytes_written'] / 1024:>13.1f}  {stages}")
+    return lines
+
+
+def _parse_thresholds(values: List[str]) -> Dict[str, float]:
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for value in values:
+        metric, _, limit = value.partition("=")
+        thresholds[metric] = float(limit)
+    return thresholds
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--run-one":
+        # Child process of run_benchmark: one run, JSON on the last line of stdout
+        configure_logging(level="WARNING")
+        print(json.dumps(run_one(sys.argv[2], sys.argv[3])))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmark PDF extraction, ingestion and OCR on a synthetic corpus.")
+    parser.add_argument("--corpora", default=",".join(CORPORA), help="Comma-separated corpus names")
+    parser.add_argument("--modes", default=",".join(DEFAULT_MODES), help=f"Comma-separated modes from {', '.join(MODES)}")
+    parser.add_argument("--ocr-settings", default=DEFAULT_OCR_SETTINGS, help="Comma-separated OCR workers[xtorch_threads]; empty to skip")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply corpus page counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", help="Keep generated PDFs in this directory")
+    parser.add_argument("--timeout", type=float, default=RUN_TIMEOUT, help="Seconds allowed per run")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Earlier JSON report to check for regressions")
+    parser.add_argument("--threshold", action="append", default=[], help="Override a limit, e.g. pages_per_sec=-0.1")
+    args = parser.parse_args()
+    configure_logging()
+
+    report = run_benchmark(
+        corpora=[c.strip() for c in args.corpora.split(",") if c.strip()],
+        modes=[m.strip() for m in args.modes.split(",") if m.strip()],
+        ocr_settings=args.ocr_settings,
+        scale=args.scale,
+        seed=args.seed,
+        corpus_dir=args.corpus_dir,
+        timeout=args.timeout,
+    )
+    print("\n".join(format_report(report)))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved report to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = check_regressions(json.load(f), report, _parse_thresholds(args.threshold))
+        if problems:
+            print("Regressions:\n" + "\n".join(problems))
+            sys.exit(1)
+        print("No regressions against baseline")
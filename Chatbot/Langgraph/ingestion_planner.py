@@ -0,0 +1,114 @@
+import os
+import time
+import logging
+import fitz  # PyMuPDF
+from typing import Any, Dict, List
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Partition strategies understood by unstructured's partition_pdf
+FAST = "fast"
+HI_RES = "hi_res"
+OCR_ONLY = "ocr_only"
+
+# Probe thresholds
+MIN_TEXT_CHARS = int(os.getenv("PLANNER_MIN_TEXT_CHARS", "50"))
+SCANNED_IMAGE_COVERAGE = float(os.getenv("PLANNER_SCANNED_IMAGE_COVERAGE", "0.6"))
+LAYOUT_IMAGE_COVERAGE = float(os.getenv("PLANNER_LAYOUT_IMAGE_COVERAGE", "0.25"))
+TABLE_LINE_THRESHOLD = int(os.getenv("PLANNER_TABLE_LINE_THRESHOLD", "12"))
+
+def probe_page(page) -> Dict[str, Any]:
+    """
+    Cheaply measure the features that decide how a page should be partitioned.
+
+    Args:
+        page (fitz.Page): Page to probe
+
+    Returns:
+        dict: Text-layer size, image coverage and number of ruling lines
+    """
+    page_area = abs(page.rect) or 1.0
+
+    text_chars = len(page.get_text("text").strip())
+
+    # Fraction of the page covered by raster images (overlaps counted twice, capped at 1)
+    image_area = 0.0
+    for info in page.get_image_info():
+        image_area += abs(fitz.Rect(info["bbox"]) & page.rect)
+    image_coverage = min(1.0, image_area / page_area)
+
+    # Horizontal and vertical rules and rectangles are a good hint for tables
+    line_count = 0
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "re":
+                line_count += 4
+            elif item[0] == "l":
+                start, end = item[1], item[2]
+                if abs(start.x - end.x) < 1 or abs(start.y - end.y) < 1:
+                    line_count += 1
+
+    return {
+        "text_chars": text_chars,
+        "image_coverage": round(image_coverage, 3),
+        "line_count": line_count,
+    }
+
+def choose_strategy(features: Dict[str, Any]) -> str:
+    """
+    Route a page to a partition strategy based on its probe features.
+    """
+    if features["text_chars"] < MIN_TEXT_CHARS:
+        # No usable text layer: scanned pages need OCR, figure pages need layout, blank pages neither
+        if features["image_coverage"] >= SCANNED_IMAGE_COVERAGE:
+            return OCR_ONLY
+        return HI_RES if features["image_coverage"] > 0 else FAST
+    if features["line_count"] >= TABLE_LINE_THRESHOLD or features["image_coverage"] >= LAYOUT_IMAGE_COVERAGE:
+        return HI_RES
+    return FAST
+
+def plan_pdf(pdf_path: str) -> List[Dict[str, Any]]:
+    """
+    Probe every page of a PDF and decide its partition strategy.
+
+    Args:
+        pdf_path (str): Path to the PDF file
+
+    Returns:
+        list: One decision per page with "page_number", "strategy", "features" and "probe_ms"
+    """
+    plan = []
+    with fitz.open(pdf_path) as pdf_document:
+        for page_num in range(len(pdf_document)):
+            started = time.perf_counter()
+            features = probe_page(pdf_document[page_num])
+            plan.append({
+                "page_number": page_num + 1,
+                "strategy": choose_strategy(features),
+                "features": features,
+                "probe_ms": round((time.perf_counter() - started) * 1000, 3),
+            })
+
+    counts = {}
+    for decision in plan:
+        counts[decision["strategy"]] = counts.get(decision["strategy"], 0) + 1
+    logger.info(f"Planned {len(plan)} pages: {counts}")
+    return plan
+
+def group_runs(plan: List[Dict[str, Any]], max_pages: int) -> List[Dict[str, Any]]:
+    """
+    Merge consecutive pages with the same strategy into runs of at most max_pages.
+
+    Returns:
+        list: Runs with 0-based "start", exclusive "end" and "strategy"
+    """
+    runs = []
+    for decision in plan:
+        page = decision["page_number"] - 1
+        last = runs[-1] if runs else None
+        if last and last["strategy"] == decision["strategy"] and last["end"] == page and page - last["start"] < max_pages:
+            last["end"] = page + 1
+        else:
+            runs.append({"start": page, "end": page + 1, "strategy": decision["strategy"]})
+    return runs
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import zlib
+import marshal
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import agent_registry
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = os.getenv("INGESTION_STORE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "agentic_ai", "ingestion_store.sqlite"))
+DEFAULT_MAX_BYTES = int(os.getenv("INGESTION_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Files whose content hash is remembered, least recently used dropped first
+HASH_MEMO_SIZE = int(os.getenv("INGESTION_HASH_MEMO_SIZE", "4096"))
+
+# path -> (size, mtime, content hash), so unchanged files are not re-hashed
+_hash_memo: "OrderedDict[str, Tuple[int, float, str]]" = OrderedDict()
+_hash_memo_lock = threading.Lock()
+
+
+def file_hash(path: str) -> str:
+    """
+    Return the SHA-256 of a file's content, reading it in 1 MiB blocks.
+    """
+    stat = os.stat(path)
+    memo_key = os.path.abspath(path)
+    with _hash_memo_lock:
+        cached = _hash_memo.get(memo_key)
+        if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime):
+            _hash_memo.move_to_end(memo_key)
+            return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    with _hash_memo_lock:
+        _hash_memo[memo_key] = (stat.st_size, stat.st_mtime, digest.hexdigest())
+        _hash_memo.move_to_end(memo_key)
+        while len(_hash_memo) > HASH_MEMO_SIZE:
+            _hash_memo.popitem(last=False)
+    return digest.hexdigest()
+
+
+def _pack(value: Any) -> bytes:
+    # marshal handles the plain dict/list/str/bytes records compactly and cannot build arbitrary objects
+    return zlib.compress(marshal.dumps(value), 6)
+
+
+def _unpack(blob: bytes) -> Any:
+    return marshal.loads(zlib.decompress(blob))
+
+
+class IngestionStore:
+    """
+    Content-addressed store of PDF ingestion results.
+
+    Element records are stored one compressed blob per page, so a page range can be
+    loaded without deserialising the whole document. Documents are evicted
+    least-recently-used once the store exceeds max_bytes.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "key TEXT PRIMARY KEY, source TEXT, page_count INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "extra BLOB, created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "key TEXT NOT NULL, page_number INTEGER NOT NULL, blob BLOB NOT NULL, PRIMARY KEY (key, page_number))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_lru ON documents(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(pdf_path: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Build the store key from the file content and the ingestion options that affect the output.
+        """
+        digest = hashlib.sha256(file_hash(pdf_path).encode("utf-8"))
+        digest.update(json.dumps(options or {}, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM documents WHERE key = ?", (key,)).fetchone() is not None
+
+    def load(self, key: str, start_page: Optional[int] = None, end_page: Optional[int] = None) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+        """
+        Load stored element records, optionally only for a page range.
+
+        Args:
+            key (str): Store key from make_key
+            start_page (int, optional): First page to load (1-based, inclusive)
+            end_page (int, optional): Last page to load (1-based, inclusive)
+
+        Returns:
+            tuple: (records, extra) or None when the document is not stored
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT extra FROM documents WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+            query = "SELECT blob FROM pages WHERE key = ?"
+            params: List[Any] = [key]
+            if start_page is not None:
+                query += " AND page_number >= ?"
+                params.append(start_page)
+            if end_page is not None:
+                query += " AND page_number <= ?"
+                params.append(end_page)
+            blobs = self._conn.execute(query + " ORDER BY page_number", params).fetchall()
+
+            self._conn.execute("UPDATE documents SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+        records = []
+        for (blob,) in blobs:
+            records.extend(_unpack(blob))
+        # Elements without a page are stored under page 0; restore document order
+        records.sort(key=lambda record: record["index"])
+        extra = _unpack(row[0]) if row[0] else {}
+        return records, extra
+
+    def save(self, key: str, records: List[Dict[str, Any]], extra: Optional[Dict[str, Any]] = None, source: Optional[str] = None) -> None:
+        """
+        Store element records grouped by page, then evict old documents if over budget.
+
+        Args:
+            key (str): Store key from make_key
+            records (list): Element records; records without a page number are stored as page 0
+            extra (dict, optional): Document-level data kept alongside the records
+            source (str, optional): Original file path, for reference only
+        """
+        by_page: Dict[int, List[Dict[str, Any]]] = {}
+        for record in records:
+            by_page.setdefault(record.get("page_number") or 0, []).append(record)
+
+        pages = [(key, page_number, _pack(page_records)) for page_number, page_records in by_page.items()]
+        extra_blob = _pack(extra) if extra else None
+        size = sum(len(blob) for _, _, blob in pages) + (len(extra_blob) if extra_blob else 0)
+        now = time.time()
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+                self._conn.executemany("INSERT INTO pages (key, page_number, blob) VALUES (?, ?, ?)", pages)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (key, source, page_count, size, extra, created, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, source, len([p for p in by_page if p]), size, extra_blob, now, now),
+                )
+                self._evict()
+        logger.info(f"Stored ingestion result for {source or key} ({size} bytes)")
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM documents ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM documents WHERE key = ?", (key,))
+            total -= size
+            logger.info(f"Evicted stored ingestion result {key}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters and the current store size.
+        """
+        with self._lock:
+            documents, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "documents": documents,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def get_ingestion_store() -> Optional[IngestionStore]:
+    """
+    Return the process-wide ingestion store, or None when disabled with INGESTION_STORE=0.
+    """
+    if os.getenv("INGESTION_STORE", "1") == "0":
+        return None
+    return agent_registry.shared("ingestion_store", IngestionStore)
@@ -0,0 +1,303 @@
+import os
+import re
+import math
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import agent_registry
+import tracing
+from pdf_retrieval import NO_PASSAGES, tokenize
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Intents the router can dispatch directly; everything else goes to the agent
+WEATHER = "weather"
+OCR = "ocr"
+PDF = "pdf"
+AGENT = "agent"
+# Classifier label for web-search questions; these go to the agent
+SEARCH = "search"
+
+MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.85"))
+RULE_CONFIDENCE = 0.95
+# Routing is skipped entirely with ROUTER=0
+ROUTER_ENABLED = os.getenv("ROUTER", "1") != "0"
+
+# Small labelled seed set for the classifier; "search" and "chat" exist only to be told apart
+TRAINING_EXAMPLES: List[Tuple[str, str]] = [
+    (WEATHER, "what's the weather in London"),
+    (WEATHER, "what is the weather like in Paris right now"),
+    (WEATHER, "how hot is it in Cairo"),
+    (WEATHER, "is it raining in Seattle"),
+    (WEATHER, "current temperature in Tokyo"),
+    (WEATHER, "how cold is it in Oslo today"),
+    (WEATHER, "is it sunny in Madrid"),
+    (WEATHER, "humidity and wind in Mumbai"),
+    (WEATHER, "weather conditions in New York"),
+    (WEATHER, "do I need an umbrella in Dublin"),
+    (OCR, "what text is in this image"),
+    (OCR, "read the text in the picture"),
+    (OCR, "what does the sign in the photo say"),
+    (OCR, "extract the text from this screenshot"),
+    (OCR, "transcribe the image"),
+    (OCR, "what is written on the receipt"),
+    (OCR, "what does this image say"),
+    (OCR, "read the words in the scanned image"),
+    (PDF, "what is this pdf about"),
+    (PDF, "summarize the document"),
+    (PDF, "what does the report say about revenue"),
+    (PDF, "find the section on installation in the manual"),
+    (PDF, "what are the conclusions of the paper"),
+    (PDF, "according to the document what is the deadline"),
+    (PDF, "which table lists the results"),
+    (PDF, "what does chapter three cover"),
+    ("search", "what is the latest news on OpenAI"),
+    ("search", "who won the election"),
+    ("search", "latest headlines about the stock market"),
+    ("search", "what happened in the world today"),
+    ("search", "who is the CEO of Microsoft"),
+    ("search", "news about electric cars"),
+    ("search", "when is the next World Cup"),
+    ("search", "price of bitcoin"),
+    ("chat", "hello how are you"),
+    ("chat", "tell me a joke"),
+    ("chat", "write a poem about the sea"),
+    ("chat", "explain recursion simply"),
+    ("chat", "thanks for your help"),
+    ("chat", "what can you do"),
+]
+
+_WEATHER_RE = re.compile(r"\b(weather|rain(?:ing|y)?|snow(?:ing|y)?|sunny|cloudy|humid(?:ity)?|windy|umbrella)\b", re.I)
+# Words that are about the weather only alongside another weather word, e.g. not in "the temperature at which water boils"
+_WEATHER_AMBIGUOUS_RE = re.compile(r"\b(hot|cold|temperature|wind)\b", re.I)
+# Phrasings where those words are about the weather on their own
+_WEATHER_PHRASE_RE = re.compile(r"(?i:\bhow (?:hot|cold) is it\b|\bis it (?:hot|cold)\b)|(?i:\btemperature (?:in|at|for) )[A-Z]")
+_FORECAST_RE = re.compile(r"\b(tomorrow|forecast|next week|weekend|tonight|later|yesterday|last week)\b", re.I)
+_LOCATION_RE = re.compile(r"\b(?:in|for|at)\s+([A-Z][\w.'-]*(?:[\s,]+[A-Z][\w.'-]*)*)")
+# Another place right after the first one, as in "in Paris and London"
+_MORE_LOCATIONS_RE = re.compile(r"^\s*(?:,|&|\band\b|\bor\b)\s*(?:(?:in|for|at)\s+)?[A-Z]")
+_DOCUMENT_RE = re.compile(r"\b(pdf|document|report|paper|manual|page|section|chapter|table|summar(?:y|ize|ise))\b", re.I)
+_IMAGE_TEXT_RE = re.compile(r"\b(text|say|says|written|read|words?|transcribe|ocr|sign|caption|label)\b", re.I)
+_COMPOUND_RE = re.compile(r"\b(and also|as well as|then|compare)\b|\?.+\?", re.I)
+# Splits "Is it raining in Seattle and what is the news?" into its clauses
+_CLAUSE_RE = re.compile(r"\s*(?:[,;]|\b(?:and|plus|also)\b)\s*", re.I)
+
+
+def _mentions_weather(text: str) -> bool:
+    if _WEATHER_RE.search(text) or _WEATHER_PHRASE_RE.search(text):
+        return True
+    return len({word.lower() for word in _WEATHER_AMBIGUOUS_RE.findall(text)}) > 1
+
+
+class NaiveBayesIntentClassifier:
+    """
+    Multinomial naive Bayes over word tokens with Laplace smoothing.
+    """
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.log_priors: Dict[str, float] = {}
+        self.log_likelihoods: Dict[str, Dict[str, float]] = {}
+        self.log_unseen: Dict[str, float] = {}
+
+    def fit(self, examples: Iterable[Tuple[str, str]]) -> "NaiveBayesIntentClassifier":
+        counts: Dict[str, Counter] = {}
+        documents: Counter = Counter()
+        for label, text in examples:
+            counts.setdefault(label, Counter()).update(tokenize(text))
+            documents[label] += 1
+
+        vocabulary = set().union(*counts.values())
+        total = sum(documents.values())
+        for label, counter in counts.items():
+            denominator = sum(counter.values()) + self.alpha * (len(vocabulary) + 1)
+            self.log_priors[label] = math.log(documents[label] / total)
+            self.log_likelihoods[label] = {t: math.log((c + self.alpha) / denominator) for t, c in counter.items()}
+            self.log_unseen[label] = math.log(self.alpha / denominator)
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        tokens = tokenize(text)
+        scores = {
+            label: prior + sum(self.log_likelihoods[label].get(t, self.log_unseen[label]) for t in tokens)
+            for label, prior in self.log_priors.items()
+        }
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        norm = sum(exp.values())
+        return {label: value / norm for label, value in exp.items()}
+
+
+class RouteDecision(NamedTuple):
+    intent: str
+    confidence: float
+    tool_input: Optional[str]
+    reason: str
+
+
+class IntentRouter:
+    """
+    Decide whether a query can skip the agent: rules first, then the classifier.
+
+    Only decisions at or above min_confidence that also have a usable tool input
+    are dispatched; everything else goes to the agent.
+    """
+
+    def __init__(self, classifier: Optional[NaiveBayesIntentClassifier] = None, min_confidence: float = MIN_CONFIDENCE):
+        self.classifier = classifier or NaiveBayesIntentClassifier().fit(TRAINING_EXAMPLES)
+        self.min_confidence = min_confidence
+        self.stats = {"routed": Counter(), "fallbacks": 0, "saved_seconds": 0.0}
+        # Running average of full agent latency per agent, to estimate what routing saves
+        self._agent_latency: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def route(self, query: str, file_path: Optional[str] = None, file_type: Optional[str] = None) -> RouteDecision:
+        probabilities = self.classifier.predict_proba(query)
+        best = max(probabilities, key=probabilities.get)
+        file_type = (file_type or "").lower()
+
+        if _COMPOUND_RE.search(query) or self._needs_several_tools(query, file_path):
+            return RouteDecision(AGENT, 0.0, None, "compound question")
+
+        intent, confidence, reason = best, probabilities[best], f"classifier p={probabilities[best]:.2f}"
+        # The weather rule needs the classifier to agree, so a stray keyword alone cannot skip the agent
+        if _mentions_weather(query) and not file_path and best == WEATHER:
+            intent, confidence, reason = WEATHER, max(RULE_CONFIDENCE, probabilities[WEATHER]), "weather keywords"
+        elif file_path and file_type == "image" and (_IMAGE_TEXT_RE.search(query) or best == OCR):
+            intent, confidence, reason = OCR, max(RULE_CONFIDENCE, probabilities[OCR]), "question about attached image"
+        elif file_path and file_type == "pdf" and (_DOCUMENT_RE.search(query) or best == PDF):
+            intent, confidence, reason = PDF, max(RULE_CONFIDENCE, probabilities[PDF]), "question about attached PDF"
+
+        if intent != best and probabilities[best] >= 0.5 and best not in (WEATHER, OCR, PDF):
+            # A rule fired but the question reads mostly like something the tool cannot answer
+            return RouteDecision(AGENT, probabilities[best], None, f"rule for {intent} overruled by classifier ({best})")
+
+        if intent == WEATHER:
+            if _FORECAST_RE.search(query):
+                return RouteDecision(AGENT, confidence, None, "forecast needs more than current weather")
+            location = _LOCATION_RE.search(query)
+            if not location:
+                return RouteDecision(AGENT, confidence, None, "no location found")
+            if _MORE_LOCATIONS_RE.match(query[location.end():]):
+                return RouteDecision(AGENT, confidence, None, "several locations")
+            tool_input = location.group(1).strip(" ,.")
+        elif intent == OCR and file_path:
+            tool_input = file_path
+        elif intent == PDF and file_path:
+            tool_input = f"{file_path} | {query}"
+        else:
+            return RouteDecision(AGENT, confidence, None, f"no direct tool for '{intent}'")
+
+        if confidence < self.min_confidence:
+            return RouteDecision(AGENT, confidence, None, f"low confidence for {intent} ({reason})")
+        return RouteDecision(intent, confidence, tool_input, reason)
+
+    def _needs_several_tools(self, query: str, file_path: Optional[str]) -> bool:
+        """
+        Check whether clauses joined by "and", commas etc. ask for different tools,
+        e.g. the weather in one clause and the news in another.
+        """
+        clauses = [c for c in _CLAUSE_RE.split(query) if len(c.split()) >= 2 and tokenize(c)]
+        if len(clauses) < 2:
+            return False
+        needed = set()
+        for clause in clauses:
+            if _mentions_weather(clause):
+                needed.add(WEATHER)
+            else:
+                # Short clauses give weak probabilities, so the most likely label is enough here
+                probabilities = self.classifier.predict_proba(clause)
+                best = max(probabilities, key=probabilities.get)
+                if best in (WEATHER, SEARCH):
+                    needed.add(best)
+        if file_path and needed:
+            # The other clauses are about the attached file
+            needed.add(PDF)
+        return len(needed) > 1
+
+    def record_fallback(self) -> None:
+        with self._lock:
+            self.stats["fallbacks"] += 1
+
+    def record_agent_latency(self, agent_name: str, seconds: float) -> None:
+        with self._lock:
+            previous = self._agent_latency.get(agent_name)
+            self._agent_latency[agent_name] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+    def record_routed(self, agent_name: str, intent: str, seconds: float) -> Optional[float]:
+        with self._lock:
+            self.stats["routed"][intent] += 1
+            baseline = self._agent_latency.get(agent_name)
+            if baseline is None:
+                return None
+            saved = baseline - seconds
+            self.stats["saved_seconds"] += saved
+            return saved
+
+
+SYNTHESIS_PROMPT = """Answer the user's question using the {tool} tool result below.
+If the result does not contain the answer, say so briefly.
+
+Question: {question}
+
+{tool} result:
+{result}
+
+Answer:"""
+
+
+def get_router() -> IntentRouter:
+    return agent_registry.shared("intent_router", IntentRouter)
+
+
+def try_direct(query: str, file_path: Optional[str], file_type: Optional[str], tools: Dict[str, Any],
+               model: str, agent_name: str) -> Optional[str]:
+    """
+    Answer with one tool call and one LLM call when the intent is clear.
+
+    Args:
+        query (str): The user's question
+        file_path (str, optional): Attached file
+        file_type (str, optional): 'image' or 'pdf'
+        tools (dict): Tool per intent available to the calling agent, e.g. {"weather": tool, "pdf": tool}
+        model (str): Model for the synthesis call
+        agent_name (str): Agent that would otherwise handle the query, for latency accounting
+
+    Returns:
+        str or None: The answer, or None when the query should go to the agent
+    """
+    if not ROUTER_ENABLED:
+        return None
+    router = get_router()
+    decision = router.route(query, file_path, file_type)
+    if decision.intent == AGENT or decision.intent not in tools:
+        logger.debug("Router: %s handles query (%s)", agent_name, decision.reason)
+        return None
+
+    started = time.perf_counter()
+    try:
+        # One trace for the routed answer: the tool call and the synthesis call nest under it
+        with tracing.run_group(f"router.{decision.intent}") as group:
+            result = tools[decision.intent].run(decision.tool_input, callbacks=group)
+            if not isinstance(result, str):
+                result = str(result)
+            if result.startswith(("Error", "An error")) or result == NO_PASSAGES:
+                logger.info("Router: %s tool had no answer, falling back to %s", decision.intent, agent_name)
+                router.record_fallback()
+                return None
+            llm = agent_registry.chat_llm(model, temperature=0)
+            answer = llm.invoke(SYNTHESIS_PROMPT.format(tool=decision.intent, question=query, result=result),
+                                config={"callbacks": group}).content
+    except Exception as e:
+        logger.error(f"Router dispatch failed, falling back to {agent_name}: {str(e)}")
+        router.record_fallback()
+        return None
+
+    elapsed = time.perf_counter() - started
+    saved = router.record_routed(agent_name, decision.intent, elapsed)
+    logger.info("Router: answered via %s tool (%s, confidence %.2f) in %.2fs%s", decision.intent, decision.reason,
+                decision.confidence, elapsed, f", ~{saved:.2f}s faster than {agent_name}" if saved is not None else "")
+    return answer
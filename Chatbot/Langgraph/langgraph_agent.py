@@ -0,0 +1,178 @@
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from log_config import configure_logging, payload
+import agent_registry
+import tracing
+from web_tools import setup_search_tool, setup_weather_tool
+from ocr_tool import setup_ocr_tool
+from document_library import setup_library_search_tool
+from pdf_extractor import setup_pdf_extractor
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Upper bound on agent/tool steps per question
+RECURSION_LIMIT = int(os.getenv("LANGGRAPH_RECURSION_LIMIT", "12"))
+# Conversation threads kept in the checkpointer; the least recently used thread is dropped beyond this
+MAX_THREADS = int(os.getenv("LANGGRAPH_MAX_THREADS", "1000"))
+# Messages kept per thread; older turns are dropped whole
+MAX_THREAD_MESSAGES = int(os.getenv("LANGGRAPH_MAX_THREAD_MESSAGES", "40"))
+
+# thread_id -> None, in least recently used order
+_threads: "OrderedDict[str, None]" = OrderedDict()
+_threads_lock = threading.Lock()
+
+SYSTEM_PROMPT = """You are a helpful assistant with tools for internet search, current weather, OCR on images,
+PDF passage retrieval and searching previously processed documents.
+When a question needs several independent lookups (for example the weather in two cities and a news search),
+request all of those tool calls at once in a single step instead of one after another.
+The pdf_extractor tool takes "<path to PDF> | <question about the PDF>"."""
+
+
+def setup_langgraph_agent():
+    """
+    Build a tool-calling agent graph: the model node requests tools natively, the tool
+    node runs every requested call of a step in parallel, and a checkpointer keeps
+    each conversation thread's state.
+    """
+    # Set up API keys
+    os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
+
+    # Same shared tools as the ReAct agents
+    tools = [
+        agent_registry.shared("tool:search", setup_search_tool),
+        agent_registry.shared("tool:weather", setup_weather_tool),
+        agent_registry.shared("tool:ocr", setup_ocr_tool),
+        agent_registry.shared("tool:pdf_extractor", setup_pdf_extractor),
+        agent_registry.shared("tool:library_search", setup_library_search_tool),
+    ]
+
+    chat_llm = agent_registry.chat_llm('gpt-4o', temperature=0).bind_tools(tools)
+
+    # langgraph.prebuilt takes seconds to import, so load it only when the graph is built
+    from langgraph.graph import StateGraph, MessagesState, START
+    from langgraph.prebuilt import ToolNode, tools_condition
+    from langgraph.checkpoint.memory import MemorySaver
+
+    def call_model(state: MessagesState):
+        return {"messages": [chat_llm.invoke([SystemMessage(content=SYSTEM_PROMPT)] + state["messages"])]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("agent", call_model)
+    graph.add_node("tools", ToolNode(tools))
+    graph.add_edge(START, "agent")
+    # Go to the tool node while the model asks for tools, otherwise finish
+    graph.add_conditional_edges("agent", tools_condition)
+    graph.add_edge("tools", "agent")
+
+    return graph.compile(checkpointer=MemorySaver())
+
+# Build the graph once per process and share it across requests
+agent_registry.register("langgraph_agent", setup_langgraph_agent)
+
+def _trim_messages(messages):
+    """
+    Keep the newest whole turns (each starting at a user message) that fit MAX_THREAD_MESSAGES.
+
+    The latest turn is always kept, so tool calls are never separated from their results.
+    """
+    if len(messages) <= MAX_THREAD_MESSAGES:
+        return messages
+    starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    for start in starts:
+        if len(messages) - start <= MAX_THREAD_MESSAGES:
+            return messages[start:]
+    return messages[starts[-1]:] if starts else messages[-MAX_THREAD_MESSAGES:]
+
+
+def _compact_thread(agent, config, messages) -> None:
+    """
+    Replace a thread's checkpoint history with one checkpoint holding its trimmed messages.
+
+    MemorySaver keeps every intermediate checkpoint, so without this a thread's
+    memory grows with each agent and tool step, not just with each turn.
+    """
+    agent.checkpointer.delete_thread(config["configurable"]["thread_id"])
+    agent.update_state(config, {"messages": _trim_messages(messages)}, as_node="agent")
+
+
+def _touch_thread(agent, thread_id: str) -> None:
+    # Drop the least recently used threads beyond MAX_THREADS
+    with _threads_lock:
+        _threads[thread_id] = None
+        _threads.move_to_end(thread_id)
+        evicted = []
+        while len(_threads) > MAX_THREADS:
+            evicted.append(_threads.popitem(last=False)[0])
+    for old in evicted:
+        agent.checkpointer.delete_thread(old)
+
+
+def process_query(query, file_path=None, file_type=None, thread_id=None):
+    """
+    Process a user query, optionally about an image or PDF file.
+
+    Args:
+        query (str): The user's question
+        file_path (str, optional): Path to an image or PDF file
+        file_type (str, optional): 'image' or 'pdf'
+        thread_id (str, optional): Conversation thread; earlier turns of the thread are remembered.
+            Each call without one is a separate, single-turn conversation.
+
+    Returns:
+        str: The agent's response
+    """
+    agent = agent_registry.get("langgraph_agent")
+    ephemeral = thread_id is None
+    if ephemeral:
+        thread_id = uuid.uuid4().hex
+    config = {"configurable": {"thread_id": thread_id}, "recursion_limit": RECURSION_LIMIT, "callbacks": tracing.callbacks()}
+
+    try:
+        logger.info("Processing query: %s", payload(query))
+
+        content = query
+        if file_path and file_type:
+            if file_type.lower() == 'image':
+                content += f"\n\nI've also provided an image at {file_path}; use the OCR tool if the question is about it."
+            elif file_type.lower() == 'pdf':
+                content += f"\n\nI've also provided a PDF file at {file_path}; use the pdf_extractor tool with \"{file_path} | <your question>\" if the question is about it."
+            else:
+                content += f"\n\nI've also provided a file at {file_path} of type {file_type}."
+
+        previous = len(agent.get_state(config).values.get("messages", []))
+        started = time.perf_counter()
+        result = agent.invoke({"messages": [HumanMessage(content=content)]}, config)
+
+        # Everything after the previous turn's messages belongs to this run
+        new_messages = result["messages"][previous:]
+        model_calls = [m for m in new_messages if isinstance(m, AIMessage)]
+        tool_calls = sum(len(m.tool_calls) for m in model_calls)
+        logger.info("Query processed in %.2fs with %d LLM round-trips and %d tool calls",
+                    time.perf_counter() - started, len(model_calls), tool_calls)
+        if not ephemeral:
+            _compact_thread(agent, config, result["messages"])
+            _touch_thread(agent, thread_id)
+        return result["messages"][-1].content
+    except Exception as e:
+        logger.error(f"An error occurred: {str(e)}")
+        return f"An error occurred: {str(e)}"
+    finally:
+        if ephemeral:
+            agent.checkpointer.delete_thread(thread_id)
+
+# Example usage
+if __name__ == "__main__":
+    configure_logging()
+    # Independent lookups are requested together and run in parallel
+    result = process_query("What's the weather in London and in Paris, and what is the latest news on OpenAI?")
+    print(result)
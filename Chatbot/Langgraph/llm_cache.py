@@ -0,0 +1,240 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+import agent_registry
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "agentic_ai", "llm_cache.sqlite"))
+MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1024"))
+DEFAULT_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+# Responses sampled above this temperature are not cached; an unset temperature is the API default of 1.0
+MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.0"))
+API_DEFAULT_TEMPERATURE = 1.0
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Message fields that do not change what the model is asked
+_VOLATILE_FIELDS = frozenset(("id", "response_metadata", "usage_metadata"))
+
+
+def _normalize_text(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def _split_llm_string(llm_string: str) -> Tuple[Dict[str, Any], str]:
+    # Chat models build llm_string as "<serialized model>---<sorted call params>"
+    model, _, params = llm_string.partition("---")
+    try:
+        return json.loads(model).get("kwargs", {}), params
+    except ValueError:
+        return {}, llm_string
+
+
+def _serialize(generations: RETURN_VAL_TYPE) -> str:
+    return json.dumps([
+        {"message": message_to_dict(g.message)} if isinstance(g, ChatGeneration) else {"text": g.text}
+        for g in generations
+    ])
+
+
+def _deserialize(value: str) -> RETURN_VAL_TYPE:
+    return [
+        ChatGeneration(message=messages_from_dict([g["message"]])[0]) if "message" in g else Generation(text=g["text"])
+        for g in json.loads(value)
+    ]
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Reduce a serialized message list to the parts that affect the answer, with whitespace collapsed.
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return _normalize_text(prompt)
+    if not isinstance(messages, list):
+        return _normalize_text(prompt)
+
+    normalized = []
+    for message in messages:
+        kwargs = dict(message.get("kwargs", {})) if isinstance(message, dict) else {}
+        content = kwargs.pop("content", "")
+        for field in _VOLATILE_FIELDS:
+            kwargs.pop(field, None)
+        normalized.append({
+            "role": kwargs.pop("type", None) or (message.get("id") or [None])[-1],
+            "content": _normalize_text(content) if isinstance(content, str) else content,
+            "extra": kwargs,
+        })
+    return json.dumps(normalized, sort_keys=True)
+
+
+def normalize_llm_string(llm_string: str) -> str:
+    """
+    Keep the model settings and call parameters that affect the answer, dropping credentials.
+    """
+    settings, params = _split_llm_string(llm_string)
+    settings = {k: v for k, v in settings.items() if "api_key" not in k and k not in ("openai_proxy", "stream_usage")}
+    return json.dumps(settings, sort_keys=True) + "---" + params
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Two-tier LangChain response cache: an in-memory LRU in front of an SQLite table.
+
+    Keys hash the model settings, call parameters and normalized messages, so requests
+    that differ only in whitespace share an entry. Each entry carries its own expiry.
+    Calls sampled above max_temperature bypass the cache entirely.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, memory_entries: int = MEMORY_ENTRIES,
+                 ttl: float = DEFAULT_TTL, max_temperature: float = MAX_TEMPERATURE):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.metrics = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "skipped": 0, "updates": 0, "expired": 0}
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def cacheable(self, llm_string: str) -> bool:
+        """
+        Whether a call with these settings is deterministic enough to cache.
+        """
+        settings, params = _split_llm_string(llm_string)
+        temperature = settings.get("temperature")
+        match = re.search(r"\('temperature', ([0-9.]+)\)", params)
+        if match:
+            temperature = float(match.group(1))
+        if temperature is None:
+            temperature = API_DEFAULT_TEMPERATURE
+        return temperature <= self.max_temperature
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{normalize_llm_string(llm_string)}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, expires_at: float, value: str) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if not self.cacheable(llm_string):
+            self.metrics["skipped"] += 1
+            return None
+
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.metrics["memory_hits"] += 1
+                value = entry[1]
+            else:
+                row = self._conn.execute("SELECT value, expires_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+                if row is None or row[1] <= now:
+                    if row is not None or entry is not None:
+                        self.metrics["expired"] += 1
+                        self._memory.pop(key, None)
+                        with self._conn:
+                            self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                    self.metrics["misses"] += 1
+                    return None
+                value, expires_at = row
+                self._remember(key, expires_at, value)
+                self.metrics["disk_hits"] += 1
+
+        # Deserialize on every hit so callers never share generation objects
+        generations = _deserialize(value)
+        # Lets callbacks (e.g. tracing) tell cache hits from real calls
+        for generation in generations:
+            if isinstance(generation, ChatGeneration):
+                generation.message.response_metadata["cached"] = True
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE, ttl: Optional[float] = None) -> None:
+        """
+        Store a response. ttl overrides the cache's default lifetime for this entry.
+        """
+        if not self.cacheable(llm_string):
+            return
+        key = self.make_key(prompt, llm_string)
+        value = _serialize(return_val)
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, value, created, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, expires_at),
+                )
+            self.metrics["updates"] += 1
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM llm_responses")
+
+    def purge_expired(self) -> int:
+        """
+        Delete expired entries from disk and return how many were removed.
+        """
+        with self._lock:
+            with self._conn:
+                removed = self._conn.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (time.time(),)).rowcount
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters, hit rates and tier sizes.
+        """
+        with self._lock:
+            metrics = dict(self.metrics)
+            metrics["memory_entries"] = len(self._memory)
+            metrics["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        hits = metrics["memory_hits"] + metrics["disk_hits"]
+        lookups = hits + metrics["misses"]
+        metrics["hit_rate"] = hits / lookups if lookups else 0.0
+        metrics["memory_hit_rate"] = metrics["memory_hits"] / lookups if lookups else 0.0
+        return metrics
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    Return the process-wide response cache, or None when disabled with LLM_CACHE=0.
+    """
+    if os.getenv("LLM_CACHE", "1") == "0":
+        return None
+    return agent_registry.shared("llm_cache", LLMResponseCache)
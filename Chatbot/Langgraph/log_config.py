@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import hashlib
+import logging
+import threading
+import logging.handlers
+from typing import Any, Dict, List, Optional
+
+# Process-wide logging setup. Modules only create loggers; entry points call configure_logging() once.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# "text" or "json"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_FILE = os.getenv("LOG_FILE")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Longest payload kept in a log line; the rest is replaced by its length and a hash
+MAX_PAYLOAD_CHARS = int(os.getenv("LOG_MAX_PAYLOAD_CHARS", "200"))
+# Per-logger sampling of DEBUG/INFO records, e.g. "web_tools=0.1,document_library=0.5"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+# Per-logger cap on DEBUG/INFO records per second; "*" applies to every logger without its own entry
+LOG_RATE_LIMITS = os.getenv("LOG_RATE_LIMITS", "*=200")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class Payload:
+    """
+    Lazily rendered log argument for large values such as tool results.
+
+    Nothing is converted, truncated or hashed unless the record is actually emitted.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: Optional[int] = None):
+        self.value = value
+        self.limit = MAX_PAYLOAD_CHARS if limit is None else limit
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else str(self.value)
+        if len(text) <= self.limit:
+            return text
+        digest = hashlib.blake2b(text.encode("utf-8", "replace"), digest_size=6).hexdigest()
+        return f"{text[:self.limit]}... [{len(text)} chars, blake2b {digest}]"
+
+
+def payload(value: Any, limit: Optional[int] = None) -> Payload:
+    """
+    Wrap a potentially large value for logging: logger.info("Result: %s", payload(result)).
+    """
+    return Payload(value, limit)
+
+
+def _parse_mapping(spec: str) -> Dict[str, float]:
+    mapping = {}
+    for item in spec.split(","):
+        name, _, value = item.strip().partition("=")
+        if name and value:
+            mapping[name.strip()] = float(value)
+    return mapping
+
+
+def _lookup(mapping: Dict[str, float], name: str) -> Optional[float]:
+    # Most specific dotted prefix wins, then the "*" default
+    while name:
+        if name in mapping:
+            return mapping[name]
+        name = name.rpartition(".")[0]
+    return mapping.get("*")
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fixed fraction of DEBUG/INFO records per logger; warnings and errors always pass.
+
+    Deterministic: every n-th record is kept, so no random numbers on the hot path.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._counters: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = _lookup(self.rates, record.name)
+        if rate is None or rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        count = self._counters.get(record.name, 0) + 1
+        self._counters[record.name] = count
+        return int(count * rate) != int((count - 1) * rate)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per logger for DEBUG/INFO records; warnings and errors always pass.
+
+    The first record let through after a burst carries a "suppressed" count.
+    """
+
+    def __init__(self, limits: Dict[str, float]):
+        super().__init__()
+        self.limits = limits
+        self._buckets: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.limits:
+            return True
+        limit = _lookup(self.limits, record.name)
+        if limit is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            # [tokens, last refill, suppressed since last emitted record]
+            bucket = self._buckets.setdefault(record.name, [limit, now, 0])
+            bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * limit)
+            bucket[1] = now
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1.0
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks or formats in the calling thread.
+
+    Records are passed to the listener thread as they are; the message is built there.
+    When the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} ({suppressed} similar messages suppressed)" if suppressed else text
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line with timestamp, level, logger, message and any extra fields.
+    """
+
+    _RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: Optional[str] = None, json_output: Optional[bool] = None, log_file: Optional[str] = LOG_FILE,
+                      sample_rates: Optional[Dict[str, float]] = None, rate_limits: Optional[Dict[str, float]] = None,
+                      force: bool = False) -> None:
+    """
+    Configure the root logger once per process.
+
+    Records go through sampling and rate-limit filters into a bounded queue; a
+    listener thread formats them (text or JSON) and writes to stderr and optionally a file.
+    Later calls are no-ops unless force=True, so every entry point can call this safely.
+
+    Args:
+        level (str, optional): Root level; LOG_LEVEL by default
+        json_output (bool, optional): JSON lines instead of text; LOG_FORMAT=json by default
+        log_file (str, optional): Also write to this file
+        sample_rates (dict, optional): Logger name -> fraction of DEBUG/INFO records kept
+        rate_limits (dict, optional): Logger name (or "*") -> DEBUG/INFO records per second
+        force (bool): Replace an earlier configuration
+    """
+    global _configured, _listener
+    with _configure_lock:
+        if _configured and not force:
+            if level:
+                logging.getLogger().setLevel(level.upper())
+            return
+
+        if _listener is not None:
+            _listener.stop()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        json_output = LOG_FORMAT.lower() == "json" if json_output is None else json_output
+        formatter = JsonFormatter() if json_output else TextFormatter(TEXT_FORMAT)
+        outputs: List[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+        if log_file:
+            if os.path.dirname(log_file):
+                os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            outputs.append(logging.FileHandler(log_file, encoding="utf-8"))
+        for output in outputs:
+            output.setFormatter(formatter)
+
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+        handler.addFilter(SamplingFilter(_parse_mapping(LOG_SAMPLE_RATES) if sample_rates is None else sample_rates))
+        handler.addFilter(RateLimitFilter(_parse_mapping(LOG_RATE_LIMITS) if rate_limits is None else rate_limits))
+        root.addHandler(handler)
+        root.setLevel((level or LOG_LEVEL).upper())
+
+        _listener = logging.handlers.QueueListener(handler.queue, *outputs, respect_handler_level=True)
+        _listener.start()
+        if not _configured:
+            atexit.register(_stop_listener)
+        _configured = True
+
+
+def _stop_listener() -> None:
+    # Flush what is queued before the interpreter exits
+    if _listener is not None:
+        _listener.stop()
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "agentic_ai", "ocr_cache.sqlite"))
+DEFAULT_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class OCRCache:
+    """
+    Disk-backed OCR result cache keyed by image content and reader settings.
+
+    Entries live in a single SQLite file and are evicted least-recently-used
+    once the stored results exceed max_bytes.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_results_lru ON ocr_results(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(image_bytes: bytes, languages: Sequence[str], settings: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Build the cache key from the image bytes, language list and reader settings.
+        """
+        digest = hashlib.sha256(image_bytes)
+        digest.update(json.dumps([list(languages), settings or {}], sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return the cached result for key, or None on a miss.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE ocr_results SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Store a JSON-serialisable result and evict old entries if over budget.
+        """
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size FROM ocr_results ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM ocr_results WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} OCR cache entries")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters and the current cache size.
+        """
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_results").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self) -> None:
+        """
+        Remove every cached entry.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM ocr_results")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,270 @@
+import io
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from PIL import Image
+import agent_registry
+from ocr_cache import OCRCache
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# An image can be a path on disk or the raw bytes of an encoded image
+ImageInput = Union[str, bytes]
+
+# Reader owned by a pool worker process (one per worker)
+_worker_reader = None
+
+
+def _build_reader(languages: Sequence[str], gpu: bool, torch_threads: Optional[int]):
+    import easyocr
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads)
+    return easyocr.Reader(list(languages), gpu=gpu)
+
+
+def _init_worker(languages: Sequence[str], gpu: bool, torch_threads: Optional[int]) -> None:
+    global _worker_reader
+    _worker_reader = _build_reader(languages, gpu, torch_threads)
+
+
+def _worker_ready() -> bool:
+    return _worker_reader is not None
+
+
+def _decode(image: ImageInput):
+    from easyocr.utils import reformat_input
+    img, _ = reformat_input(image)
+    return img
+
+
+def _readtext_group(reader, images: List[ImageInput], batch_size: int) -> List[List[Tuple[Any, str, float]]]:
+    """
+    Run one group of same-sized images through EasyOCR's batched path.
+    """
+    decoded = [_decode(image) for image in images]
+    if len(decoded) == 1:
+        return [reader.readtext(decoded[0], batch_size=batch_size)]
+    return reader.readtext_batched(decoded, batch_size=batch_size)
+
+
+def _worker_readtext_group(images: List[ImageInput], batch_size: int):
+    return _readtext_group(_worker_reader, images, batch_size)
+
+
+def _to_plain(result) -> List[Tuple[Any, str, float]]:
+    """
+    Convert EasyOCR output (numpy scalars) into plain JSON-friendly values.
+    """
+    return [([[float(x), float(y)] for x, y in bbox], str(text), float(confidence)) for bbox, text, confidence in result]
+
+
+def _image_bytes(image: ImageInput) -> bytes:
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    with open(image, "rb") as f:
+        return f.read()
+
+
+def _image_size(image: ImageInput) -> Tuple[int, int]:
+    """
+    Read the image dimensions from its header without decoding the pixels.
+    """
+    try:
+        source = io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image
+        with Image.open(source) as img:
+            return img.size
+    except Exception:
+        # Unreadable headers get their own group; EasyOCR reports the real error
+        return (-1, -1)
+
+
+class OCREngine:
+    """
+    Shared EasyOCR engine with a bounded process pool and a batch API.
+
+    Throughput is roughly workers x torch_threads; each worker process loads its own reader.
+    With workers=0 the engine runs in-process on a single shared reader.
+    """
+
+    def __init__(self, languages: Sequence[str] = ("en",), workers: Optional[int] = None,
+                 torch_threads: Optional[int] = None, gpu: bool = False, batch_size: int = 8,
+                 group_size: int = 16, cache: Optional[OCRCache] = None):
+        cpu_count = os.cpu_count() or 1
+        self.languages = tuple(languages)
+        self.workers = workers if workers is not None else int(os.getenv("OCR_WORKERS", "1"))
+        self.torch_threads = torch_threads or int(os.getenv("OCR_TORCH_THREADS", "0")) or max(1, cpu_count // max(1, self.workers))
+        self.gpu = gpu
+        self.batch_size = batch_size
+        self.group_size = group_size
+        self.cache = cache
+        # Reader settings that change the output and therefore the cache key
+        self.cache_settings = {"engine": "easyocr", "decoder": "greedy"}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                logger.info(f"Starting OCR pool with {self.workers} workers x {self.torch_threads} torch threads")
+                # Spawn rather than fork so torch thread pools are not inherited
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.languages, self.gpu, self.torch_threads),
+                )
+            return self._pool
+
+    def _get_reader(self):
+        key = f"ocr_reader:{','.join(self.languages)}"
+        return agent_registry.shared(key, lambda: _build_reader(self.languages, self.gpu, self.torch_threads))
+
+    def warm_up(self) -> None:
+        """
+        Load the EasyOCR models before the first request.
+
+        An in-process engine builds its shared reader; a pooled engine starts every
+        worker, and each worker loads its own reader in the pool initializer.
+        """
+        if self.workers <= 0:
+            self._get_reader()
+            return
+        pool = self._get_pool()
+        for future in [pool.submit(_worker_ready) for _ in range(self.workers)]:
+            future.result()
+
+    def _groups(self, images: Sequence[ImageInput]) -> List[List[int]]:
+        """
+        Group image indices by size so each group can share one batched forward pass.
+        """
+        by_size: Dict[Tuple[int, int], List[int]] = {}
+        for i, image in enumerate(images):
+            by_size.setdefault(_image_size(image), []).append(i)
+
+        groups = []
+        for indices in by_size.values():
+            for start in range(0, len(indices), self.group_size):
+                groups.append(indices[start:start + self.group_size])
+        return groups
+
+    def readtext_batch(self, images: Sequence[ImageInput]) -> List[List[Tuple[Any, str, float]]]:
+        """
+        Run OCR over many images.
+
+        Args:
+            images (list): Image paths or encoded image bytes
+
+        Returns:
+            list: EasyOCR results (bbox, text, confidence) for each image, in input order
+        """
+        images = list(images)
+        results: List[Any] = [None] * len(images)
+
+        # Serve repeated images from the cache and only OCR the misses
+        keys: List[Optional[str]] = [None] * len(images)
+        pending = list(range(len(images)))
+        if self.cache is not None:
+            pending = []
+            for i, image in enumerate(images):
+                data = _image_bytes(image)
+                keys[i] = self.cache.make_key(data, self.languages, self.cache_settings)
+                cached = self.cache.get(keys[i])
+                if cached is None:
+                    # Pass the bytes on so the file is not read twice
+                    images[i] = data
+                    pending.append(i)
+                else:
+                    results[i] = [tuple(entry) for entry in cached]
+
+        if not pending:
+            return results
+
+        groups = [[pending[j] for j in group] for group in self._groups([images[i] for i in pending])]
+
+        if self.workers <= 0:
+            reader = self._get_reader()
+            with self._lock:
+                computed = [(group, _readtext_group(reader, [images[i] for i in group], self.batch_size)) for group in groups]
+        else:
+            pool = self._get_pool()
+            futures = [
+                (group, pool.submit(_worker_readtext_group, [images[i] for i in group], self.batch_size))
+                for group in groups
+            ]
+            computed = [(group, future.result()) for group, future in futures]
+
+        for group, group_results in computed:
+            for i, result in zip(group, group_results):
+                results[i] = _to_plain(result)
+                if self.cache is not None:
+                    self.cache.put(keys[i], results[i])
+        return results
+
+    def readtext(self, image: ImageInput) -> List[Tuple[Any, str, float]]:
+        """
+        Run OCR over a single image.
+        """
+        return self.readtext_batch([image])[0]
+
+    def extract_text_batch(self, images: Sequence[ImageInput]) -> List[str]:
+        """
+        Run OCR over many images and return the recognised text of each one.
+        """
+        return ["\n".join([text for _, text, _ in result]) for result in self.readtext_batch(images)]
+
+    def extract_text(self, image: ImageInput) -> str:
+        """
+        Run OCR over a single image and return the recognised text.
+        """
+        return self.extract_text_batch([image])[0]
+
+    def close(self) -> None:
+        """
+        Shut down the worker pool.
+        """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    """
+    Return the process-wide OCR result cache, or None when disabled with OCR_CACHE=0.
+    """
+    if os.getenv("OCR_CACHE", "1") == "0":
+        return None
+    return agent_registry.shared("ocr_cache", OCRCache)
+
+
+def get_ocr_engine(languages: Sequence[str] = ("en",)) -> OCREngine:
+    """
+    Return the process-wide OCR engine for a language list.
+    """
+    return agent_registry.shared(f"ocr_engine:{','.join(languages)}", lambda: OCREngine(languages, cache=get_ocr_cache()))
+
+
+def configure_ocr_engine(languages: Sequence[str] = ("en",), workers: Optional[int] = None,
+                         torch_threads: Optional[int] = None, **kwargs) -> OCREngine:
+    """
+    Replace the process-wide OCR engine with one using the given throughput settings.
+
+    Args:
+        languages (list): EasyOCR language codes
+        workers (int, optional): Number of worker processes (0 runs in-process)
+        torch_threads (int, optional): Torch intra-op threads per worker
+
+    Returns:
+        OCREngine: The new shared engine
+    """
+    key = f"ocr_engine:{','.join(languages)}"
+    if agent_registry.is_built(key):
+        agent_registry.get(key).close()
+    kwargs.setdefault("cache", get_ocr_cache())
+    agent_registry.register(key, lambda: OCREngine(languages, workers, torch_threads, **kwargs), replace=True)
+    return agent_registry.get(key)
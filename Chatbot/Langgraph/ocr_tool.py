@@ -1,18 +1,19 @@
-import easyocr
 import logging
-from langchain.tools import Tool
+from log_config import configure_logging
+from langchain_core.tools import Tool
+from ocr_engine import get_ocr_engine
+from document_library import add_to_library
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def setup_ocr_tool():
     """
-    Initialize the EasyOCR reader and create a tool for OCR functionality.
+    Create a tool for OCR functionality backed by the shared OCR engine.
     """
-    # Initialize the OCR reader (first time will download the model)
+    # The engine owns the EasyOCR readers (first time will download the model)
     # You can specify multiple languages if needed, e.g., ['en', 'fr']
-    reader = easyocr.Reader(['en'])
+    engine = get_ocr_engine(['en'])
     
     def ocr_with_logging(image_path):
         """
@@ -25,14 +26,12 @@ def setup_ocr_tool():
             str: Extracted text from the image
         """
         try:
-            logger.info(f"Processing image: {image_path}")
+            logger.info("Processing image: %s", image_path)
             # Perform OCR
-            results = reader.readtext(image_path)
+            extracted_text = engine.extract_text(image_path)
+            add_to_library(image_path, "ocr", [{"text": extracted_text}])
             
-            # Extract text from results
-            extracted_text = "\n".join([text for _, text, _ in results])
-            
-            logger.info(f"Successfully extracted text from image")
+            logger.debug("Successfully extracted text from image")
             return extracted_text
         except Exception as e:
             logger.error(f"Error during OCR: {str(e)}")
@@ -49,6 +48,7 @@ def setup_ocr_tool():
 
 # Example usage
 if __name__ == "__main__":
+    configure_logging()
     # Initialize the OCR tool
     ocr_tool = setup_ocr_tool()
     
@@ -2,108 +2,286 @@ import os
 import logging
 import fitz  # PyMuPDF
 import io
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
-from langchain.tools import Tool
+from langchain_core.tools import Tool
+from log_config import configure_logging, payload
+from ingestion_store import file_hash
+from document_library import add_to_library
+from pdf_retrieval import (DEFAULT_TOP_K, DEFAULT_TOKEN_BUDGET, parse_tool_input, chunk_pages,
+                           get_index, select_passages, format_passages)
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def setup_pdf_extractor():
+# Parallel extraction settings
+DEFAULT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_THRESHOLD", "64"))
+PAGES_PER_CHUNK = int(os.getenv("PDF_PAGES_PER_CHUNK", "16"))
+
+# Images below either threshold (decorations, spacers, tiny icons) are skipped
+MIN_IMAGE_PIXELS = int(os.getenv("PDF_MIN_IMAGE_PIXELS", "4096"))
+MIN_IMAGE_BYTES = int(os.getenv("PDF_MIN_IMAGE_BYTES", "1024"))
+
+def _resolve_output_dir(pdf_path, extract_images, output_dir):
+    if extract_images:
+        # Create output directory if specified
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        else:
+            # Use the same directory as the PDF
+            output_dir = os.path.dirname(pdf_path)
+    return output_dir
+
+def _save_image(image_bytes, image_ext, output_dir):
     """
-    Initialize a tool for extracting text and images from PDF files.
+    Save an image under a content-addressed name so identical images share one file.
+    
+    Returns:
+        tuple: (image path, whether the file was written)
+    """
+    digest = hashlib.sha256(image_bytes).hexdigest()[:16]
+    image_path = os.path.join(output_dir, f"img_{digest}.{image_ext}")
+    if os.path.exists(image_path):
+        return image_path, False
+    
+    # Write then rename so parallel workers never see a partial file
+    tmp_path = f"{image_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as img_file:
+        img_file.write(image_bytes)
+    os.replace(tmp_path, image_path)
+    return image_path, True
+
+def iter_pdf_pages(pdf_path, extract_images=True, output_dir=None, start_page=0, end_page=None,
+                   min_image_pixels=MIN_IMAGE_PIXELS, min_image_bytes=MIN_IMAGE_BYTES):
     """
-    def extract_from_pdf(pdf_path, extract_images=True, output_dir=None):
-        """
-        Extract text and images from a PDF file.
+    Stream a PDF one page at a time, reading text and images in a single pass per page.
+    
+    Only the current page is held in memory, so the first record is available
+    as soon as the first page has been read.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        extract_images (bool): Whether to extract images
+        output_dir (str, optional): Directory to save extracted images
+        start_page (int): First page to read (0-based)
+        end_page (int, optional): Page to stop before (0-based); defaults to the last page
+        min_image_pixels (int): Skip images with fewer pixels than this
+        min_image_bytes (int): Skip images whose stored stream is smaller than this
         
-        Args:
-            pdf_path (str): Path to the PDF file
-            extract_images (bool): Whether to extract images
-            output_dir (str, optional): Directory to save extracted images
-            
-        Returns:
-            dict: Dictionary containing extracted text and image paths
-        """
-        try:
-            logger.info(f"Processing PDF: {pdf_path}")
-            
-            # Open the PDF file
-            pdf_document = fitz.open(pdf_path)
-            
-            # Extract text
-            text_content = ""
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                text_content += page.get_text()
-            
-            logger.info(f"Extracted {len(text_content)} characters of text")
+    Yields:
+        dict: Page record with "page_number", "text" and "images" (saved image paths).
+        An image repeated across pages is saved once and every page points at that file.
+    """
+    output_dir = _resolve_output_dir(pdf_path, extract_images, output_dir)
+    
+    # Open the PDF file
+    pdf_document = fitz.open(pdf_path)
+    # xref -> saved path (None when the image was filtered out)
+    seen_xrefs = {}
+    try:
+        end_page = len(pdf_document) if end_page is None else min(end_page, len(pdf_document))
+        for page_num in range(start_page, end_page):
+            page = pdf_document[page_num]
+            record = {
+                "page_number": page_num + 1,
+                "text": page.get_text(),
+                "images": []
+            }
             
-            # Extract images if requested
-            image_paths = []
             if extract_images:
-                # Create output directory if specified
-                if output_dir:
-                    os.makedirs(output_dir, exist_ok=True)
-                else:
-                    # Use the same directory as the PDF
-                    output_dir = os.path.dirname(pdf_path)
-                
-                # Extract images from each page
-                for page_num in range(len(pdf_document)):
-                    page = pdf_document[page_num]
-                    image_list = page.get_images(full=True)
+                for img in page.get_images(full=True):
+                    # Get the XREF and dimensions of the image
+                    xref, width, height = img[0], img[2], img[3]
                     
-                    for img_index, img in enumerate(image_list):
-                        # Get the XREF of the image
-                        xref = img[0]
+                    if xref not in seen_xrefs:
+                        seen_xrefs[xref] = None
+                        # Filter on metadata and the raw stream length before decoding anything
+                        if width * height < min_image_pixels or len(pdf_document.xref_stream_raw(xref) or b"") < min_image_bytes:
+                            continue
                         
-                        # Extract the image bytes
+                        # Extract the image bytes and extension
                         base_image = pdf_document.extract_image(xref)
-                        image_bytes = base_image["image"]
-                        
-                        # Get the image extension
-                        image_ext = base_image["ext"]
-                        
-                        # Create a filename for the image
-                        image_filename = f"page{page_num+1}_img{img_index+1}.{image_ext}"
-                        image_path = os.path.join(output_dir, image_filename)
-                        
-                        # Save the image
-                        with open(image_path, "wb") as img_file:
-                            img_file.write(image_bytes)
-                        
-                        image_paths.append(image_path)
-                        logger.info(f"Saved image: {image_path}")
-            
-            # Close the PDF document
-            pdf_document.close()
-            
-            return {
-                "text": text_content,
-                "images": image_paths,
-                "page_count": len(pdf_document)
-            }
+                        image_path, written = _save_image(base_image["image"], base_image["ext"], output_dir)
+                        seen_xrefs[xref] = image_path
+                        if written:
+                            logger.debug("Saved image: %s", image_path)
+                    
+                    image_path = seen_xrefs[xref]
+                    if image_path and image_path not in record["images"]:
+                        record["images"].append(image_path)
             
-        except Exception as e:
-            logger.error(f"Error processing PDF: {str(e)}")
-            return {
-                "error": f"Error processing PDF: {str(e)}",
-                "text": "",
-                "images": []
-            }
+            yield record
+    finally:
+        # Close the PDF document even if the consumer stops early
+        pdf_document.close()
+
+def _extract_page_range(pdf_path, start_page, end_page, extract_images, output_dir, min_image_pixels, min_image_bytes):
+    """
+    Worker entry point: open the document in this process and extract one page range.
+    """
+    return list(iter_pdf_pages(pdf_path, extract_images, output_dir, start_page, end_page, min_image_pixels, min_image_bytes))
+
+def get_page_count(pdf_path):
+    """
+    Return the number of pages in a PDF without reading its content.
+    """
+    with fitz.open(pdf_path) as pdf_document:
+        return len(pdf_document)
+
+def iter_pdf_pages_parallel(pdf_path, extract_images=True, output_dir=None, workers=None, pages_per_chunk=PAGES_PER_CHUNK,
+                            min_image_pixels=MIN_IMAGE_PIXELS, min_image_bytes=MIN_IMAGE_BYTES):
+    """
+    Stream a PDF page by page, extracting page ranges in a process pool.
+    
+    Each worker opens the document itself. Records are yielded in page order and at
+    most two chunks per worker are in flight, so memory stays bounded.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        extract_images (bool): Whether to extract images
+        output_dir (str, optional): Directory to save extracted images
+        workers (int, optional): Number of worker processes
+        pages_per_chunk (int): Number of pages handed to a worker at a time
+        min_image_pixels (int): Skip images with fewer pixels than this
+        min_image_bytes (int): Skip images whose stored stream is smaller than this
+        
+    Yields:
+        dict: Page record with "page_number", "text" and "images"
+    """
+    workers = workers or DEFAULT_WORKERS
+    output_dir = _resolve_output_dir(pdf_path, extract_images, output_dir)
+    page_count = get_page_count(pdf_path)
+    ranges = deque((start, min(start + pages_per_chunk, page_count)) for start in range(0, page_count, pages_per_chunk))
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers * 2:
+                start, end = ranges.popleft()
+                in_flight.append(executor.submit(
+                    _extract_page_range, pdf_path, start, end, extract_images, output_dir, min_image_pixels, min_image_bytes
+                ))
+            # Wait on the oldest chunk so pages come out in order
+            for record in in_flight.popleft().result():
+                yield record
+
+def extract_from_pdf(pdf_path, extract_images=True, output_dir=None, workers=None, parallel_threshold=PARALLEL_PAGE_THRESHOLD,
+                     min_image_pixels=MIN_IMAGE_PIXELS, min_image_bytes=MIN_IMAGE_BYTES):
+    """
+    Extract text and images from a PDF file.
+    
+    Convenience wrapper that collects the page records. Documents with at least
+    parallel_threshold pages are extracted in a process pool.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        extract_images (bool): Whether to extract images
+        output_dir (str, optional): Directory to save extracted images
+        workers (int, optional): Number of worker processes for large documents
+        parallel_threshold (int): Page count below which extraction stays single-process
+        min_image_pixels (int): Skip images with fewer pixels than this
+        min_image_bytes (int): Skip images whose stored stream is smaller than this
+        
+    Returns:
+        dict: Dictionary containing extracted text, unique image paths and the page -> images mapping
+    """
+    try:
+        logger.info("Processing PDF: %s", payload(pdf_path))
+        
+        workers = workers or DEFAULT_WORKERS
+        if workers > 1 and get_page_count(pdf_path) >= parallel_threshold:
+            logger.info("Extracting in parallel with %d workers", workers)
+            records = iter_pdf_pages_parallel(pdf_path, extract_images, output_dir, workers,
+                                              min_image_pixels=min_image_pixels, min_image_bytes=min_image_bytes)
+        else:
+            records = iter_pdf_pages(pdf_path, extract_images, output_dir,
+                                     min_image_pixels=min_image_pixels, min_image_bytes=min_image_bytes)
+        
+        text_parts = []
+        image_paths = {}
+        page_images = {}
+        library_passages = []
+        page_count = 0
+        for record in records:
+            text_parts.append(record["text"])
+            library_passages.append({"text": record["text"], "page": record["page_number"]})
+            for image_path in record["images"]:
+                image_paths.setdefault(image_path, None)
+            if record["images"]:
+                page_images[record["page_number"]] = record["images"]
+            page_count += 1
+        
+        text_content = "".join(text_parts)
+        logger.info("Extracted %d characters of text", len(text_content))
+        add_to_library(pdf_path, "pdf_extractor", library_passages)
+        
+        return {
+            "text": text_content,
+            "images": list(image_paths),
+            "page_images": page_images,
+            "page_count": page_count
+        }
+        
+    except Exception as e:
+        logger.error(f"Error processing PDF: {str(e)}")
+        return {
+            "error": f"Error processing PDF: {str(e)}",
+            "text": "",
+            "images": [],
+            "page_images": {}
+        }
+
+def query_pdf(tool_input, top_k=DEFAULT_TOP_K, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Tool entry point: answer a question from a PDF with only the most relevant passages.
+    
+    Args:
+        tool_input (str): "path/to/file.pdf | question"
+        top_k (int): Maximum number of passages to return
+        token_budget (int): Approximate token limit for the returned passages
+        
+    Returns:
+        str: Ranked passages with page numbers; questions about the whole document,
+        and inputs without a question, get its leading passages within token_budget
+    """
+    pdf_path, question = parse_tool_input(tool_input)
+    if not question:
+        # Models often drop the question; send the leading passages rather than the whole document
+        question = ""
     
+    try:
+        logger.info("Retrieving passages from %s for: %s", pdf_path, payload(question))
+        # The passage index is cached per document content, so follow-up questions skip extraction
+        def build_chunks():
+            records = list(iter_pdf_pages(pdf_path, extract_images=False))
+            add_to_library(pdf_path, "pdf_extractor", ({"text": r["text"], "page": r["page_number"]} for r in records))
+            return chunk_pages(records)
+        
+        index = get_index(f"pdf_extractor:{file_hash(pdf_path)}", build_chunks)
+        return format_passages(select_passages(index, question, top_k, token_budget))
+    except Exception as e:
+        logger.error(f"Error querying PDF: {str(e)}")
+        return f"Error querying PDF: {str(e)}"
+
+def setup_pdf_extractor():
+    """
+    Initialize a tool for extracting text and images from PDF files.
+    """
     # Create a LangChain tool for PDF extraction
     pdf_tool = Tool(
         name="pdf_extractor",
-        description="Useful for extracting text and images from PDF files. Input should be a path to a PDF file.",
-        func=extract_from_pdf
+        description="Useful for answering questions from PDF files. Input should be a path to a PDF file followed by ' | ' and the question, e.g. 'report.pdf | What was the revenue in 2023?'. Returns the most relevant passages with page numbers.",
+        func=query_pdf
     )
     
     return pdf_tool
 
 # Example usage
 if __name__ == "__main__":
+    configure_logging()
     # Initialize the PDF extractor tool
     pdf_tool = setup_pdf_extractor()
     
@@ -0,0 +1,254 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from ingested_document import IngestedDocument
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+DEFAULT_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1500"))
+CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1200"))
+INDEX_CACHE_SIZE = int(os.getenv("RETRIEVAL_INDEX_CACHE_SIZE", "32"))
+
+# Separates the file path from the question in a tool input
+QUESTION_SEPARATOR = "|"
+# Tool result when nothing in the document can answer the question
+NO_PASSAGES = "No passages in the document matched the question."
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or that the this to was were what when "
+    "where which who why will with about does do did can".split()
+)
+# Words that refer to the document as a whole; a question made only of these has nothing to rank by
+_DOCUMENT_TERMS = frozenset(
+    "pdf document doc file paper report text content contents summary summarize summarise overview main "
+    "tell say says me give key points".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def is_whole_document_question(question: str) -> bool:
+    """
+    Check whether a question is about the document as a whole, e.g. "What is this PDF about?".
+    """
+    return all(token in _DOCUMENT_TERMS for token in tokenize(question))
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return max(1, len(text) // 4)
+
+
+def parse_tool_input(tool_input: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a tool input into the file path and an optional question.
+
+    Accepts "path | question" or a JSON object with "path" and "question" keys.
+    """
+    tool_input = tool_input.strip()
+    if tool_input.startswith("{"):
+        try:
+            data = json.loads(tool_input)
+            return str(data.get("path", "")).strip(), (data.get("question") or None)
+        except ValueError:
+            pass
+    path, _, question = tool_input.partition(QUESTION_SEPARATOR)
+    return path.strip().strip("'\""), question.strip() or None
+
+
+def chunk_document(document: IngestedDocument, max_chars: int = CHUNK_CHARS) -> List[Dict[str, Any]]:
+    """
+    Split an ingested document into passages that follow its section structure.
+
+    A title starts a new section; text inside a section is packed into passages of
+    at most max_chars, each carrying its section title and page span.
+    """
+    chunks: List[Dict[str, Any]] = []
+    section = None
+    parts: List[str] = []
+    size = 0
+    pages: List[int] = []
+    first_element = None
+
+    def flush():
+        nonlocal parts, size, pages, first_element
+        if parts:
+            chunks.append({
+                "text": "\n".join(parts),
+                "section": section,
+                "page_start": min(pages) if pages else None,
+                "page_end": max(pages) if pages else None,
+                "element": first_element,
+            })
+        parts, size, pages, first_element = [], 0, [], None
+
+    for index, kind, page, text in document.all():
+        if kind in ("page_break", "image") or not text.strip():
+            continue
+        if kind == "title":
+            flush()
+            section = text.strip()
+        if size + len(text) > max_chars:
+            flush()
+        if first_element is None:
+            first_element = index
+        parts.append(text)
+        size += len(text)
+        if page:
+            pages.append(page)
+    flush()
+    return chunks
+
+
+def chunk_pages(page_records: Iterable[Dict[str, Any]], max_chars: int = CHUNK_CHARS) -> List[Dict[str, Any]]:
+    """
+    Split page records (from pdf_extractor.iter_pdf_pages) into paragraph-aligned passages.
+    """
+    chunks = []
+    for record in page_records:
+        parts: List[str] = []
+        size = 0
+        for paragraph in re.split(r"\n\s*\n", record["text"]):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if size + len(paragraph) > max_chars and parts:
+                chunks.append({"text": "\n\n".join(parts), "section": None,
+                               "page_start": record["page_number"], "page_end": record["page_number"]})
+                parts, size = [], 0
+            parts.append(paragraph)
+            size += len(paragraph)
+        if parts:
+            chunks.append({"text": "\n\n".join(parts), "section": None,
+                           "page_start": record["page_number"], "page_end": record["page_number"]})
+    return chunks
+
+
+class BM25Index:
+    """
+    In-process Okapi BM25 ranker over a list of passages.
+    """
+
+    def __init__(self, chunks: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+
+        for chunk_id, chunk in enumerate(chunks):
+            # Section titles count towards the passage so headings help ranking
+            tokens = tokenize(f"{chunk.get('section') or ''} {chunk['text']}")
+            self.lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((chunk_id, tf))
+
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        n = len(chunks)
+        self.idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Return up to top_k (score, passage) pairs, best first.
+        """
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for chunk_id, tf in self.postings[term]:
+                norm = 1 - self.b + self.b * self.lengths[chunk_id] / (self.avg_length or 1)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(score, self.chunks[chunk_id]) for chunk_id, score in best]
+
+
+def select_passages(index: BM25Index, question: str, top_k: int = DEFAULT_TOP_K,
+                    token_budget: int = DEFAULT_TOKEN_BUDGET) -> List[Dict[str, Any]]:
+    """
+    Pick the best-scoring passages that fit within the token budget.
+
+    Questions about the whole document, and questions that match no passage, get the
+    document's leading passages instead, so e.g. "Summarize the document" still sees content.
+    """
+    hits = [] if is_whole_document_question(question) else index.search(question, top_k)
+    leading = not hits
+    if leading:
+        hits = [(0.0, chunk) for chunk in index.chunks]
+    selected = []
+    used = 0
+    for score, chunk in hits:
+        cost = estimate_tokens(chunk["text"])
+        if used + cost > token_budget:
+            if selected:
+                if leading:
+                    # Leading passages are taken in order, so stop at the first one that does not fit
+                    break
+                continue
+            # Always return something: trim the single best passage to the budget
+            chunk = dict(chunk, text=chunk["text"][:token_budget * 4])
+            cost = token_budget
+        selected.append(dict(chunk, score=round(score, 3)))
+        used += cost
+    return selected
+
+
+def format_passages(passages: List[Dict[str, Any]]) -> str:
+    """
+    Render passages with their page and section provenance for the agent.
+    """
+    if not passages:
+        return NO_PASSAGES
+    blocks = []
+    for passage in passages:
+        if passage["page_start"] and passage["page_end"] != passage["page_start"]:
+            where = f"pages {passage['page_start']}-{passage['page_end']}"
+        else:
+            where = f"page {passage['page_start'] or '?'}"
+        if passage.get("section"):
+            where += f", section \"{passage['section']}\""
+        blocks.append(f"[{where}]\n{passage['text']}")
+    return "\n\n".join(blocks)
+
+
+_index_cache: "OrderedDict[str, BM25Index]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def get_index(cache_key: str, build_chunks: Callable[[], List[Dict[str, Any]]]) -> BM25Index:
+    """
+    Return the cached passage index for a document, building it on first use.
+
+    Args:
+        cache_key (str): Identifies the document and how it was chunked
+        build_chunks (callable): Produces the passages when the index is not cached
+
+    Returns:
+        BM25Index: The document's index
+    """
+    with _index_cache_lock:
+        if cache_key in _index_cache:
+            _index_cache.move_to_end(cache_key)
+            return _index_cache[cache_key]
+
+    index = BM25Index(build_chunks())
+    logger.info("Indexed %d passages for retrieval", len(index.chunks))
+
+    with _index_cache_lock:
+        _index_cache[cache_key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
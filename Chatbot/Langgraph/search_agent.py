@@ -1,13 +1,12 @@
 from dotenv import load_dotenv
-from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
-from langchain.tools import Tool
-from langchain.agents import initialize_agent, AgentType
-from langchain_openai import ChatOpenAI
 import os
 import logging
+from log_config import configure_logging, payload
+import agent_registry
+import tracing
+from web_tools import setup_search_tool
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -17,23 +16,14 @@ def setup_search_agent():
     # Set up API keys
     os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
 
-    # Initialize search tool with logging
-    search = DuckDuckGoSearchAPIWrapper()
-    
-    def search_with_logging(query):
-        logger.info(f"Search tool invoked with query: {query}")
-        result = search.run(query)
-        logger.info(f"Search tool returned result of length: {len(result)}")
-        return result
-
-    search_tool = Tool(
-        name="search",
-        description="Useful for searching the internet for recent news and information",
-        func=search_with_logging
-    )
+    # Shared search tool (results are cached and coalesced across agents)
+    search_tool = agent_registry.shared("tool:search", setup_search_tool)
 
     # Initialize the LLM
-    chat_llm = ChatOpenAI(model='gpt-4')
+    chat_llm = agent_registry.chat_llm('gpt-4', temperature=0)
+
+    # langchain.agents takes seconds to import, so load it only when an agent is built
+    from langchain.agents import initialize_agent, AgentType
 
     # Create the agent with the search tool
     agent = initialize_agent(
@@ -45,11 +35,14 @@ def setup_search_agent():
     
     return agent
 
+# Build the agent once per process and share it across requests
+agent_registry.register("search_agent", setup_search_agent)
+
 def search_news(query):
-    agent = setup_search_agent()
+    agent = agent_registry.get("search_agent")
     try:
-        logger.info(f"Starting search for query: {query}")
-        result = agent.run(query)
+        logger.info("Starting search for query: %s", payload(query))
+        result = agent.run(query, callbacks=tracing.callbacks())
         logger.info("Search completed successfully")
         return result
     except Exception as e:
@@ -57,6 +50,7 @@ def search_news(query):
         return f"An error occurred: {str(e)}"
 
 if __name__ == "__main__":
+    configure_logging()
     # Example usage
     result = search_news("What is the latest news on ChatGPT")
     print("\nFinal Result:")
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules import each other by bare name from Chatbot/Langgraph
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,40 @@
+import pytest
+from intent_router import AGENT, OCR, PDF, WEATHER, IntentRouter
+
+# (query, file_path, file_type, expected intent, expected tool input)
+ROUTES = [
+    ("What is the weather in Paris?", None, None, WEATHER, "Paris"),
+    ("Is it raining in Seattle?", None, None, WEATHER, "Seattle"),
+    ("how hot is it in Cairo", None, None, WEATHER, "Cairo"),
+    ("What is the temperature in Berlin?", None, None, WEATHER, "Berlin"),
+    ("temperature and wind in Oslo", None, None, WEATHER, "Oslo"),
+    # Weather words that are not about the weather
+    ("What is the temperature at which water boils in Denver?", None, None, AGENT, None),
+    ("Is Tesla stock hot in New York?", None, None, AGENT, None),
+    # Weather questions the tool cannot answer in one call
+    ("Will it rain in Paris tomorrow?", None, None, AGENT, None),
+    ("What is the weather in Paris and London?", None, None, AGENT, None),
+    ("Is it sunny today?", None, None, AGENT, None),
+    # Compound questions
+    ("Is it raining in Seattle and what is the news?", None, None, AGENT, None),
+    ("What's the weather in Rome and also the latest news on OpenAI?", None, None, AGENT, None),
+    # No direct tool
+    ("What is the latest news on OpenAI?", None, None, AGENT, None),
+    ("tell me a joke", None, None, AGENT, None),
+    # Attached files
+    ("summarize the document", "/tmp/report.pdf", "pdf", PDF, "/tmp/report.pdf | summarize the document"),
+    ("what text is in this image", "/tmp/sign.png", "image", OCR, "/tmp/sign.png"),
+]
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter()
+
+
+@pytest.mark.parametrize("query, file_path, file_type, intent, tool_input", ROUTES)
+def test_route(router, query, file_path, file_type, intent, tool_input):
+    decision = router.route(query, file_path, file_type)
+    assert (decision.intent, decision.tool_input) == (intent, tool_input), decision.reason
+    if intent != AGENT:
+        assert decision.confidence >= router.min_confidence
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+import vector_index
+from vector_index import Embedder, HashingEmbedder, VectorIndex
+
+TOPICS = ["revenue growth", "installation steps", "safety warnings", "battery life", "warranty terms",
+          "network settings", "cleaning instructions", "firmware update"]
+
+
+def passages(doc_id, count=40):
+    return [f"{TOPICS[i % len(TOPICS)]} for product {doc_id} passage {i}" for i in range(count)]
+
+
+def add(index, embedder, doc, texts):
+    return index.add_document(doc, embedder.embed_batched(texts), [{"text": t} for t in texts])
+
+
+@pytest.fixture
+def embedder():
+    return HashingEmbedder(dim=64)
+
+
+def test_embedder_is_abstract():
+    with pytest.raises(TypeError):
+        Embedder()
+
+
+def test_hashing_embedder_is_deterministic_and_normalised(embedder):
+    first = embedder.embed_batched(["battery life of the device", "warranty terms"])
+    second = HashingEmbedder(dim=64).embed_batched(["battery life of the device", "warranty terms"])
+    assert first.shape == (2, 64)
+    assert np.array_equal(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0)
+
+
+def test_append_and_exact_search(tmp_path, embedder):
+    index = VectorIndex(str(tmp_path))
+    assert add(index, embedder, "a", passages("a")) == 40
+    assert add(index, embedder, "b", passages("b")) == 40
+    # Already indexed documents are not appended again
+    assert add(index, embedder, "a", passages("a")) == 0
+    assert len(index) == 80
+
+    text = passages("b")[5]
+    hits = index.search(embedder.embed_batched([text])[0], top_k=3, exact=True)
+    assert hits[0]["text"] == text
+    assert hits[0]["doc"] == "b"
+    assert hits[0]["score"] == pytest.approx(1.0, abs=1e-3)
+
+    scoped = index.search(embedder.embed_batched([text])[0], top_k=5, doc="a")
+    assert {hit["doc"] for hit in scoped} == {"a"}
+    index.close()
+
+
+def test_reopen_keeps_rows_and_drops_uncommitted_tail(tmp_path, embedder):
+    index = VectorIndex(str(tmp_path))
+    add(index, embedder, "a", passages("a"))
+    index.close()
+
+    # A crash between writing the matrix and committing leaves extra bytes behind
+    with open(tmp_path / "vectors.bin", "ab") as f:
+        f.write(np.ones((3, 64), dtype=np.float32).tobytes())
+
+    reopened = VectorIndex(str(tmp_path))
+    assert len(reopened) == 40
+    assert reopened.dim == 64
+    assert (tmp_path / "vectors.bin").stat().st_size == 40 * 64 * 4
+    assert reopened.has_document("a")
+    add(reopened, embedder, "b", passages("b"))
+    assert reopened.stats()["rows"] == 80
+    assert reopened.stats()["documents"] == 2
+
+    text = passages("a")[7]
+    assert reopened.search(embedder.embed_batched([text])[0], top_k=1)[0]["text"] == text
+    reopened.close()
+
+
+def test_ivf_search_matches_exact_for_indexed_rows(tmp_path, embedder, monkeypatch):
+    monkeypatch.setattr(vector_index, "IVF_MIN_ROWS", 0)
+    index = VectorIndex(str(tmp_path))
+    for doc in ("a", "b", "c"):
+        add(index, embedder, doc, passages(doc))
+    index.train_ivf(n_lists=4)
+    # Rows appended after training are assigned to lists as they arrive
+    add(index, embedder, "d", passages("d"))
+    assert index.stats()["ivf_lists"] == 4
+
+    for text in (passages("a")[3], passages("d")[11]):
+        query = embedder.embed_batched([text])[0]
+        # Probing every list makes the IVF path exhaustive
+        assert index.search(query, top_k=1, nprobe=4)[0]["text"] == text
+        assert index.search(query, top_k=1, exact=True)[0]["text"] == text
+    index.close()
+
+
+def test_second_instance_and_failed_add_do_not_misalign_rows(tmp_path, embedder):
+    first = VectorIndex(str(tmp_path))
+    second = VectorIndex(str(tmp_path))
+    add(first, embedder, "a", ["alpha apples"])
+    add(first, embedder, "b", ["bravo bananas"])
+    # The second instance has not seen those rows but must not reuse their row numbers
+    add(second, embedder, "c", ["charlie cherries"])
+
+    # A failed commit leaves nothing behind in the matrix
+    with pytest.raises(TypeError):
+        first.add_document("d", embedder.embed_batched(["delta dates"]), [{"text": object()}])
+    assert (tmp_path / "vectors.bin").stat().st_size == 3 * 64 * 4
+    add(first, embedder, "e", ["echo eggplants"])
+
+    reopened = VectorIndex(str(tmp_path))
+    assert len(reopened) == 4
+    assert (tmp_path / "vectors.bin").stat().st_size == 4 * 64 * 4
+    for text in ("alpha apples", "bravo bananas", "charlie cherries", "echo eggplants"):
+        hit = reopened.search(embedder.embed_batched([text])[0], top_k=1)[0]
+        assert hit["text"] == text
+        assert hit["score"] == pytest.approx(1.0, abs=1e-3)
+    for index in (first, second, reopened):
+        index.close()
@@ -0,0 +1,101 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from web_tools import ToolResultCache
+
+THREADS = 8
+
+
+class CountingFetch:
+    """
+    Fake tool call that blocks until released and counts how often it runs.
+    """
+
+    def __init__(self, result="result", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return f"{self.result} {self.calls}"
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def run_concurrently(cache, fetch, queries):
+    # Start every lookup, wait until all but the owner are waiting on its call, then let the call finish
+    pool = ThreadPoolExecutor(max_workers=len(queries))
+    futures = [pool.submit(cache.get, query, fetch) for query in queries]
+    assert fetch.started.wait(5)
+    wait_for(lambda: cache.stats()["coalesced"] == len(queries) - 1)
+    fetch.release.set()
+    pool.shutdown(wait=True)
+    return futures
+
+
+def test_concurrent_identical_queries_share_one_fetch():
+    cache = ToolResultCache("test", ttl=60)
+    fetch = CountingFetch()
+    # Queries that normalise to the same key count as identical
+    futures = run_concurrently(cache, fetch, ["Weather in Paris"] * (THREADS - 1) + ["  weather IN paris "])
+
+    assert fetch.calls == 1
+    assert {future.result() for future in futures} == {"result 1"}
+    assert cache.get("weather in paris", fetch) == "result 1"
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, THREADS - 1, 1)
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache = ToolResultCache("test", ttl=60)
+    fetch = CountingFetch(error=RuntimeError("rate limited"))
+    futures = run_concurrently(cache, fetch, ["news"] * THREADS)
+
+    assert fetch.calls == 1
+    for future in futures:
+        with pytest.raises(RuntimeError, match="rate limited"):
+            future.result()
+    assert cache.stats()["errors"] == 1
+
+    # The next lookup calls the tool again
+    retry = CountingFetch()
+    retry.release.set()
+    assert cache.get("news", retry) == "result 1"
+    assert retry.calls == 1
+
+
+def test_stale_hit_triggers_exactly_one_background_refresh():
+    cache = ToolResultCache("test", ttl=0.05, stale_ttl=60)
+    first = CountingFetch(result="old")
+    first.release.set()
+    assert cache.get("news", first) == "old 1"
+    time.sleep(0.1)
+
+    refresh = CountingFetch(result="new")
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        results = list(pool.map(lambda _: cache.get("news", refresh), range(THREADS)))
+    # Every stale reader gets the old value at once, without waiting for the refresh
+    assert results == ["old 1"] * THREADS
+    assert refresh.started.wait(5)
+    refresh.release.set()
+    wait_for(lambda: cache.stats()["inflight"] == 0)
+
+    assert refresh.calls == 1
+    stats = cache.stats()
+    assert (stats["stale_hits"], stats["refreshes"]) == (THREADS, 1)
+    assert cache.get("news", refresh) == "new 1"
@@ -0,0 +1,483 @@
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID, uuid4
+from langchain_core.callbacks import BaseCallbackHandler, CallbackManager
+import agent_registry
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Tracing is on by default; TRACING=0 removes the handler entirely
+TRACING_ENABLED = os.getenv("TRACING", "1") != "0"
+# Fraction of traces written to the JSONL file; metrics always count every span, and error spans are always written
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+DEFAULT_TRACE_PATH = os.getenv("TRACE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "agentic_ai", "traces.jsonl"))
+MAX_TRACE_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(100 * 1024 * 1024)))
+QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+# Port for a standalone /metrics endpoint; 0 leaves it off (the chat service serves /metrics itself)
+METRICS_PORT = int(os.getenv("TRACE_METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("TRACE_METRICS_HOST", "127.0.0.1")
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# USD per million prompt / completion tokens; the longest matching model prefix wins
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """
+    Price a call from the PRICES table, or None for an unknown model.
+    """
+    if not model:
+        return None
+    for prefix in sorted(PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            prompt_price, completion_price = PRICES[prefix]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    return None
+
+
+class JsonlSpanSink:
+    """
+    Append spans to a JSONL file from a background thread.
+
+    Callers never block: when the queue is full the span is dropped and counted.
+    The file is rotated to "<path>.1" once it grows past max_bytes.
+    """
+
+    def __init__(self, path: str = DEFAULT_TRACE_PATH, max_bytes: int = MAX_TRACE_BYTES, queue_size: int = QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._thread = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, span: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # Drain whatever else is waiting so one write covers many spans
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = "".join(json.dumps(span, default=str) + "\n" for span in batch if span is not None)
+            try:
+                if lines:
+                    if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                        os.replace(self.path, self.path + ".1")
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(lines)
+            except OSError as e:
+                logger.error(f"Error writing traces: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class TraceMetrics:
+    """
+    In-process counters and latency histograms, rendered in the Prometheus text format.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, seconds: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            # Per-bucket counts, then sum and count
+            values = self._histograms.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    values[i] += 1
+                    break
+            values[-2] += seconds
+            values[-1] += 1
+
+    @staticmethod
+    def _labels(labels, extra: str = "") -> str:
+        parts = [f'{k}="{str(v)}"'.replace("\n", " ") for k, v in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+
+        seen = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{self._labels(labels)} {value:g}")
+
+        if histograms:
+            name = "agentic_span_duration_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for labels, values in sorted(histograms.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, values):
+                    cumulative += count
+                    le = 'le="%g"' % bound
+                    lines.append(f"{name}_bucket{self._labels(labels, le)} {cumulative:g}")
+                le = 'le="+Inf"'
+                lines.append(f"{name}_bucket{self._labels(labels, le)} {values[-1]:g}")
+                lines.append(f"{name}_sum{self._labels(labels)} {values[-2]:.6f}")
+                lines.append(f"{name}_count{self._labels(labels)} {values[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+class _Span:
+    __slots__ = ("span_id", "trace_id", "parent_id", "kind", "name", "wall_start", "start", "sampled", "attrs")
+
+    def __init__(self, span_id, trace_id, parent_id, kind, name, sampled, attrs):
+        self.span_id = span_id
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.kind = kind
+        self.name = name
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.sampled = sampled
+        self.attrs = attrs
+
+
+def _run_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any], default: str) -> str:
+    if kwargs.get("name"):
+        return kwargs["name"]
+    serialized = serialized or {}
+    return serialized.get("name") or (serialized.get("id") or [default])[-1]
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler that turns runs into spans.
+
+    Every chain, LLM call, tool call and agent step becomes a span with wall time,
+    status and, for LLM calls, token counts, cost and whether the response came
+    from the cache. All spans feed the metrics; whole traces are sampled for the
+    JSONL sink at sample_rate, and error spans are written regardless.
+    Pass it per call (callbacks=tracing.callbacks()) so it is inherited by child runs.
+    """
+
+    raise_error = False
+    run_inline = True
+
+    def __init__(self, sink: Optional[JsonlSpanSink] = None, metrics: Optional[TraceMetrics] = None,
+                 sample_rate: float = SAMPLE_RATE):
+        super().__init__()
+        self.sink = sink
+        self.metrics = metrics or TraceMetrics()
+        self.sample_rate = sample_rate
+        self._spans: Dict[UUID, _Span] = {}
+        # Start of the current agent step for each AgentExecutor run
+        self._step_started: Dict[UUID, Tuple[float, float, int]] = {}
+        self._pending_action: Dict[UUID, Any] = {}
+
+    # Span bookkeeping
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], kind: str, name: str, **attrs: Any) -> None:
+        parent = self._spans.get(parent_run_id) if parent_run_id else None
+        if parent is not None:
+            trace_id, sampled = parent.trace_id, parent.sampled
+        else:
+            trace_id, sampled = run_id.hex, random.random() < self.sample_rate
+        self._spans[run_id] = _Span(run_id.hex, trace_id, parent_run_id.hex if parent_run_id else None,
+                                    kind, name, sampled, attrs)
+
+    def _emit(self, span_id: str, trace_id: str, parent_id: Optional[str], kind: str, name: str, wall_start: float,
+              seconds: float, sampled: bool, error: Optional[BaseException] = None, **attrs: Any) -> None:
+        status = "error" if error is not None else "ok"
+        self.metrics.observe(seconds, kind=kind, name=name, status=status)
+        if error is not None:
+            self.metrics.inc("agentic_errors_total", kind=kind, name=name)
+        if self.sink is None or not (sampled or error is not None):
+            return
+        span = {
+            "trace_id": trace_id, "span_id": span_id, "parent_id": parent_id, "kind": kind, "name": name,
+            "start": round(wall_start, 6), "duration_ms": round(seconds * 1000, 3), "status": status,
+        }
+        if error is not None:
+            span["error"] = f"{type(error).__name__}: {str(error)[:500]}"
+        span.update({k: v for k, v in attrs.items() if v is not None})
+        self.sink.write(span)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attrs: Any) -> Optional[_Span]:
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return None
+        span.attrs.update(attrs)
+        self._emit(span.span_id, span.trace_id, span.parent_id, span.kind, span.name, span.wall_start,
+                   time.perf_counter() - span.start, span.sampled, error, **span.attrs)
+        return span
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Trace work that does not go through LangChain, e.g. a raw OpenAI stream.
+
+        Yields a dict the caller can add attributes to (such as token counts) before the span ends.
+        """
+        run_id = uuid4()
+        self._start(run_id, None, kind, name, **attrs)
+        span = self._spans[run_id]
+        try:
+            yield span.attrs
+        except BaseException as e:
+            self._end(run_id, error=e)
+            raise
+        else:
+            self._end(run_id)
+
+    # Chains
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "chain", _run_name(serialized, kwargs, "chain"))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+        self._step_started.pop(run_id, None)
+        self._pending_action.pop(run_id, None)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+        self._step_started.pop(run_id, None)
+        self._pending_action.pop(run_id, None)
+
+    # LLM calls
+
+    def _llm_start(self, serialized, run_id, parent_run_id, kwargs, prompt_chars):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model")
+        self._start(run_id, parent_run_id, "llm", _run_name(serialized, kwargs, "llm"),
+                    model=model, prompt_chars=prompt_chars)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._llm_start(serialized, run_id, parent_run_id, kwargs, sum(len(p) for p in prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        chars = sum(len(m.content) if isinstance(m.content, str) else 0 for batch in messages for m in batch)
+        self._llm_start(serialized, run_id, parent_run_id, kwargs, chars)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        span = self._spans.get(run_id)
+        if span is not None and "ttft_ms" not in span.attrs:
+            span.attrs["ttft_ms"] = round((time.perf_counter() - span.start) * 1000, 3)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self._spans.get(run_id)
+        if span is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        model = (response.llm_output or {}).get("model_name") or span.attrs.get("model")
+        cached = False
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is None:
+                    continue
+                cached = cached or bool(message.response_metadata.get("cached"))
+                if not usage and message.usage_metadata:
+                    prompt_tokens += message.usage_metadata.get("input_tokens", 0)
+                    completion_tokens += message.usage_metadata.get("output_tokens", 0)
+                model = model or message.response_metadata.get("model_name")
+
+        # Cached responses carry the original usage but cost nothing
+        cost = 0.0 if cached else estimate_cost(model, prompt_tokens, completion_tokens)
+        label = model or span.name
+        self.metrics.inc("agentic_llm_calls_total", model=label, cached=str(cached).lower())
+        if not cached:
+            self.metrics.inc("agentic_llm_tokens_total", prompt_tokens, model=label, type="prompt")
+            self.metrics.inc("agentic_llm_tokens_total", completion_tokens, model=label, type="completion")
+            if cost:
+                self.metrics.inc("agentic_llm_cost_usd_total", cost, model=label)
+        self._end(run_id, model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                  total_tokens=prompt_tokens + completion_tokens, cache_hit=cached,
+                  cost_usd=round(cost, 6) if cost is not None else None)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    # Tools and agent steps
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "tool", _run_name(serialized, kwargs, "tool"), input_chars=len(input_str or ""))
+
+    def on_tool_end(self, output, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, output_chars=len(str(output)))
+        self._end_step(parent_run_id)
+
+    def on_tool_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, error=error)
+        self._end_step(parent_run_id, error)
+
+    def on_agent_action(self, action, *, run_id, **kwargs):
+        # An agent step runs from the end of the previous step (or the agent start) to the end of its tool call
+        if run_id not in self._step_started and run_id in self._spans:
+            parent = self._spans[run_id]
+            self._step_started[run_id] = (parent.wall_start, parent.start, 0)
+        self._pending_action[run_id] = action.tool
+
+    def _end_step(self, agent_run_id: Optional[UUID], error: Optional[BaseException] = None, tool: Optional[str] = None) -> None:
+        if agent_run_id is None or agent_run_id not in self._step_started:
+            return
+        tool = tool or self._pending_action.pop(agent_run_id, None)
+        if tool is None:
+            return
+        agent = self._spans.get(agent_run_id)
+        wall_start, start, index = self._step_started[agent_run_id]
+        now = time.perf_counter()
+        self._emit(uuid4().hex, agent.trace_id if agent else agent_run_id.hex, agent_run_id.hex, "agent_step",
+                   f"{agent.name if agent else 'agent'}.step", wall_start, now - start,
+                   agent.sampled if agent else False, error, step=index, tool=tool)
+        self._step_started[agent_run_id] = (wall_start + (now - start), now, index + 1)
+
+    def on_agent_finish(self, finish, *, run_id, **kwargs):
+        if run_id not in self._step_started and run_id in self._spans:
+            parent = self._spans[run_id]
+            self._step_started[run_id] = (parent.wall_start, parent.start, 0)
+        self._end_step(run_id, tool="final_answer")
+
+    def render_metrics(self) -> str:
+        text = self.metrics.render()
+        if self.sink is not None:
+            text += f"# TYPE agentic_trace_spans_dropped_total counter\nagentic_trace_spans_dropped_total {self.sink.dropped}\n"
+        return text
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> ThreadingHTTPServer:
+    """
+    Serve GET /metrics in a daemon thread and return the server (port 0 picks a free port).
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def _build_tracer() -> TracingCallbackHandler:
+    tracer = TracingCallbackHandler(sink=JsonlSpanSink() if SAMPLE_RATE > 0 else None)
+    if METRICS_PORT:
+        try:
+            agent_registry.shared("metrics_server", lambda: start_metrics_server(METRICS_PORT))
+        except OSError as e:
+            logger.error(f"Error starting metrics server: {str(e)}")
+    return tracer
+
+
+def get_tracer() -> Optional[TracingCallbackHandler]:
+    """
+    Return the process-wide tracing handler, or None when disabled with TRACING=0.
+    """
+    if not TRACING_ENABLED:
+        return None
+    return agent_registry.shared("tracer", _build_tracer)
+
+
+def callbacks() -> List[BaseCallbackHandler]:
+    """
+    Callbacks to pass to an agent, chain or model call; empty when tracing is off.
+    """
+    tracer = get_tracer()
+    return [tracer] if tracer is not None else []
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Trace a block outside LangChain with the shared handler; a no-op when tracing is off.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        yield dict(attrs)
+        return
+    with tracer.span(kind, name, **attrs) as span_attrs:
+        yield span_attrs
+
+
+@contextmanager
+def run_group(name: str) -> Iterator[Any]:
+    """
+    Nest several LangChain calls under one chain span.
+
+    Yields the callbacks to pass to each call inside the block.
+    """
+    run_manager = CallbackManager.configure(inheritable_callbacks=callbacks()).on_chain_start({"name": name}, {}, name=name)
+    try:
+        yield run_manager.get_child()
+    except BaseException as e:
+        run_manager.on_chain_error(e)
+        raise
+    else:
+        run_manager.on_chain_end({})
+
+
+def render_metrics() -> str:
+    """
+    Current metrics in the Prometheus text exposition format.
+    """
+    tracer = get_tracer()
+    return tracer.render_metrics() if tracer is not None else ""
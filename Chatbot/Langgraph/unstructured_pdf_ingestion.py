@@ -1,162 +1,427 @@
 import os
+import time
 import logging
+import tempfile
+import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import Dict, List, Any, Optional
-from unstructured.partition.pdf import partition_pdf
-from unstructured.documents.elements import Text, Image, Table, Title, NarrativeText
-from langchain.tools import Tool
+from langchain_core.tools import Tool
+from log_config import configure_logging, payload
+from ingestion_planner import plan_pdf, group_runs
+from ingestion_store import file_hash, get_ingestion_store
+from ingested_document import IngestedDocument
+from document_library import add_to_library
+from pdf_retrieval import (DEFAULT_TOP_K, DEFAULT_TOKEN_BUDGET, parse_tool_input, chunk_document,
+                           get_index, select_passages, format_passages)
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Parallel ingestion settings
+DEFAULT_WORKERS = int(os.getenv("PDF_INGEST_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_INGEST_PARALLEL_THRESHOLD", "16"))
+PAGES_PER_CHUNK = int(os.getenv("PDF_INGEST_PAGES_PER_CHUNK", "8"))
+# Seconds to wait for each chunk result; on a timeout the pool is replaced before retrying
+CHUNK_TIMEOUT = float(os.getenv("PDF_INGEST_CHUNK_TIMEOUT", "600"))
+CHUNK_RETRIES = int(os.getenv("PDF_INGEST_CHUNK_RETRIES", "1"))
+
+# partition_pdf strategy, or "adaptive" to let ingestion_planner choose one per page
+DEFAULT_STRATEGY = os.getenv("PDF_INGEST_STRATEGY", "auto")
+
+def load_partitioner():
+    """
+    Import unstructured's PDF partitioner, which pulls in torch, transformers and spaCy.
+
+    Importing it takes seconds, so this module defers it to the first ingestion;
+    call this ahead of time (e.g. from cold_start.prewarm) to pay that cost in the background.
+    """
+    from unstructured.partition.pdf import partition_pdf
+    return partition_pdf
+
+# (element class, kind) pairs, resolved on first use
+_element_kinds = None
+
+def _element_kind(element) -> str:
+    global _element_kinds
+    if _element_kinds is None:
+        from unstructured.documents.elements import Text, Image, Table, Title, PageBreak
+        # Order matters: Title, Table, Image and PageBreak are all subclasses of Text
+        _element_kinds = ((Title, "title"), (Table, "table"), (Image, "image"), (PageBreak, "page_break"), (Text, "text"))
+    for cls, kind in _element_kinds:
+        if isinstance(element, cls):
+            return kind
+    return "other"
+
+def _element_record(index: int, element) -> Dict[str, Any]:
+    """
+    Flatten an unstructured element into a plain, picklable record.
+    """
+    metadata = getattr(element, "metadata", None)
+    return {
+        "index": index,
+        "kind": _element_kind(element),
+        "text": getattr(element, "text", "") or "",
+        "page_number": getattr(metadata, "page_number", None),
+        "text_as_html": getattr(metadata, "text_as_html", None),
+        "image_path": getattr(metadata, "image_path", None),
+    }
+
+def _partition_records(pdf_path: str, extract_images: bool, strategy: str = "auto", starting_page_number: int = 1,
+                       image_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Partition a PDF (or a page chunk of one) and return element records.
+    """
+    kwargs = {}
+    if image_dir:
+        kwargs["extract_image_block_output_dir"] = image_dir
+    elements = load_partitioner()(
+        filename=pdf_path,
+        strategy=strategy,
+        extract_images_in_pdf=extract_images,
+        # Table structure needs the layout model, so only ask for it where it will run
+        infer_table_structure=strategy in ("auto", "hi_res"),
+        include_page_breaks=True,
+        starting_page_number=starting_page_number,
+        **kwargs
+    )
+    return [_element_record(i, element) for i, element in enumerate(elements)]
+
+def _partition_chunk(chunk_path: str, start_page: int, strategy: str, extract_images: bool, image_dir: str) -> Dict[str, Any]:
+    """
+    Worker entry point: partition one page chunk with global page numbers.
+    """
+    started = time.perf_counter()
+    records = _partition_records(chunk_path, extract_images, strategy, starting_page_number=start_page + 1, image_dir=image_dir)
+    return {"records": records, "seconds": time.perf_counter() - started}
+
+def _uniform_chunks(page_count: int, pages_per_chunk: int, strategy: str) -> List[Dict[str, Any]]:
+    return [
+        {"start": start, "end": min(start + pages_per_chunk, page_count), "strategy": strategy}
+        for start in range(0, page_count, pages_per_chunk)
+    ]
+
+def _split_pdf(pdf_path: str, workspace: str, chunks: List[Dict[str, Any]]) -> None:
+    """
+    Write each chunk's page range of the PDF to its own file in workspace.
+    """
+    with fitz.open(pdf_path) as source:
+        for chunk in chunks:
+            chunk_path = os.path.join(workspace, f"pages_{chunk['start'] + 1}_{chunk['end']}.pdf")
+            with fitz.open() as chunk_document:
+                chunk_document.insert_pdf(source, from_page=chunk["start"], to_page=chunk["end"] - 1)
+                chunk_document.save(chunk_path)
+            chunk["path"] = chunk_path
+
+def _stop_pool(executor: ProcessPoolExecutor, terminate: bool) -> None:
+    if terminate:
+        # A hung worker cannot be cancelled and keeps its slot, so stop the processes outright
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.terminate()
+    executor.shutdown(wait=not terminate, cancel_futures=True)
+
+def _partition_chunks(pdf_path: str, chunks: List[Dict[str, Any]], extract_images: bool, workspace: str, workers: int,
+                      chunk_timeout: float, max_retries: int) -> Dict[str, Any]:
+    """
+    Partition page chunks, in a process pool when workers > 1, retrying failed or timed-out chunks.
+
+    chunk_timeout bounds each wait for a chunk's result, not the chunk's run time. When
+    a wait times out the whole pool is terminated and the retries run on a fresh pool,
+    so they do not queue behind the hung worker; chunks that had not finished by then
+    are retried as well.
+
+    Returns:
+        dict: "records" with global indices in page order, "failed_chunks" and per-chunk "timings"
+    """
+    _split_pdf(pdf_path, workspace, chunks)
+    results: Dict[int, Dict[str, Any]] = {}
+    parallel = workers > 1
+
+    executor = None
+    try:
+        pending = list(range(len(chunks)))
+        attempt = 0
+        while pending and attempt <= max_retries:
+            if parallel and executor is None:
+                executor = ProcessPoolExecutor(max_workers=workers)
+            retry = []
+            futures = {}
+            for n in pending:
+                chunk = chunks[n]
+                args = (chunk["path"], chunk["start"], chunk["strategy"], extract_images,
+                        os.path.join(workspace, f"images_{chunk['start'] + 1}_{attempt}"))
+                if executor is None:
+                    try:
+                        results[n] = _partition_chunk(*args)
+                    except Exception as e:
+                        logger.error(f"Error partitioning pages {chunk['start'] + 1}-{chunk['end']} (attempt {attempt + 1}): {str(e)}")
+                        retry.append(n)
+                else:
+                    futures[n] = executor.submit(_partition_chunk, *args)
+
+            hung = False
+            for n, future in futures.items():
+                chunk = chunks[n]
+                if hung:
+                    # The pool is about to be terminated: keep what already finished, retry the rest
+                    if future.done() and future.exception() is None:
+                        results[n] = future.result()
+                    else:
+                        retry.append(n)
+                    continue
+                try:
+                    results[n] = future.result(timeout=chunk_timeout)
+                except FutureTimeoutError:
+                    hung = True
+                    logger.error(f"Timed out partitioning pages {chunk['start'] + 1}-{chunk['end']} (attempt {attempt + 1})")
+                    retry.append(n)
+                except Exception as e:
+                    logger.error(f"Error partitioning pages {chunk['start'] + 1}-{chunk['end']} (attempt {attempt + 1}): {str(e)}")
+                    retry.append(n)
+            if hung:
+                _stop_pool(executor, terminate=True)
+                executor = None
+            pending = retry
+            attempt += 1
+    finally:
+        if executor is not None:
+            _stop_pool(executor, terminate=False)
+
+    # Reassemble in page order with document-wide element indices
+    records = []
+    timings = []
+    for n, chunk in enumerate(chunks):
+        timing = {"start_page": chunk["start"] + 1, "end_page": chunk["end"], "strategy": chunk["strategy"]}
+        if n in results:
+            for record in results[n]["records"]:
+                record["index"] = len(records)
+                records.append(record)
+            timing["seconds"] = round(results[n]["seconds"], 3)
+        else:
+            timing["failed"] = True
+        timings.append(timing)
+
+    failed_chunks = [
+        {"start_page": timing["start_page"], "end_page": timing["end_page"]}
+        for timing in timings if timing.get("failed")
+    ]
+    return {"records": records, "failed_chunks": failed_chunks, "timings": timings}
+
+def get_page_count(pdf_path: str) -> int:
+    """
+    Return the number of pages in a PDF without parsing its layout.
+    """
+    with fitz.open(pdf_path) as pdf_document:
+        return len(pdf_document)
+
+def _embed_image_bytes(records: List[Dict[str, Any]]) -> None:
+    """
+    Keep extracted image content with the records so stored results outlive the workspace.
+    """
+    for record in records:
+        image_path = record.get("image_path")
+        if record["kind"] == "image" and image_path and os.path.exists(image_path):
+            with open(image_path, "rb") as img_file:
+                record["image_bytes"] = img_file.read()
+
+def _ingest_records(pdf_path: str, extract_images: bool, workspace: str, workers: int, parallel_threshold: int,
+                    pages_per_chunk: int, chunk_timeout: float, max_retries: int, strategy: str):
+    """
+    Partition a PDF into element records.
+
+    Returns:
+        tuple: (records, extra) where extra holds "failed_chunks" and "ingestion_plan" when present
+    """
+    page_count = get_page_count(pdf_path)
+    parallel = workers > 1 and page_count >= parallel_threshold
+    plan = None
+    if strategy == "adaptive":
+        plan = plan_pdf(pdf_path)
+        chunks = group_runs(plan, pages_per_chunk)
+    elif parallel:
+        chunks = _uniform_chunks(page_count, pages_per_chunk, strategy)
+    else:
+        return _partition_records(pdf_path, extract_images, strategy), {}
+
+    if parallel:
+        logger.info("Partitioning %d chunks in parallel with %d workers", len(chunks), workers)
+    partitioned = _partition_chunks(pdf_path, chunks, extract_images, workspace,
+                                    workers if parallel else 1, chunk_timeout, max_retries)
+
+    extra = {}
+    if partitioned["failed_chunks"]:
+        extra["failed_chunks"] = partitioned["failed_chunks"]
+    if plan is not None:
+        extra["ingestion_plan"] = {"pages": plan, "runs": partitioned["timings"]}
+    return partitioned["records"], extra
+
+def _library_passages(document: IngestedDocument):
+    # Generator, so nothing is chunked when the library already has this document
+    for chunk in chunk_document(document):
+        yield {"text": chunk["text"], "page": chunk["page_start"], "element": chunk["element"], "section": chunk["section"]}
+
+def ingest_pdf_document(pdf_path: str, extract_images: bool = True, workers: Optional[int] = None,
+                        parallel_threshold: int = PARALLEL_PAGE_THRESHOLD, pages_per_chunk: int = PAGES_PER_CHUNK,
+                        chunk_timeout: float = CHUNK_TIMEOUT, max_retries: int = CHUNK_RETRIES,
+                        strategy: str = DEFAULT_STRATEGY, use_store: bool = True) -> IngestedDocument:
+    """
+    Ingest a multimodal PDF document into a columnar IngestedDocument.
+
+    Documents with at least parallel_threshold pages are split into page chunks
+    that are partitioned concurrently in a process pool. With strategy="adaptive"
+    each page is probed first and routed to the fast, hi_res or ocr_only strategy.
+    Results are kept in the ingestion store, so a known document is not parsed again.
+
+    Args:
+        pdf_path (str): Path to the PDF file
+        extract_images (bool): Whether to extract images (kept in the document)
+        workers (int, optional): Number of worker processes for large documents
+        parallel_threshold (int): Page count below which ingestion stays single-process
+        pages_per_chunk (int): Number of pages partitioned per worker task
+        chunk_timeout (float): Seconds to wait for each chunk's result before recycling the pool and retrying it
+        max_retries (int): Number of retries for a failed or timed-out chunk
+        strategy (str): partition_pdf strategy, or "adaptive" to choose per page
+        use_store (bool): Read and write the persistent ingestion store
+
+    Returns:
+        IngestedDocument: The ingested content
+    """
+    # Only options that change the records belong in the key
+    store = get_ingestion_store() if use_store else None
+    key = store.make_key(pdf_path, {"extract_images": extract_images, "strategy": strategy}) if store else None
+    stored = store.load(key) if store else None
+    if stored is not None:
+        records, extra = stored
+        logger.info("Loaded %d elements from the ingestion store", len(records))
+        document = IngestedDocument.from_records(records, extra)
+        add_to_library(pdf_path, "pdf_ingestion", _library_passages(document))
+        return document
+
+    with tempfile.TemporaryDirectory(prefix="pdf_ingest_") as workspace:
+        records, extra = _ingest_records(pdf_path, extract_images, workspace, workers or DEFAULT_WORKERS,
+                                         parallel_threshold, pages_per_chunk, chunk_timeout, max_retries, strategy)
+        # Read images before the workspace is removed
+        if extract_images:
+            _embed_image_bytes(records)
+
+    document = IngestedDocument.from_records(records, extra)
+    # Incomplete results are neither stored nor indexed so the failed pages are retried next time;
+    # the library skips documents it already holds, so a partial entry would never be replaced
+    if not extra.get("failed_chunks"):
+        if store is not None:
+            store.save(key, records, extra, source=pdf_path)
+        add_to_library(pdf_path, "pdf_ingestion", _library_passages(document))
+    return document
+
+def ingest_pdf(pdf_path: str, extract_images: bool = True, output_dir: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+    """
+    Ingest a multimodal PDF document and extract structured content.
+
+    Convenience wrapper that returns ingest_pdf_document's result in dict form.
+
+    Args:
+        pdf_path (str): Path to the PDF file
+        extract_images (bool): Whether to extract and save images
+        output_dir (str, optional): Directory to save extracted images
+        **kwargs: Options passed on to ingest_pdf_document
+
+    Returns:
+        Dict[str, Any]: Dictionary containing extracted content
+    """
+    try:
+        logger.info("Ingesting PDF: %s", payload(pdf_path))
+
+        # Create output directory if specified and extract_images is True
+        if extract_images and output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        document = ingest_pdf_document(pdf_path, extract_images, **kwargs)
+        content = document.to_dict(extract_images, output_dir)
+
+        logger.info("Successfully ingested PDF with %d elements", len(document))
+        return content
+
+    except Exception as e:
+        logger.error(f"Error ingesting PDF: {str(e)}")
+        return {
+            "error": f"Error ingesting PDF: {str(e)}",
+            "text": [],
+            "titles": [],
+            "tables": [],
+            "images": [],
+            "page_breaks": []
+        }
+
+def query_pdf(tool_input: str, top_k: int = DEFAULT_TOP_K, token_budget: int = DEFAULT_TOKEN_BUDGET):
+    """
+    Tool entry point: answer a question from a PDF with only the most relevant passages.
+
+    Passages follow the document's titles and sections.
+
+    Args:
+        tool_input (str): "path/to/file.pdf | question"
+        top_k (int): Maximum number of passages to return
+        token_budget (int): Approximate token limit for the returned passages
+
+    Returns:
+        str: Ranked passages with page and section provenance; questions about the whole document,
+        and inputs without a question, get its leading passages within token_budget
+    """
+    pdf_path, question = parse_tool_input(tool_input)
+    if not question:
+        # Models often drop the question; send the leading passages rather than the whole document
+        question = ""
+
+    try:
+        logger.info("Retrieving passages from %s for: %s", pdf_path, payload(question))
+        # The passage index is cached per document content, so follow-up questions skip ingestion
+        index = get_index(
+            f"pdf_ingestion:{DEFAULT_STRATEGY}:{file_hash(pdf_path)}",
+            lambda: chunk_document(ingest_pdf_document(pdf_path, extract_images=False))
+        )
+        return format_passages(select_passages(index, question, top_k, token_budget))
+    except Exception as e:
+        logger.error(f"Error querying PDF: {str(e)}")
+        return f"Error querying PDF: {str(e)}"
+
 def setup_unstructured_pdf_ingestion():
     """
     Initialize a tool for ingesting multimodal PDF documents using unstructured.io.
     """
-    def ingest_pdf(pdf_path: str, extract_images: bool = True, output_dir: Optional[str] = None) -> Dict[str, Any]:
-        """
-        Ingest a multimodal PDF document and extract structured content.
-        
-        Args:
-            pdf_path (str): Path to the PDF file
-            extract_images (bool): Whether to extract and save images
-            output_dir (str, optional): Directory to save extracted images
-            
-        Returns:
-            Dict[str, Any]: Dictionary containing extracted content
-        """
-        try:
-            logger.info(f"Ingesting PDF: {pdf_path}")
-            
-            # Create output directory if specified and extract_images is True
-            if extract_images and output_dir:
-                os.makedirs(output_dir, exist_ok=True)
-            
-            # Partition the PDF
-            elements = partition_pdf(
-                filename=pdf_path,
-                extract_images_in_pdf=extract_images,
-                infer_table_structure=True,
-                include_page_breaks=True
-            )
-            
-            # Process the elements
-            content = {
-                "text": [],
-                "titles": [],
-                "tables": [],
-                "images": [],
-                "page_breaks": [],
-                "metadata": {}
-            }
-            
-            # Extract metadata if available
-            if hasattr(elements, "metadata") and elements.metadata:
-                content["metadata"] = elements.metadata
-            
-            # Process each element
-            for i, element in enumerate(elements):
-                # Track page breaks
-                if hasattr(element, "page_number") and element.page_number:
-                    content["page_breaks"].append({
-                        "index": i,
-                        "page_number": element.page_number
-                    })
-                
-                # Process different element types
-                if isinstance(element, Text):
-                    content["text"].append({
-                        "index": i,
-                        "text": element.text,
-                        "page_number": getattr(element, "page_number", None)
-                    })
-                
-                if isinstance(element, Title):
-                    content["titles"].append({
-                        "index": i,
-                        "text": element.text,
-                        "page_number": getattr(element, "page_number", None)
-                    })
-                
-                if isinstance(element, Table):
-                    # Convert table to a structured format
-                    table_data = []
-                    if hasattr(element, "metadata") and element.metadata:
-                        table_data = element.metadata.get("text_as_html", "")
-                    
-                    content["tables"].append({
-                        "index": i,
-                        "data": table_data,
-                        "page_number": getattr(element, "page_number", None)
-                    })
-                
-                if isinstance(element, Image):
-                    image_info = {
-                        "index": i,
-                        "page_number": getattr(element, "page_number", None)
-                    }
-                    
-                    # Save image if requested
-                    if extract_images and output_dir and hasattr(element, "metadata"):
-                        image_path = element.metadata.get("image_path")
-                        if image_path and os.path.exists(image_path):
-                            # Copy image to output directory
-                            import shutil
-                            image_filename = f"image_{i}.png"
-                            output_path = os.path.join(output_dir, image_filename)
-                            shutil.copy(image_path, output_path)
-                            image_info["path"] = output_path
-                    
-                    content["images"].append(image_info)
-            
-            logger.info(f"Successfully ingested PDF with {len(elements)} elements")
-            return content
-            
-        except Exception as e:
-            logger.error(f"Error ingesting PDF: {str(e)}")
-            return {
-                "error": f"Error ingesting PDF: {str(e)}",
-                "text": [],
-                "titles": [],
-                "tables": [],
-                "images": [],
-                "page_breaks": []
-            }
-    
     # Create a LangChain tool for PDF ingestion
     pdf_ingestion_tool = Tool(
         name="pdf_ingestion",
-        description="Useful for ingesting multimodal PDF documents and extracting structured content including text, titles, tables, and images. Input should be a path to a PDF file.",
-        func=ingest_pdf
+        description="Useful for answering questions from multimodal PDF documents (text, titles, tables). Input should be a path to a PDF file followed by ' | ' and the question, e.g. 'manual.pdf | How do I reset the device?'. Returns the most relevant passages with page and section references.",
+        func=query_pdf
     )
-    
+
     return pdf_ingestion_tool
 
 # Example usage
 if __name__ == "__main__":
+    configure_logging()
     # Initialize the PDF ingestion tool
     pdf_tool = setup_unstructured_pdf_ingestion()
-    
+
     # Example: Ingest a PDF
     pdf_path = "path/to/your/document.pdf"  # Replace with your PDF path
     output_dir = "extracted_content"  # Optional: directory to save images
-    
+
     result = pdf_tool.run(pdf_path, extract_images=True, output_dir=output_dir)
-    
+
     # Print summary of extracted content
     print(f"Extracted {len(result['text'])} text elements")
     print(f"Extracted {len(result['titles'])} titles")
     print(f"Extracted {len(result['tables'])} tables")
     print(f"Extracted {len(result['images'])} images")
-    
+
     # Print first few text elements
     print("\nSample text elements:")
     for i, text_elem in enumerate(result["text"][:3]):
         print(f"{i+1}. {text_elem['text'][:100]}...")
-    
+
     # Print image paths if available
     if result["images"]:
         print("\nExtracted images:")
         for img in result["images"]:
             if "path" in img:
-                print(f"- {img['path']}") 
\ No newline at end of file
+                print(f"- {img['path']}")
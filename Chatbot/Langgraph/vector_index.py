@@ -0,0 +1,469 @@
+import os
+import json
+import hashlib
+import sqlite3
+import logging
+import threading
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from langchain_core.tools import Tool
+import agent_registry
+from log_config import payload
+from ingestion_store import file_hash
+from pdf_retrieval import (DEFAULT_TOP_K, DEFAULT_TOKEN_BUDGET, parse_tool_input, chunk_document,
+                           tokenize, estimate_tokens, format_passages)
+from unstructured_pdf_ingestion import ingest_pdf_document
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(os.path.expanduser("~"), ".cache", "agentic_ai", "vector_index"))
+DEFAULT_EMBEDDER = os.getenv("VECTOR_EMBEDDER", "openai")
+EMBEDDING_MODEL = os.getenv("VECTOR_EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_BATCH_SIZE = int(os.getenv("VECTOR_EMBEDDING_BATCH_SIZE", "256"))
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")
+
+# Rows scored per matrix block during exact search, to bound temporary memory
+SEARCH_BLOCK_ROWS = int(os.getenv("VECTOR_SEARCH_BLOCK_ROWS", "65536"))
+# Below this many rows exact search is fast enough that IVF is not used
+IVF_MIN_ROWS = int(os.getenv("VECTOR_IVF_MIN_ROWS", "50000"))
+IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "8"))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class Embedder(ABC):
+    """
+    Turns texts into vectors. Subclasses implement embed(); callers use embed_batched().
+    """
+
+    name = "embedder"
+    dim: Optional[int] = None
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Return one (unnormalised) row per text.
+        """
+
+    def embed_batched(self, texts: Sequence[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+        """
+        Embed texts in batches and return one L2-normalised float32 matrix.
+        """
+        batches = [self.embed(texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)]
+        if not batches:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return _normalize(np.vstack(batches))
+
+
+class HashingEmbedder(Embedder):
+    """
+    Deterministic local embedder: signed feature hashing of word unigrams and bigrams.
+
+    Needs no model or network, so it stands in for the real embedder in offline tests.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _bucket(self, feature: str):
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if (value >> 63) else -1.0
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                bucket, sign = self._bucket(feature)
+                vectors[row, bucket] += sign
+        return vectors
+
+
+class OpenAIEmbedder(Embedder):
+    """
+    OpenAI embeddings through the shared LangChain client.
+    """
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        self.model = model
+        self.name = f"openai-{model}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        client = agent_registry.shared(f"embeddings:{self.model}", self._build_client)
+        vectors = np.asarray(client.embed_documents(list(texts)), dtype=np.float32)
+        self.dim = vectors.shape[1]
+        return vectors
+
+    def _build_client(self):
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=self.model, chunk_size=EMBEDDING_BATCH_SIZE)
+
+
+class VectorIndex:
+    """
+    Append-only vector index stored on disk.
+
+    Vectors live in one raw matrix file that is memory-mapped for search and only
+    ever appended to. Row metadata and the document-to-row map live in SQLite.
+    Exact search scores the matrix block by block with NumPy; once trained, an
+    IVF coarse partition restricts large-corpus queries to the nearest lists.
+    """
+
+    def __init__(self, directory: str, dtype: str = VECTOR_DTYPE):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._centroids: Optional[np.ndarray] = None
+        self._postings = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.bin")
+        self._assign_path = os.path.join(directory, "ivf_assign.bin")
+        self._centroids_path = os.path.join(directory, "ivf_centroids.npy")
+
+        self._conn = sqlite3.connect(os.path.join(directory, "ids.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rows (row INTEGER PRIMARY KEY, doc TEXT NOT NULL, metadata TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS documents (doc TEXT PRIMARY KEY, start_row INTEGER NOT NULL, end_row INTEGER NOT NULL)")
+        self._conn.commit()
+
+        settings = dict(self._conn.execute("SELECT name, value FROM settings").fetchall())
+        if settings:
+            self.dim = int(settings["dim"])
+            self.dtype = np.dtype(settings["dtype"])
+        if os.path.exists(self._centroids_path):
+            self._centroids = np.load(self._centroids_path)
+        # Under the write lock so a concurrent add_document's uncommitted rows are not mistaken for leftovers
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Rows are numbered 0..n-1, so the primary key gives the count without scanning the table
+            self._count = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+            self._recover()
+        finally:
+            self._conn.commit()
+
+    @property
+    def row_bytes(self) -> int:
+        return (self.dim or 0) * self.dtype.itemsize
+
+    def __len__(self) -> int:
+        # Committed rows; kept in memory so searches do not query SQLite for it
+        return self._count
+
+    def _recover(self) -> None:
+        # SQLite is the source of truth: drop matrix rows written by an add() that never committed
+        count = len(self)
+        for path, row_bytes in ((self._vectors_path, self.row_bytes), (self._assign_path, 4)):
+            if self._truncate(path, count * row_bytes):
+                logger.info(f"Truncated {path} to {count} committed rows")
+
+    @staticmethod
+    def _truncate(path: str, size: int) -> bool:
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+            return True
+        return False
+
+    @staticmethod
+    def _write_at(path: str, offset: int, data: bytes) -> None:
+        # Write at the rows' offset rather than appending, so bytes left by a failed write are overwritten
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            f.seek(offset)
+            f.write(data)
+
+    def _map(self):
+        # Re-map lazily after appends; the mapping itself reads nothing until rows are scored
+        count = len(self)
+        if self._matrix is None or self._matrix.shape[0] != count:
+            self._matrix = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(count, self.dim)) if count else None
+        return self._matrix
+
+    def has_document(self, doc: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM documents WHERE doc = ?", (doc,)).fetchone() is not None
+
+    def add_document(self, doc: str, vectors: np.ndarray, metadata: Iterable[Dict[str, Any]]) -> int:
+        """
+        Append a document's vectors and row metadata without rewriting existing rows.
+
+        Args:
+            doc (str): Document key, e.g. "pdf_ingestion:<sha256>"
+            vectors (np.ndarray): One normalised row per passage
+            metadata (iterable): One JSON-serialisable dict per row
+
+        Returns:
+            int: Number of rows added (0 when the document is already indexed)
+        """
+        metadata = list(metadata)
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        if len(metadata) != len(vectors):
+            raise ValueError("vectors and metadata must have the same length")
+
+        with self._lock:
+            # BEGIN IMMEDIATE takes SQLite's write lock, so no other instance or process on the
+            # same directory can claim the same rows until this commits or rolls back
+            self._conn.execute("BEGIN IMMEDIATE")
+            start = None
+            try:
+                if self._conn.execute("SELECT 1 FROM documents WHERE doc = ?", (doc,)).fetchone() is not None:
+                    self._conn.rollback()
+                    return 0
+                settings = dict(self._conn.execute("SELECT name, value FROM settings").fetchall())
+                if settings:
+                    self.dim = int(settings["dim"])
+                    self.dtype = np.dtype(settings["dtype"])
+                    vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+                else:
+                    self.dim = vectors.shape[1]
+                    self._conn.executemany("INSERT INTO settings (name, value) VALUES (?, ?)",
+                                           [("dim", str(self.dim)), ("dtype", self.dtype.name)])
+                if vectors.shape[1] != self.dim:
+                    raise ValueError(f"Index holds {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+                start = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+                # Matrix first, at the rows' own offset, then the commit that makes the rows visible
+                self._write_at(self._vectors_path, start * self.row_bytes, vectors.tobytes())
+                if self._centroids is not None:
+                    self._write_at(self._assign_path, start * 4, self._assign(vectors).tobytes())
+                    self._postings = None
+                self._conn.executemany(
+                    "INSERT INTO rows (row, doc, metadata) VALUES (?, ?, ?)",
+                    ((start + i, doc, json.dumps(meta)) for i, meta in enumerate(metadata)),
+                )
+                self._conn.execute("INSERT INTO documents (doc, start_row, end_row) VALUES (?, ?, ?)",
+                                   (doc, start, start + len(metadata)))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                if start is not None:
+                    # Nothing past the committed rows may stay in the files
+                    self._truncate(self._vectors_path, start * self.row_bytes)
+                    self._truncate(self._assign_path, start * 4)
+                    self._postings = None
+                raise
+            self._count = start + len(metadata)
+        logger.info(f"Added {len(metadata)} vectors for {doc}")
+        return len(metadata)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(np.asarray(vectors, dtype=np.float32) @ self._centroids.T, axis=1).astype(np.int32)
+
+    def train_ivf(self, n_lists: Optional[int] = None, sample_size: int = 100000, iterations: int = 10, seed: int = 0) -> None:
+        """
+        Partition the rows into n_lists clusters (spherical k-means on a sample).
+
+        Rows added later are assigned to their nearest centroid as they are appended.
+        """
+        with self._lock:
+            matrix = self._map()
+            if matrix is None:
+                return
+            count = matrix.shape[0]
+            n_lists = n_lists or max(1, int(np.sqrt(count)))
+            rng = np.random.default_rng(seed)
+            sample = np.asarray(matrix[np.sort(rng.choice(count, min(sample_size, count), replace=False))], dtype=np.float32)
+            centroids = sample[rng.choice(len(sample), min(n_lists, len(sample)), replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                empty = ~sums.any(axis=1)
+                sums[empty] = centroids[empty]
+                centroids = _normalize(sums)
+
+            self._centroids = centroids
+            np.save(self._centroids_path, centroids)
+            with open(self._assign_path, "wb") as f:
+                for start in range(0, count, SEARCH_BLOCK_ROWS):
+                    f.write(self._assign(matrix[start:start + SEARCH_BLOCK_ROWS]).tobytes())
+            self._postings = None
+        logger.info(f"Trained IVF with {len(centroids)} lists over {count} vectors")
+
+    def _inverted_lists(self):
+        # Rows grouped by list: list l owns order[bounds[l]:bounds[l + 1]]
+        if self._postings is None:
+            assignments = np.fromfile(self._assign_path, dtype=np.int32)
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.searchsorted(assignments[order], np.arange(len(self._centroids) + 1))
+            self._postings = (order, bounds)
+        return self._postings
+
+    def _candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        order, bounds = self._inverted_lists()
+        lists = np.argsort(-(self._centroids @ query))[:nprobe]
+        return np.sort(np.concatenate([order[bounds[l]:bounds[l + 1]] for l in lists]))
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+        if len(scores) <= top_k:
+            return np.argsort(-scores)
+        best = np.argpartition(-scores, top_k)[:top_k]
+        return best[np.argsort(-scores[best])]
+
+    def search(self, query: np.ndarray, top_k: int = DEFAULT_TOP_K, doc: Optional[str] = None,
+               nprobe: int = IVF_NPROBE, exact: bool = False) -> List[Dict[str, Any]]:
+        """
+        Return the top_k rows most similar to a normalised query vector.
+
+        Args:
+            query (np.ndarray): Query vector
+            top_k (int): Number of results
+            doc (str, optional): Restrict the search to one document's rows
+            nprobe (int): IVF lists to scan when the coarse partition is used
+            exact (bool): Always scan every candidate row
+
+        Returns:
+            list: Row metadata dicts with "row", "doc" and "score", best first
+        """
+        query = np.asarray(query, dtype=np.float32).ravel()
+        with self._lock:
+            matrix = self._map()
+            if matrix is None:
+                return []
+
+            if doc is not None:
+                span = self._conn.execute("SELECT start_row, end_row FROM documents WHERE doc = ?", (doc,)).fetchone()
+                if span is None:
+                    return []
+                rows = np.arange(span[0], span[1])
+            elif self._centroids is not None and not exact and matrix.shape[0] >= IVF_MIN_ROWS:
+                rows = self._candidates(query, nprobe)
+            else:
+                rows = None
+
+            if rows is None:
+                scores = np.empty(matrix.shape[0], dtype=np.float32)
+                for start in range(0, matrix.shape[0], SEARCH_BLOCK_ROWS):
+                    scores[start:start + SEARCH_BLOCK_ROWS] = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32) @ query
+                best = self._top_k(scores, top_k)
+                hits = [(int(row), float(scores[row])) for row in best]
+            else:
+                scores = np.asarray(matrix[rows], dtype=np.float32) @ query
+                best = self._top_k(scores, top_k)
+                hits = [(int(rows[i]), float(scores[i])) for i in best]
+
+            results = []
+            for row, score in hits:
+                doc_key, metadata = self._conn.execute("SELECT doc, metadata FROM rows WHERE row = ?", (row,)).fetchone()
+                results.append(dict(json.loads(metadata or "{}"), row=row, doc=doc_key, score=round(score, 4)))
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rows": len(self),
+                "documents": self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0],
+                "dim": self.dim,
+                "dtype": self.dtype.name,
+                "bytes": os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0,
+                "ivf_lists": len(self._centroids) if self._centroids is not None else 0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._matrix = None
+            self._conn.close()
+
+
+def get_embedder(name: str = DEFAULT_EMBEDDER) -> Embedder:
+    """
+    Return the shared embedder: "openai" (default) or "hashing" for offline use.
+    """
+    if name == "hashing":
+        return agent_registry.shared("embedder:hashing", HashingEmbedder)
+    return agent_registry.shared(f"embedder:openai:{EMBEDDING_MODEL}", OpenAIEmbedder)
+
+
+def get_vector_index(embedder: Optional[Embedder] = None) -> VectorIndex:
+    """
+    Return the process-wide index for an embedder; each embedder gets its own directory.
+    """
+    embedder = embedder or get_embedder()
+    return agent_registry.shared(
+        f"vector_index:{embedder.name}",
+        lambda: VectorIndex(os.path.join(DEFAULT_INDEX_DIR, embedder.name))
+    )
+
+
+def index_pdf(pdf_path: str, embedder: Optional[Embedder] = None) -> str:
+    """
+    Embed an ingested PDF's passages into the vector index unless already present.
+
+    Returns:
+        str: Document key of the PDF in the index
+    """
+    embedder = embedder or get_embedder()
+    index = get_vector_index(embedder)
+    doc = f"pdf_ingestion:{file_hash(pdf_path)}"
+    if not index.has_document(doc):
+        chunks = chunk_document(ingest_pdf_document(pdf_path, extract_images=False))
+        if chunks:
+            vectors = embedder.embed_batched([f"{chunk['section'] or ''}\n{chunk['text']}" for chunk in chunks])
+            index.add_document(doc, vectors, [dict(chunk, path=os.path.abspath(pdf_path)) for chunk in chunks])
+    return doc
+
+
+def semantic_search(query: str, top_k: int = DEFAULT_TOP_K, pdf_path: Optional[str] = None,
+                    embedder: Optional[Embedder] = None) -> List[Dict[str, Any]]:
+    """
+    Find the passages closest in meaning to a query, in one PDF or across every indexed PDF.
+    """
+    embedder = embedder or get_embedder()
+    doc = index_pdf(pdf_path, embedder) if pdf_path else None
+    vector = embedder.embed_batched([query])[0]
+    return get_vector_index(embedder).search(vector, top_k, doc=doc)
+
+
+def setup_semantic_pdf_search_tool():
+    """
+    Initialize a tool that answers questions from a PDF by embedding similarity.
+    """
+    def semantic_query_pdf(tool_input):
+        """
+        Return the passages of a PDF closest in meaning to a question.
+
+        Args:
+            tool_input (str): "path/to/file.pdf | question"
+
+        Returns:
+            str: Ranked passages with page and section provenance
+        """
+        pdf_path, question = parse_tool_input(tool_input)
+        if not question:
+            return "Input should be a path to a PDF file followed by ' | ' and the question."
+        try:
+            logger.info("Semantic search in %s for: %s", pdf_path, payload(question))
+            passages = semantic_search(question, DEFAULT_TOP_K, pdf_path)
+            selected, used = [], 0
+            for passage in passages:
+                cost = estimate_tokens(passage["text"])
+                if selected and used + cost > DEFAULT_TOKEN_BUDGET:
+                    continue
+                selected.append(passage)
+                used += cost
+            return format_passages(selected)
+        except Exception as e:
+            logger.error(f"Error in semantic PDF search: {str(e)}")
+            return f"Error in semantic PDF search: {str(e)}"
+
+    semantic_tool = Tool(
+        name="semantic_pdf_search",
+        description="Useful for conceptual questions about a PDF where the wording may differ from the document. Input should be a path to a PDF file followed by ' | ' and the question. Returns the passages closest in meaning with page and section references.",
+        func=semantic_query_pdf
+    )
+
+    return semantic_tool
@@ -0,0 +1,169 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+from langchain_core.tools import Tool
+import agent_registry
+from log_config import payload
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Fresh lifetime and extra stale-while-revalidate window per tool, in seconds
+SEARCH_TTL = float(os.getenv("SEARCH_TOOL_TTL", "3600"))
+SEARCH_STALE_TTL = float(os.getenv("SEARCH_TOOL_STALE_TTL", "1800"))
+WEATHER_TTL = float(os.getenv("WEATHER_TOOL_TTL", "600"))
+WEATHER_STALE_TTL = float(os.getenv("WEATHER_TOOL_STALE_TTL", "300"))
+MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "2048"))
+
+# Background refreshes for stale entries share one small pool
+_refresh_pool = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_CACHE_REFRESH_WORKERS", "4")), thread_name_prefix="tool-refresh")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(str(query).lower().split())
+
+
+class ToolResultCache:
+    """
+    TTL cache for tool results with request coalescing and stale-while-revalidate.
+
+    Concurrent misses for the same query share one in-flight call. Within the stale
+    window an expired result is returned at once while a single background call
+    refreshes it. Errors are never cached.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0.0, max_entries: int = MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.metrics = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "errors": 0}
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _store(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _run(self, key: str, fetch: Callable[[], Any], future: Future) -> None:
+        try:
+            value = fetch()
+            self._store(key, value)
+            future.set_result(value)
+        except Exception as e:
+            with self._lock:
+                self.metrics["errors"] += 1
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, query: str, fetch: Callable[[], Any]) -> Any:
+        """
+        Return the cached result for query, calling fetch() only when needed.
+
+        Args:
+            query (str): Tool input; normalised for the cache key
+            fetch (callable): Zero-argument callable that performs the real call
+        """
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.monotonic() - entry[0] if entry else None
+            if entry and age < self.ttl:
+                self._entries.move_to_end(key)
+                self.metrics["hits"] += 1
+                return entry[1]
+
+            future = self._inflight.get(key)
+            if entry and age < self.ttl + self.stale_ttl:
+                self.metrics["stale_hits"] += 1
+                if future is None:
+                    self.metrics["refreshes"] += 1
+                    future = self._inflight[key] = Future()
+                    _refresh_pool.submit(self._run, key, fetch, future)
+                return entry[1]
+
+            if future is not None:
+                self.metrics["coalesced"] += 1
+                owner = False
+            else:
+                self.metrics["misses"] += 1
+                future = self._inflight[key] = Future()
+                owner = True
+
+        if owner:
+            self._run(key, fetch, future)
+        return future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self.metrics, entries=len(self._entries), inflight=len(self._inflight))
+        lookups = metrics["hits"] + metrics["stale_hits"] + metrics["misses"] + metrics["coalesced"]
+        metrics["hit_rate"] = (lookups - metrics["misses"]) / lookups if lookups else 0.0
+        return metrics
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def get_tool_cache(name: str) -> ToolResultCache:
+    """
+    Return the process-wide result cache for a tool ("search" or "weather").
+    """
+    ttls = {"search": (SEARCH_TTL, SEARCH_STALE_TTL), "weather": (WEATHER_TTL, WEATHER_STALE_TTL)}
+    ttl, stale_ttl = ttls.get(name, (SEARCH_TTL, 0.0))
+    return agent_registry.shared(f"tool_cache:{name}", lambda: ToolResultCache(name, ttl, stale_ttl))
+
+
+def setup_search_tool():
+    """
+    Initialize the shared internet search tool.
+    """
+    search = agent_registry.search_wrapper()
+    cache = get_tool_cache("search")
+
+    def search_with_logging(query):
+        logger.info("Searching for: %s", payload(query))
+        result = cache.get(query, lambda: search.run(query))
+        logger.debug("Search tool returned result of length: %d", len(result))
+        return result
+
+    search_tool = Tool(
+        name="search",
+        description="Useful for searching the internet for recent news and information. Input should be a search query string.",
+        func=search_with_logging
+    )
+
+    return search_tool
+
+
+def setup_weather_tool():
+    """
+    Initialize the shared current-weather tool.
+    """
+    weather = agent_registry.weather_wrapper()
+    cache = get_tool_cache("weather")
+
+    def weather_with_logging(query):
+        logger.info("Getting weather for: %s", payload(query))
+        result = cache.get(query, lambda: weather.run(query))
+        logger.debug("Weather result: %s", payload(result))
+        return result
+
+    weather_tool = Tool(
+        name="weather",
+        description="Useful for getting current weather information for a specific location. Input should be a location name.",
+        func=weather_with_logging
+    )
+
+    return weather_tool
@@ -1,12 +1,23 @@
 import streamlit as st
-from langchain_openai import ChatOpenAI
-from langchain.memory import ConversationBufferMemory, ConversationSummaryMemory, ConversationBufferWindowMemory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.chains import ConversationChain
-from langchain_core.messages import HumanMessage, AIMessage
 import os
+import time
+import logging
+import sys
 from dotenv import load_dotenv
 
+# Shared modules live in Chatbot/Langgraph
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Chatbot", "Langgraph"))
+from chat_memory import SessionMemory, MEMORY_TYPES
+from chat_service import ChatServiceClient, new_session_id
+import tracing
+import cold_start
+from log_config import configure_logging
+
+# Set up logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
@@ -21,24 +32,39 @@ if "messages" not in st.session_state:
 
 # Initialize session state for memory type
 if "memory_type" not in st.session_state:
-    st.session_state.memory_type = "buffer"
+    st.session_state.memory_type = "summary"
+
+st.sidebar.selectbox("Memory type", MEMORY_TYPES, key="memory_type")
+
+# When a chat service is configured it owns sessions, memory and the LLM; this page only renders
+CHAT_SERVICE_URL = os.getenv("CHAT_SERVICE_URL")
 
-# Initialize LLM
 @st.cache_resource
-def get_llm():
-    return ChatOpenAI(model="gpt-4o")
+def get_service_client():
+    return ChatServiceClient(CHAT_SERVICE_URL)
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = new_session_id()
+
+# Optionally load models in the background (PREWARM, e.g. "chat"); runs once per process
+@st.cache_resource
+def start_prewarm():
+    return cold_start.prewarm()
 
-llm = get_llm()
+start_prewarm()
 
-# Initialize different memory types
+# Initialize LLM on first use; the OpenAI client is not needed when a chat service is configured
 @st.cache_resource
-def get_memories():
-    return ConversationBufferMemory(
-        memory_key="history",
-        return_messages=True
-    )
+def get_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model="gpt-4o")
+
+# Conversation memory belongs to this browser session only
+if "memory" not in st.session_state:
+    st.session_state.memory = SessionMemory(policy=st.session_state.memory_type)
 
-memory = get_memories()
+memory = st.session_state.memory
+memory.policy = st.session_state.memory_type
 
 # Create prompt template
 prompt = ChatPromptTemplate.from_messages([
@@ -47,21 +73,32 @@ prompt = ChatPromptTemplate.from_messages([
     ("human", "{input}")
 ])
 
-# Initialize conversation chain
+# Initialize conversation chain; it holds no state, so all sessions share it
 @st.cache_resource
 def get_chain():
-    chain = ConversationChain(
-        llm=llm,
-        memory=memory,
-        prompt=prompt,
-        verbose=True
-    )
-    return chain
+    return prompt | get_llm()
+
+def stream_response(chain, inputs, metrics):
+    """
+    Yield response tokens as they arrive, recording time to first token and total latency.
+    """
+    started = time.perf_counter()
+    for chunk in chain.stream(inputs, config={"callbacks": tracing.callbacks()}):
+        if chunk.content and "ttft" not in metrics:
+            metrics["ttft"] = time.perf_counter() - started
+        yield chunk.content
+    metrics["total"] = time.perf_counter() - started
+    metrics.setdefault("ttft", metrics["total"])
+
+def format_metrics(metrics):
+    return f"First token {metrics['ttft']:.2f}s · total {metrics['total']:.2f}s"
 
 # Display chat history
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
+        if message.get("metrics"):
+            st.caption(format_metrics(message["metrics"]))
 
 # Chat input
 if user_input := st.chat_input("What's on your mind?"):
@@ -70,13 +107,18 @@ if user_input := st.chat_input("What's on your mind?"):
     with st.chat_message("user"):
         st.markdown(user_input)
 
-    chain = get_chain()
-
-    # Generate response
+    # Stream the response as it is generated
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response = chain.invoke({"input": user_input})
-            st.markdown(response['response'])
-            
-            # Add assistant message to chat history
-            st.session_state.messages.append({"role": "assistant", "content": response['response']})
\ No newline at end of file
+        metrics = {}
+        if CHAT_SERVICE_URL:
+            tokens = get_service_client().stream_chat(st.session_state.session_id, user_input, st.session_state.memory_type, metrics)
+        else:
+            tokens = stream_response(get_chain(), {"input": user_input, "history": memory.messages()}, metrics)
+        response = st.write_stream(tokens)
+        st.caption(format_metrics(metrics))
+        logger.info("Chat turn: ttft=%.3fs total=%.3fs", metrics["ttft"], metrics["total"])
+
+        # Add assistant message to chat history and this session's memory (the service keeps its own)
+        st.session_state.messages.append({"role": "assistant", "content": response, "metrics": metrics})
+        if not CHAT_SERVICE_URL:
+            memory.add_turn(user_input, response)
\ No newline at end of file